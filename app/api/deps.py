@@ -1,24 +1,101 @@
-from typing import Generator
-from fastapi import Depends, HTTPException, status
+import ipaddress
+import math
+from typing import Generator, Optional
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
 from app.core.config import settings
 from app.models.user import User
 from app.models.token_blacklist import TokenBlacklist
-from app.schemas.token import TokenPayload
+from app.schemas.token import Principal, TokenPayload
 from app.core.security import decode_token
+from app.core.revocation import revocation_index
+from app.core.cache import user_cache, user_cache_invalidator
+from app.core.rate_limit import rate_limiter
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
 )
 
+_trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES]
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in _trusted_proxies)
+
+def get_client_ip(request: Request) -> str:
+    """
+    Client address for credential throttling. When the peer is a trusted proxy this is
+    the right-most X-Forwarded-For hop that is not itself a trusted proxy; from any
+    other peer the header is ignored, so clients cannot pick their own bucket.
+    """
+    host = request.client.host if request.client else "unknown"
+    if not _is_trusted_proxy(host):
+        return host
+    hops = [hop.strip() for header in request.headers.getlist("x-forwarded-for") for hop in header.split(",")]
+    hops = [hop for hop in hops if hop]
+    for hop in reversed(hops):
+        if not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops else host
+
+async def enforce_rate_limit(scope: str, ip: str, email: Optional[str] = None) -> None:
+    """Reject with 429 once the IP or email bucket for this endpoint is empty"""
+    retry_after = await rate_limiter.hit(scope, ip=ip, email=email)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
 async def is_token_blacklisted(jti: str) -> bool:
     """Check if a token JTI is in the blacklist"""
+    if revocation_index.ready:
+        return revocation_index.contains(jti)
     blacklisted = await TokenBlacklist.find_one(TokenBlacklist.token_jti == jti)
     return blacklisted is not None
 
-async def get_current_user(token: str = Depends(reusable_oauth2)) -> User:
+async def get_user(user_id: Optional[str]) -> Optional[User]:
+    """Load a user by id, served from the authenticated-user cache when possible"""
+    if not user_id:
+        return None
+    user = user_cache.get(user_id)
+    if user is None:
+        user = await User.get(user_id)
+        if user:
+            user_cache.set(user_id, user)
+    return user
+
+def check_token_version(token_data: TokenPayload, user: User) -> None:
+    """Reject tokens issued before the user's last mass revocation"""
+    if token_data.ver != user.token_version:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+        )
+
+async def revoke_all_tokens(user: User) -> None:
+    """
+    Invalidate every outstanding access and refresh token of a user with one counter increment.
+    Every worker drops its cached copy of the user; one that misses the invalidation
+    message keeps accepting the old tokens for at most USER_CACHE_TTL_SECONDS.
+    """
+    await User.find_one(User.id == user.id).update({"$inc": {"token_version": 1}})
+    await user_cache_invalidator.invalidate(str(user.id))
+
+def principal_claims(user: User) -> Optional[dict]:
+    """Claims to embed in access tokens when ACCESS_TOKEN_EMBED_CLAIMS is on, else None"""
+    if not settings.ACCESS_TOKEN_EMBED_CLAIMS:
+        return None
+    return {"act": user.is_active, "name": user.full_name, "email": user.email}
+
+async def decode_access_token(token: str) -> TokenPayload:
+    """Validate an access token (signature, expiry, type, blacklist) and return its payload"""
     try:
         payload = decode_token(token)
         token_data = TokenPayload(**payload)
@@ -42,14 +119,35 @@ async def get_current_user(token: str = Depends(reusable_oauth2)) -> User:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Could not validate credentials",
         )
-    
-    user = await User.get(token_data.sub)
+    return token_data
+
+async def _user_for_token(token_data: TokenPayload) -> User:
+    user = await get_user(token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    check_token_version(token_data, user)
     return user
 
+async def get_current_user(token: str = Depends(reusable_oauth2)) -> User:
+    return await _user_for_token(await decode_access_token(token))
+
+async def get_current_principal(token: str = Depends(reusable_oauth2)) -> Principal:
+    """
+    Lightweight alternative to get_current_user for endpoints that only need the
+    user's id, active flag and name. Tokens carrying principal claims are answered
+    without touching the database, so a deactivation or logout-all takes effect
+    once the access token expires; older tokens fall back to the user lookup.
+    """
+    token_data = await decode_access_token(token)
+    if token_data.act is None or token_data.sub is None:
+        user = await _user_for_token(token_data)
+        return Principal(id=str(user.id), is_active=user.is_active, full_name=user.full_name, email=user.email)
+    if not token_data.act:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return Principal(id=token_data.sub, is_active=True, full_name=token_data.name, email=token_data.email)
+
 async def get_current_user_from_token(token: str) -> User:
     """Get current user from a token string (for refresh endpoint)"""
     try:
@@ -70,10 +168,19 @@ async def get_current_user_from_token(token: str) -> User:
             detail="Could not validate credentials",
         )
     
-    user = await User.get(token_data.sub)
+    user = await get_user(token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    check_token_version(token_data, user)
     return user
 
+
+async def get_current_superuser(current_user: User = Depends(get_current_user)) -> User:
+    if not current_user.is_superuser:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="The user doesn't have enough privileges",
+        )
+    return current_user
@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+import logging
+from typing import AsyncIterator, Iterator, Optional
+
+from beanie import PydanticObjectId
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from pymongo.errors import BulkWriteError
+
+from app.api import deps
+from app.core.config import settings
+from app.core.security import get_password_hashes_async
+from app.models.user import User, normalize_email
+from app.schemas.user import UserCreate
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# (row number, parsed fields, parse error)
+Row = tuple[int, Optional[dict], Optional[str]]
+
+
+def _detect_format(file: UploadFile, requested: Optional[str]) -> str:
+    if requested:
+        return requested
+    name = (file.filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")) or (file.content_type or "").endswith("ndjson"):
+        return "jsonl"
+    return "csv"
+
+
+def _parse_rows(text: str, fmt: str) -> Iterator[Row]:
+    """CSV needs a header row (email,password[,full_name,is_active]); JSONL is one object per line"""
+    if fmt == "csv":
+        reader = csv.DictReader(io.StringIO(text))
+        for number, record in enumerate(reader, start=1):
+            yield number, {k.strip(): v for k, v in record.items() if k and v not in (None, "")}, None
+        return
+    number = 0
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, None, "Invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Expected a JSON object"
+            continue
+        yield number, record, None
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in error.errors())
+
+
+async def _provision(rows: list[Row]) -> AsyncIterator[str]:
+    """Validate, hash and insert rows batch by batch, yielding one NDJSON result per row"""
+    totals = {"created": 0, "exists": 0, "duplicate": 0, "invalid": 0, "error": 0}
+    seen: set[str] = set()
+    batch_size = settings.BULK_PROVISION_BATCH_SIZE
+
+    for start in range(0, len(rows), batch_size):
+        results: dict[int, dict] = {}
+        pending: list[tuple[int, UserCreate]] = []
+        for number, record, error in rows[start:start + batch_size]:
+            email = record.get("email") if record else None
+            if record is not None:
+                try:
+                    user_in = UserCreate(**record)
+                except ValidationError as e:
+                    error = _validation_message(e)
+            if error is not None:
+                results[number] = {"row": number, "email": email, "status": "invalid", "error": error}
+                continue
+            key = normalize_email(user_in.email)
+            if key in seen:
+                results[number] = {"row": number, "email": email, "status": "duplicate"}
+                continue
+            seen.add(key)
+            pending.append((number, user_in))
+
+        # The unique index only covers accounts that have email_normalized
+        taken = await User.legacy_emails_taken([normalize_email(user_in.email) for _, user_in in pending])
+        if taken:
+            for number, user_in in pending:
+                if normalize_email(user_in.email) in taken:
+                    results[number] = {"row": number, "email": user_in.email, "status": "exists"}
+            pending = [(number, user_in) for number, user_in in pending if number not in results]
+
+        if pending:
+            hashes = await get_password_hashes_async([user_in.password for _, user_in in pending])
+            users = [
+                User(
+                    id=PydanticObjectId(),
+                    email=user_in.email,
+                    hashed_password=hashed,
+                    full_name=user_in.full_name,
+                    is_active=user_in.is_active,
+                )
+                for (_, user_in), hashed in zip(pending, hashes)
+            ]
+            failures: dict[int, str] = {}
+            try:
+                await User.insert_many(users, ordered=False)
+            except BulkWriteError as e:
+                for write_error in e.details.get("writeErrors", []):
+                    failures[write_error["index"]] = "exists" if write_error.get("code") == 11000 else "error"
+            except Exception as e:
+                logger.error(f"Bulk provisioning insert failed: {e}")
+                failures = {i: "error" for i in range(len(users))}
+
+            for i, ((number, user_in), user) in enumerate(zip(pending, users)):
+                outcome = failures.get(i)
+                if outcome is None:
+                    results[number] = {"row": number, "email": user.email, "status": "created", "id": str(user.id)}
+                else:
+                    results[number] = {"row": number, "email": user.email, "status": outcome}
+
+        for number in sorted(results):
+            totals[results[number]["status"]] += 1
+            yield json.dumps(results[number]) + "\n"
+
+    yield json.dumps({"summary": totals}) + "\n"
+
+
+@router.post("/users/bulk")
+async def bulk_provision_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    admin: User = Depends(deps.get_current_superuser),
+):
+    """
+    Create many users from a CSV or JSONL upload.
+    Passwords are hashed in parallel on the hashing pool and users are inserted in
+    unordered batches, so one bad or existing row never blocks the rest. The response
+    streams one NDJSON line per row (created, exists, duplicate, invalid or error)
+    followed by a summary line.
+    """
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Upload must be UTF-8 encoded")
+    try:
+        rows = list(_parse_rows(text, _detect_format(file, format)))
+    except csv.Error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CSV: {e}")
+    if len(rows) > settings.BULK_PROVISION_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.BULK_PROVISION_MAX_ROWS} rows per upload",
+        )
+
+    logger.info(f"Admin {admin.id} provisioning {len(rows)} users")
+    return StreamingResponse(_provision(rows), media_type="application/x-ndjson")
@@ -1,20 +1,23 @@
+import logging
 from typing import Any
 from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from pydantic import ValidationError
+from pymongo.errors import DuplicateKeyError
 
 from app.core.security import (
     create_access_token, 
     create_refresh_token, 
-    get_password_hash, 
-    verify_password,
-    create_password_reset_token,
-    get_password_reset_expiry,
-    decode_token
+    get_password_hash_async,
+    verify_password_async,
+    password_needs_rehash,
+    PasswordHasherBusy,
+    decode_token,
+    token_codec,
 )
-from app.models.user import User
+from app.models.user import User, normalize_email
 from app.models.token_blacklist import TokenBlacklist
 from app.models.password_reset import PasswordReset
 from app.schemas.user import UserCreate, UserOut, UserLogin
@@ -22,8 +25,11 @@ from app.schemas.token import Token, TokenPayload, RefreshTokenRequest
 from app.schemas.password_reset import PasswordResetRequest, PasswordResetConfirm
 from app.api import deps
 from app.core.config import settings
+from app.core.revocation import revocation_index, revocation_writer
+from app.core.outbox import enqueue_password_reset
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 reusable_oauth2 = OAuth2PasswordBearer(
     tokenUrl=f"{settings.API_V1_STR}/auth/login"
@@ -35,36 +41,55 @@ async def signup(user_in: UserCreate) -> Any:
     """
     Create new user without the need to be logged in
     """
-    user = await User.find_one(User.email == user_in.email)
-    if user:
-        raise HTTPException(
-            status_code=400,
-            detail="The user with this email already exists in the system",
-        )
-    
     user = User(
         email=user_in.email,
-        hashed_password=get_password_hash(user_in.password),
+        hashed_password=await get_password_hash_async(user_in.password),
         full_name=user_in.full_name,
         is_active=user_in.is_active,
     )
-    await user.create()
+    # The unique email_normalized index rejects duplicates atomically; only accounts
+    # from before the field existed need checking first, until the backfill has run
+    if await User.legacy_emails_taken([normalize_email(user_in.email)]):
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system",
+        )
+    try:
+        await user.create()
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=400,
+            detail="The user with this email already exists in the system",
+        )
     return user
 
 
 @router.post("/login", response_model=Token)
-async def login(form_data: UserLogin) -> Any:
+async def login(form_data: UserLogin, client_ip: str = Depends(deps.get_client_ip)) -> Any:
     """
     Get access token for future requests
     """
-    user = await User.find_one(User.email == form_data.email)
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    email = normalize_email(form_data.email)
+    await deps.enforce_rate_limit("login", ip=client_ip, email=email)
+    user = await User.find_by_email(email)
+    if not user or not await verify_password_async(form_data.password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
     elif not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+
+    # Upgrade hashes made with another work factor while we have the plain password
+    if password_needs_rehash(user.hashed_password):
+        try:
+            await user.set({User.hashed_password: await get_password_hash_async(form_data.password)})
+        except PasswordHasherBusy:
+            pass  # Retried on a later login
+        except Exception as e:
+            logger.warning(f"Password rehash failed for user {user.id}: {e}")
     
-    access_token, _ = create_access_token(user.id)
-    refresh_token, _ = create_refresh_token(user.id)
+    access_token, _ = create_access_token(
+        user.id, token_version=user.token_version, claims=deps.principal_claims(user)
+    )
+    refresh_token, _ = create_refresh_token(user.id, token_version=user.token_version)
     
     return {
         "access_token": access_token,
@@ -107,24 +132,23 @@ async def refresh_token(request: RefreshTokenRequest) -> Any:
             detail="Could not validate credentials",
         )
         
-    user = await User.get(token_data.sub)
+    user = await deps.get_user(token_data.sub)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     if not user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
+    deps.check_token_version(token_data, user)
     
-    # Blacklist the old refresh token
+    # Blacklist the old refresh token (revoked in-process now, persisted by the write-behind buffer)
     old_jti = payload.get("jti")
     if old_jti:
-        exp = datetime.fromtimestamp(payload.get("exp", 0))
-        blacklist_entry = TokenBlacklist(
-            token_jti=old_jti,
-            exp=exp,
-        )
-        await blacklist_entry.create()
+        exp = datetime.utcfromtimestamp(payload.get("exp", 0))
+        await revocation_writer.revoke(old_jti, exp)
     
-    access_token, _ = create_access_token(user.id)
-    new_refresh_token, _ = create_refresh_token(user.id)
+    access_token, _ = create_access_token(
+        user.id, token_version=user.token_version, claims=deps.principal_claims(user)
+    )
+    new_refresh_token, _ = create_refresh_token(user.id, token_version=user.token_version)
     
     return {
         "access_token": access_token,
@@ -144,14 +168,18 @@ async def logout(token: str = Depends(reusable_oauth2)) -> Any:
         
         if jti:
             # Check if already blacklisted
-            existing = await TokenBlacklist.find_one(TokenBlacklist.token_jti == jti)
-            if not existing:
-                exp = datetime.fromtimestamp(payload.get("exp", 0))
+            if not await deps.is_token_blacklisted(jti):
+                exp = datetime.utcfromtimestamp(payload.get("exp", 0))
+                revocation_index.add(jti, exp)
                 blacklist_entry = TokenBlacklist(
                     token_jti=jti,
                     exp=exp,
                 )
-                await blacklist_entry.create()
+                try:
+                    await blacklist_entry.create()
+                except DuplicateKeyError:
+                    # Revoked concurrently by another worker
+                    pass
         
         return {"message": "Successfully logged out"}
         
@@ -162,47 +190,40 @@ async def logout(token: str = Depends(reusable_oauth2)) -> Any:
         )
 
 
+@router.post("/logout-all")
+async def logout_all(current_user: User = Depends(deps.get_current_user)) -> Any:
+    """
+    Logout from every device by revoking all outstanding tokens of the current user.
+    Workers that miss the cache invalidation honour the old tokens for at most
+    USER_CACHE_TTL_SECONDS.
+    """
+    await deps.revoke_all_tokens(current_user)
+    return {"message": "Successfully logged out from all sessions"}
+
+
 @router.post("/forget")
-async def forget_password(request: PasswordResetRequest) -> Any:
+async def forget_password(request: PasswordResetRequest, client_ip: str = Depends(deps.get_client_ip)) -> Any:
     """
     Request a password reset. 
     Always returns success to prevent email enumeration attacks.
     """
-    user = await User.find_one(User.email == request.email)
-    
-    if user:
-        # Generate reset token
-        token = create_password_reset_token()
-        exp = get_password_reset_expiry()
-        
-        # Invalidate any existing reset tokens for this user
-        await PasswordReset.find(
-            PasswordReset.user_id == str(user.id),
-            PasswordReset.used == False
-        ).update({"$set": {"used": True}})
-        
-        # Create new reset token
-        reset = PasswordReset(
-            user_id=str(user.id),
-            token=token,
-            exp=exp,
-        )
-        await reset.create()
-        
-        # TODO: Send email with reset link
-        # In production, integrate with email service (SendGrid, AWS SES, etc.)
-        # For now, log the token for development purposes
-        print(f"[DEV] Password reset token for {request.email}: {token}")
+    email = normalize_email(request.email)
+    await deps.enforce_rate_limit("forget", ip=client_ip, email=email)
+
+    # The outbox worker looks the user up, creates the reset token and sends the email,
+    # so this request costs one insert and its timing does not reveal whether the account exists
+    await enqueue_password_reset(email)
     
     # Always return success to prevent email enumeration
     return {"message": "If the email exists, a password reset link has been sent"}
 
 
 @router.post("/reset-password")
-async def reset_password(request: PasswordResetConfirm) -> Any:
+async def reset_password(request: PasswordResetConfirm, client_ip: str = Depends(deps.get_client_ip)) -> Any:
     """
     Reset password using the reset token
     """
+    await deps.enforce_rate_limit("reset-password", ip=client_ip)
     # Find the reset token
     reset = await PasswordReset.find_one(
         PasswordReset.token == request.token,
@@ -233,8 +254,10 @@ async def reset_password(request: PasswordResetConfirm) -> Any:
             detail="User not found",
         )
     
-    # Update password
-    user.hashed_password = get_password_hash(request.new_password)
+    # Update password and revoke every session issued with the old one; saving
+    # drops the user from every worker's cache
+    user.hashed_password = await get_password_hash_async(request.new_password)
+    user.token_version += 1
     await user.save()
     
     # Mark token as used
@@ -244,6 +267,15 @@ async def reset_password(request: PasswordResetConfirm) -> Any:
     return {"message": "Password has been reset successfully"}
 
 
+@router.get("/jwks")
+async def jwks() -> Any:
+    """
+    Public keys for verifying access tokens locally (empty unless ALGORITHM is EdDSA)
+    """
+    jwk = token_codec.public_jwk()
+    return {"keys": [jwk] if jwk else []}
+
+
 @router.get("/me", response_model=UserOut)
 async def read_users_me(current_user: User = Depends(deps.get_current_user)) -> Any:
     """
@@ -1,94 +1,134 @@
-from typing import List
+import orjson
+import ormsgpack
+from typing import Any, AsyncIterator, List, Mapping, Optional, Tuple
 from uuid import UUID
-from app.models.chat import Conversation, Message
+from app.models.chat import ChatMessage, Conversation
 from app.models.user import User
 from app.api.deps import get_current_user
+from app.core.connections import Frame, manager
+from app.db.message_buffer import MessageTooLarge
+from app.db.messages import add_participant, append_message, count_messages, get_conversation_header, page_messages
 from app.schemas.chat import ConversationCreate, ConversationResponse, MessageCreate, MessageResponse
-from fastapi import APIRouter, HTTPException, status, WebSocket, WebSocketDisconnect, Depends
+from fastapi import APIRouter, HTTPException, Query, Response, status, WebSocket, WebSocketDisconnect, Depends
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# WebSocket subprotocols, in order of preference. Clients offering neither get JSON text frames.
+MSGPACK_SUBPROTOCOL = "chat.msgpack"
+JSON_SUBPROTOCOL = "chat.json"
 
 router = APIRouter()
 
-class ConnectionManager:
-    def __init__(self):
-        # Map user_id to list of active WebSockets (user might have multiple tabs)
-        self.active_connections: dict[str, List[WebSocket]] = {}
-
-    async def connect(self, websocket: WebSocket, user_id: str):
-        await websocket.accept()
-        if user_id not in self.active_connections:
-            self.active_connections[user_id] = []
-        self.active_connections[user_id].append(websocket)
-
-    def disconnect(self, websocket: WebSocket, user_id: str):
-        if user_id in self.active_connections:
-            if websocket in self.active_connections[user_id]:
-                self.active_connections[user_id].remove(websocket)
-            if not self.active_connections[user_id]:
-                del self.active_connections[user_id]
-
-    async def broadcast(self, message: str, limit_to_users: List[str] = None):
-        if limit_to_users:
-            for user_id in limit_to_users:
-                if user_id in self.active_connections:
-                    for connection in self.active_connections[user_id]:
-                        try:
-                            await connection.send_text(message)
-                        except RuntimeError:
-                            # Connection might be closed
-                            pass
-        else:
-            # Broadcast to everyone (fallback)
-            for user_connections in self.active_connections.values():
-                for connection in user_connections:
-                    try:
-                        await connection.send_text(message)
-                    except RuntimeError:
-                        pass
-
-manager = ConnectionManager()
+def message_payload(message: ChatMessage) -> bytes:
+    """Broadcast payload, encoded once and sent as the same buffer to every recipient"""
+    return orjson.dumps({
+        "id": str(message.id),
+        "seq": message.seq,
+        "content": message.content,
+        "sender_type": message.sender_type,
+        "created_at": message.created_at.isoformat()
+    })
+
+def _negotiate_subprotocol(offered: List[str]) -> Optional[str]:
+    for subprotocol in (MSGPACK_SUBPROTOCOL, JSON_SUBPROTOCOL):
+        if subprotocol in offered:
+            return subprotocol
+    return None
+
+def _parse_incoming(message: Mapping[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    (content, sender_type) of a client frame, or None for a heartbeat pong.
+    Binary frames are MessagePack maps and text frames JSON objects with a string
+    content; anything else is taken as the content itself.
+    """
+    data: Optional[bytes] = message.get("bytes")
+    text: str = message.get("text") or ""
+    try:
+        payload = ormsgpack.unpackb(data) if data is not None else orjson.loads(text)
+    except (ormsgpack.MsgpackDecodeError, orjson.JSONDecodeError):
+        payload = None
+    if isinstance(payload, dict) and payload.get("type") == "pong":
+        return None
+    if not isinstance(payload, dict) or not isinstance(payload.get("content"), str):
+        return (text if data is None else data.decode("utf-8", "replace")), "user"
+    sender_type = payload.get("sender_type")
+    return payload["content"], sender_type if isinstance(sender_type, str) else "user"
+
+async def _missed_frames(conversation_id: UUID, since: int) -> AsyncIterator[Frame]:
+    """Every message after `since`, oldest first, encoded like a live broadcast"""
+    conversation = await get_conversation_header(conversation_id)
+    if not conversation:
+        return
+    while True:
+        messages, has_more = await page_messages(conversation, MAX_PAGE_SIZE, after=since)
+        for message in messages:
+            yield Frame(message_payload(message), seq=message.seq)
+        if not has_more:
+            return
+        since = messages[-1].seq
 
 @router.websocket("/ws/{conversation_id}")
-async def websocket_endpoint(websocket: WebSocket, conversation_id: UUID, user_id: str):
-    await manager.connect(websocket, user_id)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    conversation_id: UUID,
+    user_id: str,
+    binary: bool = False,
+    since: Optional[int] = None,
+    heartbeat: bool = False,
+):
+    """
+    Chat socket for one conversation; pass binary=true to receive messages as binary frames.
+    A reconnecting client passes the last seq it saw as `since` and first receives
+    only the messages it missed, then live messages. With heartbeat=true the server
+    pings the client when it is quiet with {"type": "ping"} and closes it when silent
+    past the idle timeout; answer {"type": "pong"} (or send anything) to stay connected.
+    Offering the "chat.msgpack" subprotocol switches both directions to MessagePack
+    binary frames; permessage-deflate is negotiated by the server (uvicorn) as usual.
+    """
+    room = str(conversation_id)
+    replay = _missed_frames(conversation_id, since) if since is not None else None
+    subprotocol = _negotiate_subprotocol(websocket.scope.get("subprotocols", []))
+    await manager.connect(
+        websocket,
+        room,
+        binary,
+        replay,
+        subprotocol=subprotocol,
+        msgpack=subprotocol == MSGPACK_SUBPROTOCOL,
+        heartbeat=heartbeat,
+    )
     try:
         # Add user to conversation participants if not already there
-        conversation = await Conversation.get(conversation_id)
-        if conversation and user_id not in conversation.participants:
-            conversation.participants.append(user_id)
-            await conversation.save()
+        await add_participant(conversation_id, user_id)
 
         while True:
-            data = await websocket.receive_text()
-            
-            conversation = await Conversation.get(conversation_id)
-            if conversation:
-                import json
-                try:
-                    message_data = json.loads(data)
-                    content = message_data.get("content")
-                    sender_type = message_data.get("sender_type", "user")
-                except json.JSONDecodeError:
-                    content = data
-                    sender_type = "user"
-
-                message = Message(content=content, sender_type=sender_type)
-                conversation.messages.append(message)
-                conversation.updated_at = message.created_at
-                await conversation.save()
-                
-                response_data = {
-                    "id": str(message.id),
-                    "content": message.content,
-                    "sender_type": message.sender_type,
-                    "created_at": message.created_at.isoformat()
-                }
-                # Broadcast only to participants
-                await manager.broadcast(json.dumps(response_data), limit_to_users=conversation.participants)
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", status.WS_1000_NORMAL_CLOSURE))
+            manager.touch(websocket)
+
+            incoming = _parse_incoming(frame)
+            if incoming is None:
+                continue
+            content, sender_type = incoming
+
+            # Broadcast right away; the message buffer persists it shortly after
+            try:
+                message = await append_message(conversation_id, content, sender_type)
+            except MessageTooLarge as e:
+                manager.send(websocket, f"Error: {e}")
+                continue
+            if message:
+                await manager.publish(room, message_payload(message))
             else:
-                 await websocket.send_text("Error: Conversation not found")
+                 manager.send(websocket, "Error: Conversation not found")
 
     except WebSocketDisconnect:
-        manager.disconnect(websocket, user_id)
+        pass
+    finally:
+        # Whatever ended the loop, the socket must not stay registered
+        manager.disconnect(websocket)
 
 @router.post("/conversations", response_model=ConversationResponse, status_code=status.HTTP_201_CREATED)
 async def create_conversation(
@@ -105,39 +145,67 @@ async def create_conversation(
     await conversation.insert()
     return conversation
 
-@router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
-async def get_conversation(conversation_id: UUID):
-    conversation = await Conversation.get(conversation_id)
+async def _message_page(conversation_id: UUID, before: Optional[int], after: Optional[int], limit: int):
+    if before is not None and after is not None:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    conversation = await get_conversation_header(conversation_id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    return conversation
+    messages, has_more = await page_messages(conversation, limit, before=before, after=after)
+    return conversation, messages, has_more
+
+@router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
+async def get_conversation(
+    conversation_id: UUID,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """Conversation with one page of messages (the newest by default, see get_messages)"""
+    conversation, messages, has_more = await _message_page(conversation_id, before, after, limit)
+    return ConversationResponse(
+        id=conversation.id,
+        title=conversation.title,
+        messages=[MessageResponse.model_validate(m) for m in messages],
+        message_count=await count_messages(conversation),
+        has_more_messages=has_more,
+        created_at=conversation.created_at,
+        updated_at=conversation.updated_at,
+    )
 
 @router.post("/conversations/{conversation_id}/messages", response_model=MessageResponse)
 async def create_message(conversation_id: UUID, message_in: MessageCreate):
-    conversation = await Conversation.get(conversation_id)
-    if not conversation:
+    message = await append_message(conversation_id, message_in.content, message_in.sender_type)
+    if not message:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    message = Message(**message_in.dict())
-    conversation.messages.append(message)
-    conversation.updated_at = message.created_at
-    await conversation.save()
-    
-    # Broadcast to WebSocket clients
-    response_data = {
-        "id": str(message.id),
-        "content": message.content,
-        "sender_type": message.sender_type,
-        "created_at": message.created_at.isoformat()
-    }
-    import json
-    await manager.broadcast(json.dumps(response_data))
+    # Broadcast to the conversation's WebSocket clients
+    await manager.publish(str(conversation_id), message_payload(message))
 
     return message
 
 @router.get("/conversations/{conversation_id}/messages", response_model=List[MessageResponse])
-async def get_messages(conversation_id: UUID):
-    conversation = await Conversation.get(conversation_id)
-    if not conversation:
-        raise HTTPException(status_code=404, detail="Conversation not found")
-    return conversation.messages
+async def get_messages(
+    conversation_id: UUID,
+    response: Response,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    since: Optional[int] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    """
+    Keyset-paginated message history in seq order.
+    Without a cursor the newest `limit` messages are returned; pass the first seq
+    as `before` to page back in time, or the last seq as `after` to page forwards.
+    `since` is `after` for delta sync: the messages after the last seq a client saw.
+    The body stays a plain list; the X-Total-Count header carries the number of
+    messages and X-Has-More whether more exist beyond this page in the paging direction.
+    """
+    if since is not None:
+        if after is not None:
+            raise HTTPException(status_code=400, detail="Use either after or since, not both")
+        after = since
+    conversation, messages, has_more = await _message_page(conversation_id, before, after, limit)
+    response.headers["X-Total-Count"] = str(await count_messages(conversation))
+    response.headers["X-Has-More"] = "true" if has_more else "false"
+    return messages
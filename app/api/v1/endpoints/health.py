@@ -1,7 +1,13 @@
 from fastapi import APIRouter
+from app.core import metrics
 
 router = APIRouter()
 
 @router.get("/health")
 def health_check():
     return {"status": "ok", "message": "Service is healthy"}
+
+@router.get("/metrics")
+def get_metrics():
+    """In-process counters and gauges for this worker"""
+    return metrics.snapshot()
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException
-from app.api.deps import get_current_user
-from app.models.user import User
+from app.api.deps import get_current_principal
+from app.schemas.token import Principal
 from app.core.config import settings
 from livekit import api
 from livekit.api.agent_dispatch_service import AgentDispatchService
@@ -14,7 +14,7 @@ logger = logging.getLogger(__name__)
 @router.get("/token")
 async def get_livekit_token(
     room: str,
-    current_user: User = Depends(get_current_user)
+    principal: Principal = Depends(get_current_principal)
 ):
     """
     Generate a LiveKit token for a specific room.
@@ -33,8 +33,8 @@ async def get_livekit_token(
         )
         access_token = (
             api.AccessToken(settings.LIVEKIT_API_KEY, settings.LIVEKIT_API_SECRET)
-            .with_identity(str(current_user.id))
-            .with_name(current_user.full_name or current_user.email)
+            .with_identity(principal.id)
+            .with_name(principal.full_name or principal.email or principal.id)
             .with_grants(grants)
         )
         
@@ -63,7 +63,7 @@ async def get_livekit_token(
         
         return {
             "token": token, 
-            "identity": str(current_user.id), 
+            "identity": principal.id, 
             "room": room,
             "serverUrl": settings.LIVEKIT_URL
         }
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException, status, Depends
 from uuid import UUID
-from app.models.chat import Conversation, Message
+from app.models.chat import Conversation
 from app.models.user import User
 from app.api.deps import get_current_user
+from app.db.messages import append_message
 from app.core.graph import app_graph
 from app.core.llm import get_llm
 from pypdf import PdfReader
@@ -11,6 +12,25 @@ from langchain_core.messages import HumanMessage, AIMessage
 
 router = APIRouter()
 
+def _graph_metadata(result: dict) -> dict:
+    """Conversation metadata fields taken from a graph run, as a $set on the metadata subdocument"""
+    fields = {
+        "position_valid": result.get("position_valid"),
+        "cv_valid": result.get("cv_valid"),
+        "interview_details": result.get("interview_details"),
+        "status": result.get("status"),
+        "position": result.get("position"),
+        "cv_text": result.get("cv_text"),
+        "cv_details": result.get("cv_details")
+    }
+    return {f"metadata.{key}": value for key, value in fields.items()}
+
+def _message_text(message: AIMessage) -> str:
+    """Text of a model reply, whose content may be a list of parts instead of a string"""
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(part if isinstance(part, str) else part.get("text", "") for part in message.content)
+
 @router.post("/start")
 async def start_preparation(
     file: UploadFile = File(...),
@@ -60,34 +80,23 @@ async def start_preparation(
     result = await app_graph.ainvoke(initial_state)
     
     # 4. Update Conversation with Result
-    # We need to serialize messages to store in DB (or just store text content)
-    # For metadata, we keep the state fields
-    conversation.metadata.update({
-        "position_valid": result.get("position_valid"),
-        "cv_valid": result.get("cv_valid"),
-        "interview_details": result.get("interview_details"),
-        "status": result.get("status"),
-        "position": result.get("position"), # In case it was updated
-        "cv_text": result.get("cv_text"), # In case it was updated
-        "cv_details": result.get("cv_details")
-    })
+    # For metadata, we keep the state fields (position and cv_text in case they were updated)
+    await Conversation.find_one(Conversation.id == conversation.id).update(
+        {"$set": _graph_metadata(result)}
+    )
     
     # Handle messages returned by graph
     graph_messages = result.get("messages", [])
     if graph_messages:
         last_msg = graph_messages[-1]
         if isinstance(last_msg, AIMessage):
-            msg = Message(content=last_msg.content, sender_type="ai")
-            conversation.messages.append(msg)
-            conversation.updated_at = msg.created_at
-        
-    await conversation.save()
+            await append_message(conversation.id, _message_text(last_msg), "ai")
     
     # Return the last AI message content as interview_details if it's the plan, 
     # or the validation error message.
     response_text = ""
     if graph_messages and isinstance(graph_messages[-1], AIMessage):
-        response_text = graph_messages[-1].content
+        response_text = _message_text(graph_messages[-1])
     
     return {
         "conversation_id": str(conversation.id),
@@ -116,19 +125,12 @@ async def refine_details(conversation_id: UUID, message: str = Form(...)):
     result = await app_graph.ainvoke(state)
     
     # Update Conversation
-    conversation.metadata.update({
-        "position_valid": result.get("position_valid"),
-        "cv_valid": result.get("cv_valid"),
-        "interview_details": result.get("interview_details"),
-        "status": result.get("status"),
-        "position": result.get("position"),
-        "cv_text": result.get("cv_text"),
-        "cv_details": result.get("cv_details")
-    })
+    await Conversation.find_one(Conversation.id == conversation_id).update(
+        {"$set": _graph_metadata(result)}
+    )
     
     # Save messages to DB
-    user_msg = Message(content=message, sender_type="user")
-    conversation.messages.append(user_msg)
+    await append_message(conversation_id, message, "user")
     
     graph_messages = result.get("messages", [])
     response_text = ""
@@ -136,12 +138,8 @@ async def refine_details(conversation_id: UUID, message: str = Form(...)):
     if graph_messages:
         last_msg = graph_messages[-1]
         if isinstance(last_msg, AIMessage):
-            ai_msg = Message(content=last_msg.content, sender_type="ai")
-            conversation.messages.append(ai_msg)
-            conversation.updated_at = ai_msg.created_at
-            response_text = last_msg.content
-            
-    await conversation.save()
+            response_text = _message_text(last_msg)
+            await append_message(conversation_id, response_text, "ai")
     
     return {
         "interview_details": response_text
@@ -171,13 +169,15 @@ async def accept_details(conversation_id: UUID):
             Return ONLY the cleaned markdown.
             """
             response = await llm.ainvoke([HumanMessage(content=prompt)])
-            conversation.metadata["interview_details"] = response.content
+            current_details = response.content
         except Exception as e:
             # If LLM sanitation fails (e.g. rate limit), just proceed with original text
             print(f"Warning: Failed to sanitize interview plan: {e}")
             pass
 
-    conversation.metadata["status"] = "accepted"
-    await conversation.save()
+    # Targeted $set so concurrent message appends and transcript saves are kept
+    await Conversation.find_one(Conversation.id == conversation_id).update(
+        {"$set": {"metadata.interview_details": current_details, "metadata.status": "accepted"}}
+    )
     
     return {"status": "accepted"}
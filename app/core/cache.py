@@ -0,0 +1,124 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.pubsub import PubSub, build_pubsub
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after a fixed TTL.
+    Not thread-safe; meant to be used from the event loop only.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> None:
+        if self._data.pop(key, None) is not None:
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class CacheInvalidator:
+    """
+    Drops a key from the local cache and from the same cache in every other worker.
+    Peers are reached over pub/sub; if a publish fails, their copies stay until the
+    cache TTL expires them.
+    """
+
+    CHANNEL = "invalidate"
+
+    def __init__(self, cache: TTLCache, pubsub: PubSub):
+        self.cache = cache
+        self.pubsub = pubsub
+        pubsub.handler = self._on_message
+        self.published = 0
+        self.received = 0
+        self.publish_failures = 0
+
+    async def start(self) -> None:
+        await self.pubsub.subscribe(self.CHANNEL)
+
+    async def invalidate(self, key: str) -> None:
+        self.cache.invalidate(key)
+        try:
+            await self.pubsub.publish(self.CHANNEL, key.encode())
+            self.published += 1
+        except Exception as e:
+            self.publish_failures += 1
+            logger.warning(f"Could not publish cache invalidation for {key}: {e}")
+
+    async def _on_message(self, channel: str, message: bytes) -> None:
+        # Also delivered back to the publisher, where the key is already gone
+        self.received += 1
+        self.cache.invalidate(message.decode())
+
+    def stats(self) -> dict:
+        return {
+            "published": self.published,
+            "received": self.received,
+            "publish_failures": self.publish_failures,
+        }
+
+
+# Authenticated User documents keyed by str(user.id)
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+metrics.register("user_cache", user_cache.stats)
+
+user_cache_invalidator = CacheInvalidator(
+    user_cache, build_pubsub(settings.USER_CACHE_INVALIDATION_BACKEND, prefix="user_cache:")
+)
+metrics.register("user_cache_invalidation", user_cache_invalidator.stats)
@@ -12,10 +12,86 @@ class Settings(BaseSettings):
     OPENROUTER_API_KEY: str = ""
     
     SECRET_KEY: str = "09d25e094faa6ca2556c818166b7a9563b93f7099f6f0f4caa6cf63b88e8d3e7"
-    ALGORITHM: str = "HS256"
+    ALGORITHM: str = "HS256"  # "HS256" (SECRET_KEY) or "EdDSA" (Ed25519 key pair below)
+    JWT_PRIVATE_KEY: str = ""  # PEM; only needed by processes that issue tokens
+    JWT_PUBLIC_KEY: str = ""  # PEM; published at /auth/jwks for local verification
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
+    # Embed id/active/name/email in access tokens so get_current_principal needs no
+    # user lookup; claims may be stale for up to ACCESS_TOKEN_EXPIRE_MINUTES
+    ACCESS_TOKEN_EMBED_CLAIMS: bool = False
     PASSWORD_RESET_TOKEN_EXPIRE_HOURS: int = 1
+
+    # Password hashing pool
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64
+    BCRYPT_ROUNDS: int = 12
+    # When > 0, pick the bcrypt work factor at startup so one hash takes at most this long
+    BCRYPT_TARGET_MS: float = 0
+    BCRYPT_MIN_ROUNDS: int = 10
+    BCRYPT_MAX_ROUNDS: int = 16
+
+    # Admin bulk user provisioning
+    BULK_PROVISION_MAX_ROWS: int = 5000
+    BULK_PROVISION_BATCH_SIZE: int = 100
+
+    # Token revocation index
+    REVOCATION_REFRESH_SECONDS: float = 5.0
+    REVOCATION_BLOOM_CAPACITY: int = 100_000
+    REVOCATION_WRITE_MODE: str = "buffered"  # "buffered" (write-behind) or "strict" (write-through)
+    REVOCATION_FLUSH_INTERVAL_MS: int = 250
+    REVOCATION_FLUSH_MAX_BATCH: int = 500
+
+    # Authenticated user cache
+    USER_CACHE_SIZE: int = 10_000
+    # Upper bound on how long another worker may keep serving a user after a password
+    # reset, logout-all or deactivation when its invalidation message is lost
+    USER_CACHE_TTL_SECONDS: float = 30.0
+    USER_CACHE_INVALIDATION_BACKEND: str = "memory"  # "memory" (single worker) or "redis" (notify every worker via REDIS_URL)
+
+    # Credential endpoint throttling (token buckets per client IP and per email)
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory"  # "memory" (per process) or "redis" (shared)
+    RATE_LIMIT_IP_PER_MINUTE: float = 30
+    RATE_LIMIT_IP_BURST: int = 20
+    RATE_LIMIT_EMAIL_PER_MINUTE: float = 5
+    RATE_LIMIT_EMAIL_BURST: int = 5
+    # IPs/CIDRs of the ingress and proxies in front of the app; their X-Forwarded-For
+    # names the client. Without them every request behind a proxy shares one IP bucket
+    TRUSTED_PROXIES: list[str] = []
+    REDIS_URL: str = "redis://localhost:6379/0"
+
+    # Outgoing mail (password reset emails are delivered by the outbox worker)
+    MAIL_TRANSPORT: str = "console"  # "console" (log only), "smtp" or "file" (.eml files, local stand-in)
+    MAIL_CONSOLE_SHOW_BODY: bool = False  # Development only: console logs whole emails, reset links included
+    MAIL_FROM: str = "CleverMock <no-reply@clevermock.local>"
+    MAIL_FILE_DIR: str = "./mail_outbox"
+    SMTP_HOST: str = "localhost"
+    SMTP_PORT: int = 587
+    SMTP_USERNAME: str = ""
+    SMTP_PASSWORD: str = ""
+    SMTP_STARTTLS: bool = True
+    PASSWORD_RESET_URL: str = "http://localhost:3000/reset-password?token={token}"
+    OUTBOX_BATCH_SIZE: int = 50
+    OUTBOX_POLL_SECONDS: float = 2.0
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_RETRY_BASE_SECONDS: float = 5.0
+
+    # Fallback cleanup of expired token_blacklist / password_resets documents
+    EXPIRED_DOCUMENT_REAPER_SECONDS: float = 300.0
+
+    # Chat WebSockets
+    WS_SEND_QUEUE_SIZE: int = 256  # Outbound frames buffered per connection before it is evicted
+    WS_PING_INTERVAL_SECONDS: float = 20.0  # Ping heartbeat=true clients quiet this long; also the sweep interval
+    WS_IDLE_TIMEOUT_SECONDS: float = 60.0  # Close heartbeat=true clients silent (no frame, no pong) this long
+    CHAT_PUBSUB_BACKEND: str = "memory"  # "memory" (single worker) or "redis" (fan out across workers via REDIS_URL)
+    CHAT_WRITE_MODE: str = "buffered"  # "buffered" (write-behind) or "strict" (write-through)
+    CHAT_FLUSH_INTERVAL_MS: int = 50
+    CHAT_FLUSH_MAX_BATCH: int = 500
+    CHAT_MAX_PENDING: int = 10_000  # Unflushed messages per worker; past this appends write through
+    CHAT_MAX_MESSAGE_BYTES: int = 65_536  # Larger message content is rejected
+    CHAT_JOURNAL_DIR: str = "chat_journal"  # Unflushed messages, one subdirectory per process; must be on a persistent volume
+    WEB_CONCURRENCY: int = 1  # Worker processes per host (read by uvicorn too); "memory" chat backends need 1
     
     # LiveKit Configuration
     LIVEKIT_URL: str = "ws://localhost:7880"
@@ -0,0 +1,354 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, AsyncIterator, Callable, Coroutine, Optional, Union
+
+import orjson
+import ormsgpack
+from fastapi import WebSocket, status
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.pubsub import PubSub, build_pubsub
+
+logger = logging.getLogger(__name__)
+
+_UNPARSED = object()
+
+# Coroutine that drains a connection's queue to its socket
+Writer = Callable[["Connection"], Coroutine[Any, Any, None]]
+
+
+class Frame:
+    """
+    One encoded outbound message, shared by every recipient of a broadcast.
+    Binary connections send the bytes as they are; the text form for text
+    connections and the MessagePack form for msgpack connections are each
+    converted once, on first use, not once per socket.
+    """
+
+    __slots__ = ("data", "_text", "_msgpack", "_seq")
+
+    def __init__(self, data: Union[bytes, str], seq: Optional[int] = None):
+        self._text: Optional[str]
+        if isinstance(data, str):
+            self.data, self._text = data.encode(), data
+        else:
+            self.data, self._text = data, None
+        self._msgpack: Optional[bytes] = None
+        self._seq: object = _UNPARSED if seq is None else seq
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.data.decode()
+        return self._text
+
+    @property
+    def msgpack(self) -> bytes:
+        if self._msgpack is None:
+            try:
+                value = orjson.loads(self.data)
+            except orjson.JSONDecodeError:
+                value = self.text  # Plain-text notices travel as a MessagePack string
+            self._msgpack = ormsgpack.packb(value)
+        return self._msgpack
+
+    @property
+    def seq(self) -> Optional[int]:
+        """The message seq in the payload (None for other frames), parsed once on first use"""
+        if self._seq is _UNPARSED:
+            try:
+                payload = orjson.loads(self.data)
+            except orjson.JSONDecodeError:
+                payload = None
+            self._seq = payload.get("seq") if isinstance(payload, dict) else None
+        return self._seq if isinstance(self._seq, int) else None
+
+
+# Sent to heartbeat connections quiet for a ping interval; clients answer {"type": "pong"}
+PING = Frame(b'{"type":"ping"}')
+
+
+class Connection:
+    """A WebSocket with its bounded outbound queue, drained by its own writer task"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue: int,
+        write: Writer,
+        binary: bool = False,
+        msgpack: bool = False,
+        heartbeat: bool = False,
+    ):
+        self.websocket = websocket
+        self.binary = binary  # Send binary frames instead of text frames
+        self.msgpack = msgpack  # Send MessagePack binary frames instead of JSON
+        self.heartbeat = heartbeat  # Opted in to app-level pings and the idle timeout
+        self.queue: asyncio.Queue[Frame] = asyncio.Queue(max_queue)
+        self.replayed_seq: Optional[int] = None  # Last replayed seq; queued frames up to it are duplicates
+        self.last_seen = time.monotonic()  # Last frame received from the client
+        self.joined = asyncio.Event()  # Set once its room delivers live messages; the replay waits for it
+        self.writer = asyncio.get_running_loop().create_task(write(self))
+
+
+class ConnectionManager:
+    """
+    WebSocket connections of this process, grouped into rooms (one per conversation).
+    A reverse socket -> rooms index makes disconnect cleanup independent of the
+    number of rooms, and a broadcast only visits the sockets of its room.
+    Broadcasts never wait on a socket: frames are put on each connection's bounded
+    queue and a per-connection writer sends them. A consumer too slow to keep its
+    queue below max_queue is evicted (closed) rather than slowing everyone down.
+    Messages are published through the pub/sub backend so rooms spanning several
+    workers all receive them; this process subscribes to a room's channel while it
+    holds at least one socket in it.
+    A connection can start with a replay of missed messages: it joins its room
+    first, so nothing broadcast meanwhile is lost, and its writer sends the replay
+    before the queue, skipping queued messages the replay already covered.
+    Clients that opt in to the heartbeat are pinged when quiet for a ping interval
+    (any frame from them counts as a pong) and evicted when silent past the idle
+    timeout. Other clients rely on the ASGI server's protocol-level ping. The
+    periodic sweep also drops connections whose writer has died.
+    """
+
+    def __init__(self, max_queue: int, pubsub: PubSub, ping_interval: float = 20.0, idle_timeout: float = 60.0):
+        self.max_queue = max_queue
+        self.pubsub = pubsub
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        pubsub.handler = self.broadcast
+        self.rooms: dict[str, set[WebSocket]] = {}
+        self._connections: dict[WebSocket, Connection] = {}
+        self._socket_rooms: dict[WebSocket, set[str]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.sent = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.send_errors = 0
+        self.publish_errors = 0
+        self.replayed = 0
+        self.pings = 0
+        self.reaped = 0
+
+    async def connect(
+        self,
+        websocket: WebSocket,
+        room: str,
+        binary: bool = False,
+        replay: Optional[AsyncIterator[Frame]] = None,
+        subprotocol: Optional[str] = None,
+        msgpack: bool = False,
+        heartbeat: bool = False,
+    ) -> None:
+        await websocket.accept(subprotocol=subprotocol)
+        await self.join(websocket, room, binary, replay, msgpack, heartbeat)
+
+    async def join(
+        self,
+        websocket: WebSocket,
+        room: str,
+        binary: bool = False,
+        replay: Optional[AsyncIterator[Frame]] = None,
+        msgpack: bool = False,
+        heartbeat: bool = False,
+    ) -> None:
+        """Add a socket to a room; replay (frames with seqs, in order) is sent before anything queued"""
+        if websocket not in self._connections:
+            connection = Connection(
+                websocket, self.max_queue, lambda c: self._write(c, replay), binary, msgpack, heartbeat
+            )
+            self._connections[websocket] = connection
+        first_member = room not in self.rooms
+        self.rooms.setdefault(room, set()).add(websocket)
+        self._socket_rooms.setdefault(websocket, set()).add(room)
+        try:
+            if first_member:
+                await self.pubsub.subscribe(room)
+        finally:
+            self._connections[websocket].joined.set()
+
+    def disconnect(self, websocket: WebSocket) -> None:
+        connection = self._remove(websocket)
+        if connection is not None:
+            connection.writer.cancel()
+
+    def _remove(self, websocket: WebSocket) -> Optional[Connection]:
+        for room in self._socket_rooms.pop(websocket, ()):
+            members = self.rooms.get(room)
+            if members is not None:
+                members.discard(websocket)
+                if not members:
+                    del self.rooms[room]
+                    self._spawn(self._release(room))
+        connection = self._connections.pop(websocket, None)
+        if connection is not None:
+            self.dropped += connection.queue.qsize()
+        return connection
+
+    def touch(self, websocket: WebSocket) -> None:
+        """Record that the client is alive (call on every received frame)"""
+        connection = self._connections.get(websocket)
+        if connection is not None:
+            connection.last_seen = time.monotonic()
+
+    def send(self, websocket: WebSocket, message: Union[Frame, bytes, str]) -> None:
+        """Queue a frame for one connection without waiting; evicts it if its queue is full"""
+        connection = self._connections.get(websocket)
+        if connection is None:
+            return
+        try:
+            connection.queue.put_nowait(message if isinstance(message, Frame) else Frame(message))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.evict(websocket)
+
+    async def publish(self, room: str, message: bytes) -> None:
+        """Send a message to every socket in the room, on any worker"""
+        try:
+            await self.pubsub.publish(room, message)
+        except Exception as e:
+            # Other workers miss it, but local sockets still get it
+            self.publish_errors += 1
+            logger.warning(f"Publishing to room {room} failed, delivering locally only: {e}")
+            await self.broadcast(room, message)
+
+    async def _release(self, room: str) -> None:
+        if room in self.rooms:
+            return  # Someone joined again meanwhile
+        try:
+            await self.pubsub.unsubscribe(room)
+        except Exception as e:
+            logger.warning(f"Unsubscribing from room {room} failed: {e}")
+
+    async def broadcast(self, room: str, message: bytes) -> None:
+        """Deliver to this worker's sockets in the room (pub/sub calls this for published messages)"""
+        frame = Frame(message)
+        # Copy: evicting a slow consumer changes the room
+        for websocket in list(self.rooms.get(room, ())):
+            self.send(websocket, frame)
+
+    def evict(self, websocket: WebSocket) -> None:
+        """Drop a connection that cannot keep up and close it in the background"""
+        self.evicted += 1
+        logger.warning("Evicting WebSocket consumer whose send queue is full")
+        self.disconnect(websocket)
+        self._spawn(self._close(websocket))
+
+    def sweep(self) -> None:
+        """Drop connections whose writer died; ping or evict quiet heartbeat connections"""
+        now = time.monotonic()
+        for websocket, connection in list(self._connections.items()):
+            if connection.writer.done():
+                # Its writer stopped without removing it
+                self.reaped += 1
+                self._remove(websocket)
+                continue
+            if not connection.heartbeat:
+                continue
+            idle = now - connection.last_seen
+            if idle >= self.idle_timeout:
+                self.reaped += 1
+                logger.info(f"Closing WebSocket silent for {idle:.0f}s")
+                self.disconnect(websocket)
+                self._spawn(self._close(websocket, status.WS_1001_GOING_AWAY))
+            elif idle >= self.ping_interval:
+                self.pings += 1
+                self.send(websocket, PING)
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.warning(f"WebSocket sweep failed: {e}")
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.get_running_loop().create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _close(self, websocket: WebSocket, code: int = status.WS_1013_TRY_AGAIN_LATER) -> None:
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass  # Already closed
+
+    async def _transmit(self, connection: Connection, frame: Frame) -> bool:
+        try:
+            if connection.msgpack:
+                await connection.websocket.send_bytes(frame.msgpack)
+            elif connection.binary:
+                await connection.websocket.send_bytes(frame.data)
+            else:
+                await connection.websocket.send_text(frame.text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Closed underneath us; the receive loop sees the disconnect too
+            self.send_errors += 1
+            self._remove(connection.websocket)
+            return False
+        self.sent += 1
+        return True
+
+    async def _replay(self, connection: Connection, replay: AsyncIterator[Frame]) -> bool:
+        try:
+            async for frame in replay:
+                if not await self._transmit(connection, frame):
+                    return False
+                connection.replayed_seq = frame.seq
+                self.replayed += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The live messages still follow; the client can refetch the gap over REST
+            logger.warning(f"Replaying missed messages failed: {e}")
+        return True
+
+    async def _write(self, connection: Connection, replay: Optional[AsyncIterator[Frame]] = None) -> None:
+        if replay is not None:
+            # Anything published from here on reaches the queue, so the replay only
+            # has to cover what came before
+            await connection.joined.wait()
+            if not await self._replay(connection, replay):
+                return
+        while True:
+            frame = await connection.queue.get()
+            if connection.replayed_seq is not None and frame.seq is not None:
+                if frame.seq <= connection.replayed_seq:
+                    continue  # Broadcast while the replay ran and already sent by it
+                connection.replayed_seq = None
+            if not await self._transmit(connection, frame):
+                return
+
+    def stats(self) -> dict:
+        depths = [connection.queue.qsize() for connection in self._connections.values()]
+        return {
+            "worker": os.getpid(),
+            "rooms": len(self.rooms),
+            "connections": len(self._connections),
+            "msgpack_connections": sum(1 for connection in self._connections.values() if connection.msgpack),
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "send_errors": self.send_errors,
+            "publish_errors": self.publish_errors,
+            "replayed": self.replayed,
+            "pings": self.pings,
+            "reaped": self.reaped,
+        }
+
+
+manager = ConnectionManager(
+    max_queue=settings.WS_SEND_QUEUE_SIZE,
+    pubsub=build_pubsub(settings.CHAT_PUBSUB_BACKEND),
+    ping_interval=settings.WS_PING_INTERVAL_SECONDS,
+    idle_timeout=settings.WS_IDLE_TIMEOUT_SECONDS,
+)
+metrics.register("websockets", manager.stats)
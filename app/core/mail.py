@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import smtplib
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def build_message(to: str, subject: str, body: str) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = settings.MAIL_FROM
+    message["To"] = to
+    message["Subject"] = subject
+    message.set_content(body)
+    return message
+
+
+class MailTransport:
+    """Delivers a batch of messages; returns one error (or None on success) per message"""
+
+    async def send_batch(self, messages: list[EmailMessage]) -> list[Optional[Exception]]:
+        raise NotImplementedError
+
+
+class ConsoleTransport(MailTransport):
+    """
+    Development transport: logs messages at debug level instead of sending them.
+    Bodies (reset links included) are only logged when show_body is set.
+    """
+
+    def __init__(self, show_body: bool = False):
+        self.show_body = show_body
+
+    async def send_batch(self, messages: list[EmailMessage]) -> list[Optional[Exception]]:
+        for message in messages:
+            if self.show_body:
+                logger.debug(f"Email to {message['To']}: {message['Subject']}\n{message.get_content()}")
+            else:
+                logger.debug(f"Email to {message['To']}: {message['Subject']} (body not logged)")
+        return [None] * len(messages)
+
+
+class FileTransport(MailTransport):
+    """Writes each message as an .eml file; a local stand-in for SMTP in tests and dev"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._counter = 0
+
+    def _write(self, messages: list[EmailMessage]) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for message in messages:
+            self._counter += 1
+            path = self.directory / f"{message['To']}-{id(self)}-{self._counter}.eml"
+            path.write_bytes(bytes(message))
+
+    async def send_batch(self, messages: list[EmailMessage]) -> list[Optional[Exception]]:
+        await asyncio.to_thread(self._write, messages)
+        return [None] * len(messages)
+
+
+class SMTPTransport(MailTransport):
+    """Sends a whole batch over one SMTP connection (run in a thread, smtplib is blocking)"""
+
+    def __init__(self, host: str, port: int, username: str = "", password: str = "", starttls: bool = True, timeout: float = 30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+
+    def _send(self, messages: list[EmailMessage]) -> list[Optional[Exception]]:
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            errors: list[Optional[Exception]] = []
+            for message in messages:
+                try:
+                    smtp.send_message(message)
+                    errors.append(None)
+                except smtplib.SMTPException as e:
+                    errors.append(e)
+            return errors
+
+    async def send_batch(self, messages: list[EmailMessage]) -> list[Optional[Exception]]:
+        try:
+            return await asyncio.to_thread(self._send, messages)
+        except (OSError, smtplib.SMTPException) as e:
+            # Connection-level failure: every message in the batch is retried
+            return [e] * len(messages)
+
+
+def build_mail_transport() -> MailTransport:
+    if settings.MAIL_TRANSPORT == "smtp":
+        return SMTPTransport(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            settings.SMTP_USERNAME,
+            settings.SMTP_PASSWORD,
+            settings.SMTP_STARTTLS,
+        )
+    if settings.MAIL_TRANSPORT == "file":
+        return FileTransport(settings.MAIL_FILE_DIR)
+    if settings.MAIL_TRANSPORT == "console":
+        if not settings.MAIL_CONSOLE_SHOW_BODY:
+            logger.warning("MAIL_TRANSPORT=console: emails are not delivered, only logged without their bodies")
+        return ConsoleTransport(show_body=settings.MAIL_CONSOLE_SHOW_BODY)
+    raise ValueError(f"Unknown mail transport: {settings.MAIL_TRANSPORT}")
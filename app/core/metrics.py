@@ -0,0 +1,13 @@
+from typing import Callable
+
+# In-process metrics, keyed by component name. Each provider returns a flat dict
+# of counters/gauges and is evaluated lazily when /metrics is requested.
+_providers: dict[str, Callable[[], dict]] = {}
+
+
+def register(name: str, provider: Callable[[], dict]) -> None:
+    _providers[name] = provider
+
+
+def snapshot() -> dict:
+    return {name: provider() for name, provider in _providers.items()}
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Optional
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.mail import MailTransport, build_mail_transport, build_message
+from app.core.security import create_password_reset_token, get_password_reset_expiry
+from app.models.outbox import OutboxMessage
+from app.models.password_reset import PasswordReset
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_RESET = "password_reset"
+
+# How long a claimed batch stays owned by one worker before others may retry it
+LEASE = timedelta(minutes=5)
+
+
+async def enqueue_password_reset(email: str) -> None:
+    """Queue a reset email; the worker checks whether the account exists"""
+    await OutboxMessage(kind=PASSWORD_RESET, recipient=email).insert()
+    outbox_worker.notify()
+
+
+async def _prepare_password_reset(message: OutboxMessage) -> Optional[EmailMessage]:
+    """Create the reset token on first attempt and build the email; None if there is no such user"""
+    token = message.payload.get("token")
+    if token is None:
+        user = await User.find_by_email(message.recipient)
+        if not user:
+            return None
+        # Invalidate any existing reset tokens for this user
+        await PasswordReset.find(
+            PasswordReset.user_id == str(user.id),
+            PasswordReset.used == False
+        ).update({"$set": {"used": True}})
+        token = create_password_reset_token()
+        await PasswordReset(user_id=str(user.id), token=token, exp=get_password_reset_expiry()).create()
+        # Retries resend the same token instead of minting a new one
+        await message.set({"payload.token": token})
+
+    link = settings.PASSWORD_RESET_URL.format(token=token)
+    body = (
+        "We received a request to reset your password.\n\n"
+        f"Reset it here: {link}\n\n"
+        f"This link expires in {settings.PASSWORD_RESET_TOKEN_EXPIRE_HOURS} hour(s). "
+        "If you did not ask for a reset, you can ignore this email."
+    )
+    return build_message(message.recipient, "Reset your password", body)
+
+
+PREPARERS = {
+    PASSWORD_RESET: _prepare_password_reset,
+}
+
+
+class OutboxWorker:
+    """
+    Delivers pending outbox messages in batches through a MailTransport.
+    Failed deliveries are retried with exponential backoff up to max_attempts,
+    then marked failed. Messages are claimed with a lease, so several workers
+    (or processes) can run side by side.
+    """
+
+    def __init__(self, transport: MailTransport, batch_size: int, poll_interval: float, max_attempts: int, retry_base: float):
+        self.transport = transport
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self._wakeup = asyncio.Event()
+        self.sent = 0
+        self.skipped = 0
+        self.retried = 0
+        self.failed = 0
+        self.batches = 0
+
+    def notify(self) -> None:
+        """Wake the worker early (new message queued in this process)"""
+        self._wakeup.set()
+
+    async def _claim_batch(self) -> list[OutboxMessage]:
+        now = datetime.utcnow()
+        due = {
+            "$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "locked_until": {"$lt": now}},
+            ]
+        }
+        candidates = await OutboxMessage.find(due).sort("next_attempt_at").limit(self.batch_size).to_list()
+        if not candidates:
+            return []
+        lease_id = uuid.uuid4().hex
+        await OutboxMessage.find({"_id": {"$in": [m.id for m in candidates]}, **due}).update(
+            {"$set": {"status": "sending", "lease_id": lease_id, "locked_until": now + LEASE}}
+        )
+        # Only the messages this worker actually won
+        return await OutboxMessage.find(OutboxMessage.lease_id == lease_id).to_list()
+
+    def _retry_delay(self, attempts: int) -> timedelta:
+        return timedelta(seconds=self.retry_base * 2 ** (attempts - 1))
+
+    async def _record_failure(self, message: OutboxMessage, error: Exception) -> None:
+        attempts = message.attempts + 1
+        update = {"attempts": attempts, "last_error": str(error)[:500], "lease_id": None, "locked_until": None}
+        if attempts >= self.max_attempts:
+            update["status"] = "failed"
+            self.failed += 1
+            logger.error(f"Giving up on outbox message {message.id} after {attempts} attempts: {error}")
+        else:
+            update["status"] = "pending"
+            update["next_attempt_at"] = datetime.utcnow() + self._retry_delay(attempts)
+            self.retried += 1
+        await message.set(update)
+
+    async def process_once(self) -> int:
+        """Deliver one batch; returns the number of messages claimed"""
+        batch = await self._claim_batch()
+        if not batch:
+            return 0
+        self.batches += 1
+
+        ready: list[tuple[OutboxMessage, EmailMessage]] = []
+        done_ids = []
+        for message in batch:
+            try:
+                email = await PREPARERS[message.kind](message)
+            except Exception as e:
+                await self._record_failure(message, e)
+                continue
+            if email is None:
+                done_ids.append(message.id)
+                self.skipped += 1
+            else:
+                ready.append((message, email))
+
+        if ready:
+            errors = await self.transport.send_batch([email for _, email in ready])
+            for (message, _), error in zip(ready, errors):
+                if error is None:
+                    done_ids.append(message.id)
+                    self.sent += 1
+                else:
+                    await self._record_failure(message, error)
+
+        if done_ids:
+            await OutboxMessage.find({"_id": {"$in": done_ids}}).update(
+                {"$set": {"status": "sent", "sent_at": datetime.utcnow(), "lease_id": None, "locked_until": None}}
+            )
+        return len(batch)
+
+    async def run(self) -> None:
+        while True:
+            try:
+                claimed = await self.process_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Outbox delivery pass failed: {e}")
+                claimed = 0
+            if claimed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    def stats(self) -> dict:
+        return {
+            "transport": type(self.transport).__name__,
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "retried": self.retried,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+outbox_worker = OutboxWorker(
+    build_mail_transport(),
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_SECONDS,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    retry_base=settings.OUTBOX_RETRY_BASE_SECONDS,
+)
+metrics.register("outbox", outbox_worker.stats)
@@ -0,0 +1,113 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Called with (channel, message) for every message published to a subscribed channel
+MessageHandler = Callable[[str, bytes], Awaitable[None]]
+
+
+class PubSub:
+    """
+    Channel fan-out between workers. Each process subscribes only to the channels
+    it has local listeners for; publish reaches every subscribed process.
+    """
+
+    def __init__(self):
+        self.handler: Optional[MessageHandler] = None
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        raise NotImplementedError
+
+    async def subscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    async def unsubscribe(self, channel: str) -> None:
+        raise NotImplementedError
+
+    async def run(self) -> None:
+        """Deliver incoming messages to the handler (runs for the lifetime of the app)"""
+
+    async def _deliver(self, channel: str, message: bytes) -> None:
+        if self.handler is None:
+            return
+        try:
+            await self.handler(channel, message)
+        except Exception as e:
+            logger.warning(f"Pub/sub handler failed for channel {channel}: {e}")
+
+
+class InProcessPubSub(PubSub):
+    """Single-process backend: publish delivers straight to the local subscribers"""
+
+    def __init__(self):
+        super().__init__()
+        self.channels: set[str] = set()
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        if channel in self.channels:
+            await self._deliver(channel, message)
+
+    async def subscribe(self, channel: str) -> None:
+        self.channels.add(channel)
+
+    async def unsubscribe(self, channel: str) -> None:
+        self.channels.discard(channel)
+
+
+class RedisPubSub(PubSub):
+    """Redis PUBLISH/SUBSCRIBE backend shared by every worker"""
+
+    def __init__(self, client, prefix: str = "chat:"):
+        super().__init__()
+        self.client = client
+        self.prefix = prefix
+        self.channels: set[str] = set()
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._has_channels = asyncio.Event()
+
+    @classmethod
+    def from_url(cls, url: str, prefix: str = "chat:") -> "RedisPubSub":
+        import redis.asyncio as redis
+        return cls(redis.from_url(url), prefix)
+
+    async def publish(self, channel: str, message: bytes) -> None:
+        await self.client.publish(self.prefix + channel, message)
+
+    async def subscribe(self, channel: str) -> None:
+        self.channels.add(channel)
+        await self._pubsub.subscribe(self.prefix + channel)
+        self._has_channels.set()
+
+    async def unsubscribe(self, channel: str) -> None:
+        self.channels.discard(channel)
+        if not self.channels:
+            self._has_channels.clear()
+        await self._pubsub.unsubscribe(self.prefix + channel)
+
+    async def run(self) -> None:
+        while True:
+            # The connection only exists once something is subscribed
+            await self._has_channels.wait()
+            try:
+                message = await self._pubsub.get_message(timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis pub/sub receive failed: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if message is not None and message["type"] == "message":
+                channel = message["channel"].decode()[len(self.prefix):]
+                await self._deliver(channel, message["data"])
+
+
+def build_pubsub(name: str, prefix: str = "chat:") -> PubSub:
+    if name == "redis":
+        return RedisPubSub.from_url(settings.REDIS_URL, prefix)
+    if name == "memory":
+        return InProcessPubSub()
+    raise ValueError(f"Unknown pub/sub backend: {name}")
@@ -0,0 +1,153 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class BucketPolicy:
+    """Refill `per_minute` tokens per minute, holding at most `burst`"""
+    per_minute: float
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        return self.per_minute / 60
+
+
+class TokenBucketBackend:
+    """Storage for token buckets. take() returns 0 when allowed, else seconds until it would be."""
+
+    async def take(self, key: str, policy: BucketPolicy, cost: float = 1) -> float:
+        raise NotImplementedError
+
+
+class InMemoryTokenBucketBackend(TokenBucketBackend):
+    """Per-process buckets; the least recently used keys are dropped past max_keys"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+
+    async def take(self, key: str, policy: BucketPolicy, cost: float = 1) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (policy.burst, now))
+        tokens = min(policy.burst, tokens + (now - updated) * policy.rate)
+        retry_after = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            retry_after = (cost - tokens) / policy.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class RedisTokenBucketBackend(TokenBucketBackend):
+    """Buckets shared by every worker, updated atomically by a Lua script using Redis server time"""
+
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local retry_after = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        retry_after = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+    return tostring(retry_after)
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self._script = client.register_script(self.SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisTokenBucketBackend":
+        import redis.asyncio as redis
+        return cls(redis.from_url(url))
+
+    async def take(self, key: str, policy: BucketPolicy, cost: float = 1) -> float:
+        result = await self._script(keys=[self.prefix + key], args=[policy.rate, policy.burst, cost])
+        return float(result)
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter for credential endpoints, keyed per client IP and per email.
+    Backend errors fail open: an unavailable shared store must not lock everyone out.
+    """
+
+    def __init__(self, backend: TokenBucketBackend, ip_policy: BucketPolicy, email_policy: BucketPolicy):
+        self.backend = backend
+        self.ip_policy = ip_policy
+        self.email_policy = email_policy
+        self.enabled = True
+        self.allowed = 0
+        self.limited = 0
+        self.backend_errors = 0
+
+    async def hit(self, scope: str, ip: Optional[str] = None, email: Optional[str] = None) -> float:
+        """Consume one token from each applicable bucket; returns seconds to wait, 0 if allowed"""
+        if not self.enabled:
+            return 0.0
+        buckets = []
+        if ip:
+            buckets.append((f"{scope}:ip:{ip}", self.ip_policy))
+        if email:
+            buckets.append((f"{scope}:email:{email}", self.email_policy))
+        retry_after = 0.0
+        for key, policy in buckets:
+            try:
+                retry_after = max(retry_after, await self.backend.take(key, policy))
+            except Exception as e:
+                self.backend_errors += 1
+                logger.warning(f"Rate limit backend error, allowing request: {e}")
+        if retry_after > 0:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "backend_errors": self.backend_errors,
+        }
+
+
+def build_rate_limit_backend(name: str) -> TokenBucketBackend:
+    if name == "redis":
+        return RedisTokenBucketBackend.from_url(settings.REDIS_URL)
+    if name == "memory":
+        return InMemoryTokenBucketBackend()
+    raise ValueError(f"Unknown rate limit backend: {name}")
+
+
+rate_limiter = RateLimiter(
+    build_rate_limit_backend(settings.RATE_LIMIT_BACKEND),
+    ip_policy=BucketPolicy(settings.RATE_LIMIT_IP_PER_MINUTE, settings.RATE_LIMIT_IP_BURST),
+    email_policy=BucketPolicy(settings.RATE_LIMIT_EMAIL_PER_MINUTE, settings.RATE_LIMIT_EMAIL_BURST),
+)
+rate_limiter.enabled = settings.RATE_LIMIT_ENABLED
+metrics.register("rate_limiter", rate_limiter.stats)
@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.token_blacklist import TokenBlacklist
+
+logger = logging.getLogger(__name__)
+
+# ObjectIds from different processes are only roughly time ordered, so each
+# incremental refresh re-reads a short window before the last seen entry.
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over strings.
+    Never gives false negatives; entries cannot be removed, so rebuild it to shrink.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: k positions derived from one 128-bit digest
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class RevocationIndex:
+    """
+    Process-local index of revoked token JTIs.
+    A Bloom filter answers the common "not revoked" case; positives are confirmed
+    against an exact map of jti -> exp. Entries are dropped once the token expires,
+    since an expired token is rejected by signature validation anyway.
+    Revocations made by other workers become visible after the next refresh.
+    """
+
+    def __init__(self, capacity: int):
+        self._capacity = capacity
+        self._entries: dict[str, datetime] = {}
+        self._bloom = BloomFilter(capacity)
+        self._watermark: Optional[datetime] = None
+        self.ready = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, jti: str, exp: datetime) -> None:
+        """Record a revoked token until its expiry"""
+        if exp <= datetime.utcnow():
+            return
+        self._entries[jti] = exp
+        self._bloom.add(jti)
+        if len(self._entries) > self._bloom.capacity:
+            self._rebuild()
+
+    def contains(self, jti: str) -> bool:
+        if jti not in self._bloom:
+            return False
+        return jti in self._entries
+
+    def prune(self) -> int:
+        """Drop expired entries and rebuild the Bloom filter; returns the number removed"""
+        now = datetime.utcnow()
+        expired = [jti for jti, exp in self._entries.items() if exp <= now]
+        for jti in expired:
+            del self._entries[jti]
+        if expired:
+            self._rebuild()
+        return len(expired)
+
+    def _rebuild(self) -> None:
+        capacity = self._capacity
+        while capacity < len(self._entries) * 2:
+            capacity *= 2
+        bloom = BloomFilter(capacity)
+        for jti in self._entries:
+            bloom.add(jti)
+        self._bloom = bloom
+
+    async def refresh(self) -> None:
+        """Load blacklist entries inserted since the last refresh (everything unexpired on first call)"""
+        query: dict = {"exp": {"$gt": datetime.utcnow()}}
+        if self._watermark is not None:
+            query["_id"] = {"$gte": ObjectId.from_datetime(self._watermark - REFRESH_OVERLAP)}
+        async for entry in TokenBlacklist.find(query).sort("_id"):
+            self.add(entry.token_jti, entry.exp)
+            created = entry.id.generation_time.replace(tzinfo=None)
+            if self._watermark is None or created > self._watermark:
+                self._watermark = created
+
+    async def warm(self) -> None:
+        """Initial load at startup; until this succeeds callers fall back to the database"""
+        await self.refresh()
+        self.ready = True
+        logger.info(f"Revocation index warmed with {len(self)} entries")
+
+    async def run(self, interval: float) -> None:
+        """Refresh and prune periodically (runs for the lifetime of the app)"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                if not self.ready:
+                    await self.warm()
+                else:
+                    await self.refresh()
+                self.prune()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Revocation index refresh failed: {e}")
+
+
+class RevocationWriter:
+    """
+    Records revoked tokens: the index is updated immediately, the token_blacklist
+    insert is buffered and flushed with insert_many every flush interval or once
+    max_batch entries are pending. In strict mode (or when the flush task is not
+    running) every revocation is written through before returning.
+    Until a flush, other workers learn of a buffered revocation only after it is
+    persisted and picked up by their index refresh.
+    """
+
+    def __init__(self, index: RevocationIndex, strict: bool, flush_interval: float, max_batch: int):
+        self.index = index
+        self.strict = strict
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._buffer: list[TokenBlacklist] = []
+        self._flush_requested = asyncio.Event()
+        self._running = False
+        self.flushed = 0
+        self.batches = 0
+
+    async def revoke(self, jti: str, exp: datetime) -> None:
+        self.index.add(jti, exp)
+        entry = TokenBlacklist(token_jti=jti, exp=exp)
+        if self.strict or not self._running:
+            await self._insert([entry])
+            return
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.max_batch:
+            self._flush_requested.set()
+
+    async def flush(self) -> None:
+        batch, self._buffer = self._buffer, []
+        if not batch:
+            return
+        try:
+            await self._insert(batch)
+        except Exception:
+            # Keep the entries for the next attempt
+            self._buffer[:0] = batch
+            raise
+        self.flushed += len(batch)
+        self.batches += 1
+
+    async def _insert(self, entries: list[TokenBlacklist]) -> None:
+        try:
+            await TokenBlacklist.insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            # Already revoked (e.g. by another worker) is fine; anything else is not
+            if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                raise
+
+    async def run(self) -> None:
+        self._running = True
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_requested.clear()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.warning(f"Revocation flush failed, {len(self._buffer)} entries pending: {e}")
+        finally:
+            self._running = False
+
+    def stats(self) -> dict:
+        return {
+            "mode": "strict" if self.strict else "buffered",
+            "pending": len(self._buffer),
+            "flushed": self.flushed,
+            "batches": self.batches,
+        }
+
+
+revocation_index = RevocationIndex(settings.REVOCATION_BLOOM_CAPACITY)
+metrics.register("revocation_index", lambda: {"size": len(revocation_index), "ready": revocation_index.ready})
+
+revocation_writer = RevocationWriter(
+    revocation_index,
+    strict=settings.REVOCATION_WRITE_MODE == "strict",
+    flush_interval=settings.REVOCATION_FLUSH_INTERVAL_MS / 1000,
+    max_batch=settings.REVOCATION_FLUSH_MAX_BATCH,
+)
+metrics.register("revocation_writer", revocation_writer.stats)
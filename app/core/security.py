@@ -1,10 +1,30 @@
+import asyncio
 import bcrypt
 import hashlib
+import logging
 import secrets
+import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Union, Optional
-from jose import jwt
+from typing import Any, Callable, Union, Optional
 from app.core.config import settings
+from app.core.tokens import TokenCodec
+
+logger = logging.getLogger(__name__)
+
+class PasswordHasherBusy(Exception):
+    """Raised when the password hashing pool already has too many pending jobs"""
+
+
+# bcrypt is deliberately slow (100-300 ms per call), so the async variants below
+# run it on a worker pool instead of the event loop. The pending counter bounds
+# the backlog so a burst of logins fails fast instead of queueing forever.
+_hash_pool: Optional[ProcessPoolExecutor] = None
+_hash_pending = 0
+
+# Work factor for new hashes; replaced by calibrate_bcrypt_rounds at startup when
+# BCRYPT_TARGET_MS is set. Passed explicitly to pool workers so they never use a stale copy.
+_bcrypt_rounds = settings.BCRYPT_ROUNDS
 
 def _hash_password_pre(password: str) -> str:
     # SHA256 produces a 64-character hex string, which fits in bcrypt's 72-byte limit
@@ -17,17 +37,124 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     password_byte_enc = _hash_password_pre(plain_password).encode('utf-8')
     return bcrypt.checkpw(password_byte_enc, hashed_password.encode('utf-8'))
 
-def get_password_hash(password: str) -> str:
+def get_password_hash(password: str, rounds: Optional[int] = None) -> str:
     password_byte_enc = _hash_password_pre(password).encode('utf-8')
-    return bcrypt.hashpw(password_byte_enc, bcrypt.gensalt()).decode('utf-8')
+    salt = bcrypt.gensalt(rounds=rounds or _bcrypt_rounds)
+    return bcrypt.hashpw(password_byte_enc, salt).decode('utf-8')
+
+def get_bcrypt_rounds() -> int:
+    return _bcrypt_rounds
+
+def get_hash_rounds(hashed_password: str) -> Optional[int]:
+    """Work factor encoded in a bcrypt hash ($2b$<rounds>$...), or None if it is not one"""
+    try:
+        return int(hashed_password.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """
+    Only upgrade: calibration can pick a lower cost on a slower or busier worker, and
+    hashes made with a higher cost must not be weakened (or flip back and forth).
+    """
+    rounds = get_hash_rounds(hashed_password)
+    return rounds is None or rounds < _bcrypt_rounds
+
+def calibrate_bcrypt_rounds(target_ms: float, min_rounds: int, max_rounds: int) -> int:
+    """
+    Pick the highest work factor whose hash time on this machine stays within target_ms
+    (never below min_rounds) and use it for new hashes. Returns the chosen rounds.
+    """
+    global _bcrypt_rounds
+    rounds = min_rounds
+    password_byte_enc = _hash_password_pre(secrets.token_hex(16)).encode('utf-8')
+    while rounds < max_rounds:
+        start = time.perf_counter()
+        bcrypt.hashpw(password_byte_enc, bcrypt.gensalt(rounds=rounds + 1))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms > target_ms:
+            break
+        rounds += 1
+    _bcrypt_rounds = rounds
+    logger.info(f"Calibrated bcrypt to {rounds} rounds for a {target_ms:g} ms budget")
+    return rounds
+
+def _get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    if _hash_pool is None:
+        _hash_pool = ProcessPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS)
+    return _hash_pool
+
+async def _run_in_hash_pool(func: Callable[..., Any], *args: Any) -> Any:
+    global _hash_pending
+    if _hash_pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        raise PasswordHasherBusy()
+    _hash_pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_hash_pool(), func, *args)
+    finally:
+        _hash_pending -= 1
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password on the hashing pool without blocking the event loop"""
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password on the hashing pool without blocking the event loop"""
+    return await _run_in_hash_pool(get_password_hash, password, _bcrypt_rounds)
+
+def _hash_many(passwords: list[str], rounds: int) -> list[str]:
+    return [get_password_hash(password, rounds) for password in passwords]
+
+async def get_password_hashes_async(passwords: list[str], chunk_size: int = 8) -> list[str]:
+    """
+    Hash many passwords on the pool, in order. Work is sent in small chunks with at
+    most one chunk per worker in flight, so interactive logins queued behind a bulk
+    job wait for one chunk at most; when logins fill the pool the bulk job backs off.
+    """
+    chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+    in_flight = asyncio.Semaphore(settings.PASSWORD_HASH_WORKERS)
+
+    async def hash_chunk(chunk: list[str]) -> list[str]:
+        async with in_flight:
+            while True:
+                try:
+                    return await _run_in_hash_pool(_hash_many, chunk, _bcrypt_rounds)
+                except PasswordHasherBusy:
+                    await asyncio.sleep(0.5)
+
+    results = await asyncio.gather(*(hash_chunk(chunk) for chunk in chunks))
+    return [hashed for chunk in results for hashed in chunk]
+
+def shutdown_hash_pool() -> None:
+    """Stop the hashing pool workers (called on application shutdown)"""
+    global _hash_pool
+    if _hash_pool is not None:
+        _hash_pool.shutdown(wait=False, cancel_futures=True)
+        _hash_pool = None
+
+def build_token_codec() -> TokenCodec:
+    if settings.ALGORITHM == "EdDSA":
+        return TokenCodec.from_pem(settings.JWT_PRIVATE_KEY or None, settings.JWT_PUBLIC_KEY or None)
+    return TokenCodec(settings.ALGORITHM, secret_key=settings.SECRET_KEY)
+
+# Built once so keys are not re-parsed on every encode/decode
+token_codec = build_token_codec()
 
 def generate_jti() -> str:
     """Generate a unique JWT ID for token identification"""
     return secrets.token_urlsafe(32)
 
-def create_access_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> tuple[str, str]:
+def create_access_token(
+    subject: Union[str, Any],
+    expires_delta: Optional[timedelta] = None,
+    token_version: int = 0,
+    claims: Optional[dict[str, Any]] = None,
+) -> tuple[str, str]:
     """
-    Create an access token with a unique JTI.
+    Create an access token with a unique JTI and the user's current token version.
+    Extra claims (e.g. the principal claims) are embedded as given.
     Returns tuple of (token, jti)
     """
     if expires_delta:
@@ -36,13 +163,17 @@ def create_access_token(subject: Union[str, Any], expires_delta: Optional[timede
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
     jti = generate_jti()
-    to_encode = {"exp": expire, "sub": str(subject), "type": "access", "jti": jti}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    to_encode = {"exp": expire, "sub": str(subject), "type": "access", "jti": jti, "ver": token_version}
+    if claims:
+        to_encode.update(claims)
+    encoded_jwt = token_codec.encode(to_encode)
     return encoded_jwt, jti
 
-def create_refresh_token(subject: Union[str, Any], expires_delta: Optional[timedelta] = None) -> tuple[str, str]:
+def create_refresh_token(
+    subject: Union[str, Any], expires_delta: Optional[timedelta] = None, token_version: int = 0
+) -> tuple[str, str]:
     """
-    Create a refresh token with a unique JTI.
+    Create a refresh token with a unique JTI and the user's current token version.
     Returns tuple of (token, jti)
     """
     if expires_delta:
@@ -51,8 +182,8 @@ def create_refresh_token(subject: Union[str, Any], expires_delta: Optional[timed
         expire = datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS)
     
     jti = generate_jti()
-    to_encode = {"exp": expire, "sub": str(subject), "type": "refresh", "jti": jti}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    to_encode = {"exp": expire, "sub": str(subject), "type": "refresh", "jti": jti, "ver": token_version}
+    encoded_jwt = token_codec.encode(to_encode)
     return encoded_jwt, jti
 
 def create_password_reset_token() -> str:
@@ -65,5 +196,5 @@ def get_password_reset_expiry() -> datetime:
 
 def decode_token(token: str) -> dict:
     """Decode and return the payload of a JWT token"""
-    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    return token_codec.decode(token)
 
@@ -0,0 +1,182 @@
+import base64
+import calendar
+import hashlib
+import hmac
+import json
+import time
+from datetime import datetime
+from typing import Any, Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from jose import JWTError  # type: ignore[import-untyped]
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError  # type: ignore[import-untyped]
+
+SUPPORTED_ALGORITHMS = ("HS256", "EdDSA")
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _json(data: dict) -> bytes:
+    return json.dumps(data, separators=(",", ":"), sort_keys=True).encode()
+
+
+def _key_id(public_key: Ed25519PublicKey) -> str:
+    raw = public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+    return _b64encode(hashlib.sha256(raw).digest()[:8]).decode()
+
+
+class TokenCodec:
+    """
+    JWT encoder/verifier with its key material prepared once.
+    HS256 reuses a keyed HMAC state; EdDSA (Ed25519) signs with a private key and
+    verifies with the public key, which can be published so other processes
+    verify tokens without the signing secret. Signature, exp and nbf are checked
+    in a single decode pass. Errors are python-jose exception types so existing
+    handlers keep working.
+    """
+
+    def __init__(
+        self,
+        algorithm: str,
+        secret_key: Optional[str] = None,
+        private_key: Optional[Ed25519PrivateKey] = None,
+        public_key: Optional[Ed25519PublicKey] = None,
+    ):
+        if algorithm not in SUPPORTED_ALGORITHMS:
+            raise ValueError(f"Unsupported JWT algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self._hmac = None
+        self._private_key = private_key
+        self._public_key = public_key
+        header = {"alg": algorithm, "typ": "JWT"}
+        if algorithm == "HS256":
+            if not secret_key:
+                raise ValueError("HS256 requires a secret key")
+            self._hmac = hmac.new(secret_key.encode(), digestmod=hashlib.sha256)
+        else:
+            if public_key is None and private_key is not None:
+                public_key = private_key.public_key()
+            if public_key is None:
+                raise ValueError("EdDSA requires a private or public key")
+            self._public_key = public_key
+            header["kid"] = _key_id(public_key)
+        self._header = _b64encode(_json(header))
+        self._header_str = self._header.decode()
+
+    @classmethod
+    def from_pem(cls, private_key_pem: Optional[str] = None, public_key_pem: Optional[str] = None) -> "TokenCodec":
+        """EdDSA codec from PEM keys; with only a public key the codec can verify but not sign"""
+        private_key: Optional[Ed25519PrivateKey] = None
+        public_key: Optional[Ed25519PublicKey] = None
+        if private_key_pem:
+            loaded_private = serialization.load_pem_private_key(private_key_pem.encode(), password=None)
+            if not isinstance(loaded_private, Ed25519PrivateKey):
+                raise ValueError("Expected an Ed25519 private key")
+            private_key = loaded_private
+        if public_key_pem:
+            loaded_public = serialization.load_pem_public_key(public_key_pem.encode())
+            if not isinstance(loaded_public, Ed25519PublicKey):
+                raise ValueError("Expected an Ed25519 public key")
+            public_key = loaded_public
+        return cls("EdDSA", private_key=private_key, public_key=public_key)
+
+    @classmethod
+    def from_jwk(cls, jwk: dict) -> "TokenCodec":
+        """Verify-only EdDSA codec from a published OKP/Ed25519 JWK (see public_jwk)"""
+        if jwk.get("kty") != "OKP" or jwk.get("crv") != "Ed25519":
+            raise ValueError("Expected an Ed25519 OKP key")
+        return cls("EdDSA", public_key=Ed25519PublicKey.from_public_bytes(_b64decode(jwk["x"])))
+
+    @property
+    def key_id(self) -> Optional[str]:
+        if self._public_key is None:
+            return None
+        return _key_id(self._public_key)
+
+    def public_jwk(self) -> Optional[dict]:
+        """Public verification key as a JWK, or None for the symmetric HS256 mode"""
+        if self._public_key is None:
+            return None
+        raw = self._public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        return {
+            "kty": "OKP",
+            "crv": "Ed25519",
+            "x": _b64encode(raw).decode(),
+            "alg": "EdDSA",
+            "use": "sig",
+            "kid": self.key_id,
+        }
+
+    def _sign(self, signing_input: bytes) -> bytes:
+        if self._hmac is not None:
+            mac = self._hmac.copy()
+            mac.update(signing_input)
+            return mac.digest()
+        if self._private_key is None:
+            raise JWTError("This token codec can only verify tokens")
+        return self._private_key.sign(signing_input)
+
+    def _verify(self, signing_input: bytes, signature: bytes) -> bool:
+        if self._hmac is not None:
+            mac = self._hmac.copy()
+            mac.update(signing_input)
+            return hmac.compare_digest(mac.digest(), signature)
+        if self._public_key is None:
+            return False
+        try:
+            self._public_key.verify(signature, signing_input)
+            return True
+        except InvalidSignature:
+            return False
+
+    def encode(self, claims: dict[str, Any]) -> str:
+        payload = {
+            key: calendar.timegm(value.utctimetuple()) if isinstance(value, datetime) else value
+            for key, value in claims.items()
+        }
+        signing_input = self._header + b"." + _b64encode(_json(payload))
+        return (signing_input + b"." + _b64encode(self._sign(signing_input))).decode()
+
+    def decode(self, token: str) -> dict[str, Any]:
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+            if header_segment != self._header_str:
+                header = json.loads(_b64decode(header_segment))
+                if header.get("alg") != self.algorithm:
+                    raise JWTError("The specified alg value is not allowed")
+            signature = _b64decode(signature_segment)
+        except JWTError:
+            raise
+        except (ValueError, TypeError, AttributeError):
+            raise JWTError("Invalid token")
+
+        signing_input = f"{header_segment}.{payload_segment}".encode()
+        if not self._verify(signing_input, signature):
+            raise JWTError("Signature verification failed.")
+
+        try:
+            claims = json.loads(_b64decode(payload_segment))
+        except ValueError:
+            raise JWTError("Invalid payload")
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload")
+
+        now = time.time()
+        exp = claims.get("exp")
+        if exp is not None:
+            if not isinstance(exp, (int, float)):
+                raise JWTClaimsError("Expiration Time claim (exp) must be an integer.")
+            if exp < now:
+                raise ExpiredSignatureError("Signature has expired.")
+        nbf = claims.get("nbf")
+        if nbf is not None and isinstance(nbf, (int, float)) and nbf > now:
+            raise JWTClaimsError("The token is not yet valid (nbf)")
+        return claims
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import Type
+
+from beanie import Document
+
+from app.core import metrics
+from app.models.password_reset import PasswordReset
+from app.models.token_blacklist import TokenBlacklist
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiredDocumentReaper:
+    """
+    Deletes documents whose `exp` has passed.
+    MongoDB's TTL monitor normally does this through the exp_ttl indexes; the reaper
+    covers deployments and stand-ins without one. Each sweep also records the
+    collection sizes so the working set can be watched on /metrics.
+    """
+
+    def __init__(self, models: list[Type[Document]]):
+        self.models = models
+        self.collection_sizes: dict[str, int] = {}
+        self.reaped: dict[str, int] = {model.Settings.name: 0 for model in models}
+        self.last_sweep: datetime | None = None
+
+    async def sweep(self) -> int:
+        now = datetime.utcnow()
+        total = 0
+        for model in self.models:
+            name = model.Settings.name
+            result = await model.find({"exp": {"$lt": now}}).delete()
+            deleted = result.deleted_count if result else 0
+            self.reaped[name] += deleted
+            total += deleted
+            self.collection_sizes[name] = await model.get_motor_collection().estimated_document_count()
+        self.last_sweep = now
+        return total
+
+    async def run(self, interval: float) -> None:
+        while True:
+            try:
+                deleted = await self.sweep()
+                if deleted:
+                    logger.info(f"Reaped {deleted} expired documents")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Expired document sweep failed: {e}")
+            await asyncio.sleep(interval)
+
+    def stats(self) -> dict:
+        return {
+            "collection_sizes": dict(self.collection_sizes),
+            "reaped": dict(self.reaped),
+            "last_sweep": self.last_sweep.isoformat() if self.last_sweep else None,
+        }
+
+
+expired_document_reaper = ExpiredDocumentReaper([TokenBlacklist, PasswordReset])
+metrics.register("expired_documents", expired_document_reaper.stats)
@@ -0,0 +1,577 @@
+import asyncio
+import fcntl
+import logging
+import os
+import socket
+import time
+from datetime import datetime
+from typing import BinaryIO, Iterator, Optional
+from uuid import UUID, uuid4
+
+import orjson
+from bson import Binary
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError
+
+from app.core import metrics
+from app.core.config import settings
+from app.models.chat import ChatMessage, Conversation
+
+logger = logging.getLogger(__name__)
+
+# Idle counters are dropped and re-seeded from Conversation.last_seq on next use
+COUNTER_IDLE_SECONDS = 600
+
+
+class MessageTooLarge(ValueError):
+    """Raised by MessageBuffer.append for content over CHAT_MAX_MESSAGE_BYTES"""
+
+
+async def _stored_last_seq(conversation_id: UUID) -> Optional[int]:
+    """Conversation.last_seq, or None if the conversation does not exist"""
+    conversation = await Conversation.get_motor_collection().find_one(
+        {"_id": Binary.from_uuid(conversation_id)}, projection={"last_seq": 1}
+    )
+    return None if conversation is None else conversation.get("last_seq", 0)
+
+
+class SeqAllocator:
+    """Hands out increasing per-conversation message seqs; None for unknown conversations"""
+
+    # Whether several processes can allocate from it without handing out the same seq
+    shared = False
+
+    async def allocate(self, conversation_id: UUID) -> Optional[int]:
+        raise NotImplementedError
+
+    async def advance(self, conversation_id: UUID, seq: int) -> None:
+        """Make sure later seqs are above `seq` (one was found already taken)"""
+        raise NotImplementedError
+
+    async def latest(self, conversation_id: UUID) -> Optional[int]:
+        """The last seq handed out, or None if there is no live counter"""
+        raise NotImplementedError
+
+    def prune(self, busy: set[UUID]) -> None:
+        """Forget idle state (never for conversations with unpersisted messages)"""
+
+
+class LocalSeqAllocator(SeqAllocator):
+    """
+    In-process counters seeded from Conversation.last_seq on first use.
+    Only correct while a single process writes a conversation (the in-memory
+    pub/sub setup); with several workers use RedisSeqAllocator. MessageBuffer
+    refuses to start with it while another worker journals on the same host.
+    """
+
+    def __init__(self) -> None:
+        self._counters: dict[UUID, list] = {}  # conversation_id -> [last seq, last used]
+
+    async def allocate(self, conversation_id: UUID) -> Optional[int]:
+        counter = self._counters.get(conversation_id)
+        if counter is None:
+            last_seq = await _stored_last_seq(conversation_id)
+            if last_seq is None:
+                return None
+            # Another append may have seeded it while we waited
+            counter = self._counters.setdefault(conversation_id, [last_seq, 0.0])
+        counter[0] += 1
+        counter[1] = time.monotonic()
+        return counter[0]
+
+    async def advance(self, conversation_id: UUID, seq: int) -> None:
+        counter = self._counters.setdefault(conversation_id, [seq, time.monotonic()])
+        counter[0] = max(counter[0], seq)
+
+    async def latest(self, conversation_id: UUID) -> Optional[int]:
+        counter = self._counters.get(conversation_id)
+        return None if counter is None else counter[0]
+
+    def prune(self, busy: set[UUID]) -> None:
+        cutoff = time.monotonic() - COUNTER_IDLE_SECONDS
+        idle = [cid for cid, (_, used) in self._counters.items() if used < cutoff and cid not in busy]
+        for conversation_id in idle:
+            del self._counters[conversation_id]
+
+
+class RedisSeqAllocator(SeqAllocator):
+    """Counters shared by every worker, seeded from Conversation.last_seq when missing"""
+
+    shared = True
+
+    SCRIPT = """
+    if redis.call('EXISTS', KEYS[1]) == 0 then
+        return false
+    end
+    local seq = redis.call('INCR', KEYS[1])
+    redis.call('EXPIRE', KEYS[1], ARGV[1])
+    return seq
+    """
+
+    ADVANCE_SCRIPT = """
+    local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+    if current < tonumber(ARGV[1]) then
+        redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    end
+    """
+
+    def __init__(self, client, prefix: str = "chat:seq:", ttl: int = 86400):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self._script = client.register_script(self.SCRIPT)
+        self._advance = client.register_script(self.ADVANCE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisSeqAllocator":
+        import redis.asyncio as redis
+        return cls(redis.from_url(url))
+
+    async def allocate(self, conversation_id: UUID) -> Optional[int]:
+        key = self.prefix + str(conversation_id)
+        seq = await self._script(keys=[key], args=[self.ttl])
+        if seq is None:
+            last_seq = await _stored_last_seq(conversation_id)
+            if last_seq is None:
+                return None
+            await self.client.set(key, last_seq, nx=True, ex=self.ttl)
+            seq = await self._script(keys=[key], args=[self.ttl])
+        return int(seq)
+
+    async def advance(self, conversation_id: UUID, seq: int) -> None:
+        await self._advance(keys=[self.prefix + str(conversation_id)], args=[seq, self.ttl])
+
+    async def latest(self, conversation_id: UUID) -> Optional[int]:
+        seq = await self.client.get(self.prefix + str(conversation_id))
+        return None if seq is None else int(seq)
+
+
+class MessageJournal:
+    """
+    Append-only local log of messages not yet stored, one JSON line per message.
+    Every process writes its own subdirectory of the journal root, held with an
+    exclusive lock (flock) on <name>.lock for as long as the process lives. The
+    log is split into numbered segments so a segment can be deleted once
+    everything in it is in the database. A directory whose lock is free belongs
+    to a process that is gone; orphans() hands those to replay.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.directory: Optional[str] = None
+        self._lock: Optional[BinaryIO] = None
+        self._file: Optional[BinaryIO] = None
+        self._segment = 0
+
+    def _path(self, segment: int) -> str:
+        assert self.directory is not None
+        return os.path.join(self.directory, f"{segment:010d}.jsonl")
+
+    @staticmethod
+    def segments(directory: str) -> list[str]:
+        if not os.path.isdir(directory):
+            return []
+        names = sorted(name for name in os.listdir(directory) if name.endswith(".jsonl"))
+        return [os.path.join(directory, name) for name in names]
+
+    @property
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def open(self) -> None:
+        os.makedirs(self.root, exist_ok=True)
+        name = f"{socket.gethostname()}-{os.getpid()}-{uuid4().hex[:8]}"
+        # Lock under a temporary name first: nobody may see <name>.lock unlocked
+        pending = os.path.join(self.root, f".{name}.lock")
+        lock = open(pending, "wb")
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.rename(pending, os.path.join(self.root, f"{name}.lock"))
+        self.directory = os.path.join(self.root, name)
+        os.makedirs(self.directory)
+        self._lock = lock
+        self._segment = 0
+        self._file = open(self._path(self._segment), "ab")
+
+    def append(self, message: ChatMessage) -> None:
+        if self._file is None:
+            raise RuntimeError("Message journal is not open")
+        # Flushed to the OS on every write, so a process crash loses nothing
+        self._file.write(orjson.dumps(message.model_dump(mode="json", exclude={"revision_id"})) + b"\n")
+        self._file.flush()
+
+    def rotate(self) -> str:
+        """Close the current segment and start a new one; returns the closed segment's path"""
+        if self._file is None:
+            raise RuntimeError("Message journal is not open")
+        closed = self._path(self._segment)
+        self._file.close()
+        self._segment += 1
+        self._file = open(self._path(self._segment), "ab")
+        return closed
+
+    def close(self) -> None:
+        """Close the journal; it is removed if empty, else left for the next replay"""
+        if self._file is None or self._lock is None or self.directory is None:
+            return
+        self._file.close()
+        self._file = None
+        current = self._path(self._segment)
+        if os.path.getsize(current) == 0:
+            os.remove(current)
+        if not self.segments(self.directory):
+            self.remove(self.directory)
+        self._lock.close()
+        self._lock = None
+        self.directory = None
+
+    def _lock_files(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return [os.path.join(self.root, name) for name in sorted(os.listdir(self.root))
+                if name.endswith(".lock") and not name.startswith(".")]
+
+    @staticmethod
+    def _try_lock(path: str) -> Optional[BinaryIO]:
+        """The lock on a journal directory, or None while its process holds it (or it is gone)"""
+        try:
+            lock = open(path, "rb")
+        except FileNotFoundError:
+            return None  # Removed by whoever replayed it
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    def live_siblings(self) -> int:
+        """Number of other running processes journaling under the same root"""
+        live = 0
+        for path in self._lock_files():
+            if self.directory is not None and path == self.directory + ".lock":
+                continue
+            lock = self._try_lock(path)
+            if lock is not None:
+                lock.close()
+            elif os.path.exists(path):
+                live += 1
+        return live
+
+    def orphans(self) -> Iterator[str]:
+        """Journal directories of processes that are gone, each held locked while the caller replays it"""
+        for path in self._lock_files():
+            lock = self._try_lock(path)
+            if lock is None:
+                continue
+            try:
+                yield path[:-len(".lock")]
+            finally:
+                lock.close()
+
+    def remove(self, directory: str) -> None:
+        """Delete a journal directory and its lock file (the lock is released when its holder closes it)"""
+        for path in self.segments(directory):
+            os.remove(path)
+        if os.path.isdir(directory):
+            os.rmdir(directory)
+        try:
+            os.remove(directory + ".lock")
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def read(path: str) -> list[ChatMessage]:
+        messages = []
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    messages.append(ChatMessage.model_validate(orjson.loads(line)))
+                except ValueError:
+                    # A torn last line: the crash hit mid-write, before anything was broadcast
+                    logger.warning(f"Skipping unreadable journal line in {path}")
+        return messages
+
+
+class MessageBuffer:
+    """
+    Write-behind persistence for chat messages.
+    append() gives the message its seq and returns at once, so it can be broadcast
+    without waiting on the database. Messages are journaled locally and stored with
+    one insert_many every flush interval (or once max_batch are pending); each
+    conversation's last_seq/updated_at follow with a $max. A crash between flushes
+    loses nothing: replay() stores what the journals of dead processes still hold.
+    In strict mode, while the flush task is not running, or once max_pending messages
+    are waiting, every message is written through before append() returns. Messages
+    are readable from the database only once flushed; unflushed() covers the gap for
+    this process's own messages and settle() waits out other workers' flushes.
+    A batch that fails for any reason other than the database being unreachable is
+    retried one message at a time; messages that still cannot be stored are logged
+    and dropped so they do not hold back everything behind them.
+    """
+
+    def __init__(
+        self,
+        allocator: SeqAllocator,
+        journal: MessageJournal,
+        strict: bool,
+        flush_interval: float,
+        max_batch: int,
+        max_pending: int = 10_000,
+        max_message_bytes: int = 65_536,
+    ):
+        self.allocator = allocator
+        self.journal = journal
+        self.strict = strict
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self.max_message_bytes = max_message_bytes
+        self._pending: dict[UUID, list[ChatMessage]] = {}
+        self._pending_count = 0
+        self._flushing: dict[UUID, list[ChatMessage]] = {}  # The batch being stored
+        self._sealed: list[str] = []  # Journal segments whose messages are not all stored yet
+        self._flush_requested = asyncio.Event()
+        self._running = False
+        self.flushed = 0
+        self.batches = 0
+        self.replayed = 0
+        self.reassigned = 0
+        self.written_through = 0
+        self.dead_lettered = 0
+
+    async def append(self, conversation_id: UUID, content: str, sender_type: str) -> Optional[ChatMessage]:
+        """
+        Add a message to the end of a conversation; None if the conversation does not exist.
+        Raises MessageTooLarge for content over max_message_bytes.
+        """
+        if len(content.encode()) > self.max_message_bytes:
+            raise MessageTooLarge(f"Message content exceeds {self.max_message_bytes} bytes")
+        seq = await self.allocator.allocate(conversation_id)
+        if seq is None:
+            return None
+        message = ChatMessage(
+            conversation_id=conversation_id,
+            seq=seq,
+            content=content,
+            sender_type=sender_type,
+            created_at=datetime.utcnow(),
+        )
+        if self.strict or not self._running or self._pending_count >= self.max_pending:
+            # Past max_pending the database is not keeping up; make the caller wait for it
+            if self._running and not self.strict:
+                self.written_through += 1
+            await self._store([message])
+            return message
+        self.journal.append(message)
+        self._pending.setdefault(conversation_id, []).append(message)
+        self._pending_count += 1
+        if self._pending_count >= self.max_batch:
+            self._flush_requested.set()
+        return message
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        count, self._pending_count = self._pending_count, 0
+        if self.journal.is_open:
+            self._sealed.append(self.journal.rotate())
+        self._flushing = batch
+        dropped: set[UUID] = set()
+        try:
+            await self._store_batch([message for messages in batch.values() for message in messages], dropped)
+        except Exception:
+            # Keep the messages (ahead of newer ones) for the next attempt
+            for conversation_id, messages in batch.items():
+                kept = [message for message in messages if message.id not in dropped]
+                self._pending[conversation_id] = kept + self._pending.get(conversation_id, [])
+                self._pending_count += len(kept)
+            raise
+        finally:
+            self._flushing = {}
+        for path in self._sealed:
+            os.remove(path)
+        self._sealed = []
+        self.flushed += count
+        self.batches += 1
+
+    async def settle(self, conversation_id: UUID, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every seq allocated so far in the conversation, by any worker, is
+        stored or in this process's buffer, so a read that follows sees each message
+        already broadcast. Returns False if that took longer than timeout (default
+        twenty flush intervals), e.g. because a message was dead-lettered.
+        """
+        if not self.allocator.shared:
+            return True  # Every allocation is this process's own; unflushed() has them
+        allocated = await self.allocator.latest(conversation_id)
+        if allocated is None:
+            return True
+        deadline = time.monotonic() + (20 * self.flush_interval if timeout is None else timeout)
+        while True:
+            stored = await _stored_last_seq(conversation_id) or 0
+            local = self.unflushed(conversation_id, stored)
+            if max(stored, local[-1].seq if local else 0) >= allocated:
+                return True
+            if time.monotonic() >= deadline:
+                logger.warning(f"Seqs up to {allocated} of conversation {conversation_id} are not all stored yet")
+                return False
+            await asyncio.sleep(self.flush_interval / 2)
+
+    def unflushed(self, conversation_id: UUID, after: int) -> list[ChatMessage]:
+        """This process's messages after the given seq that are not in the database yet, in seq order"""
+        messages = self._flushing.get(conversation_id, []) + self._pending.get(conversation_id, [])
+        return sorted((m for m in messages if m.seq > after), key=lambda m: m.seq)
+
+    async def _store_batch(self, messages: list[ChatMessage], dropped: set[UUID]) -> None:
+        """
+        Store messages, one at a time if the batch fails. Messages that fail on their own
+        are dead-lettered (their ids added to dropped); an unreachable database raises.
+        """
+        try:
+            await self._store(messages)
+        except ConnectionFailure:
+            raise
+        except Exception as e:
+            if len(messages) > 1:
+                logger.warning(f"Storing {len(messages)} chat messages failed, retrying one by one: {e}")
+                for message in messages:
+                    await self._store_batch([message], dropped)
+                return
+            message = messages[0]
+            self.dead_lettered += 1
+            dropped.add(message.id)
+            logger.error(
+                f"Dropping chat message {message.id} (conversation {message.conversation_id}, "
+                f"seq {message.seq}) that cannot be stored: {e}"
+            )
+
+    async def _store(self, messages: list[ChatMessage]) -> None:
+        try:
+            await ChatMessage.insert_many(messages, ordered=False)
+        except BulkWriteError as e:
+            collided = []
+            for error in e.details.get("writeErrors", []):
+                if error.get("code") != 11000:
+                    raise
+                message = messages[error["index"]]
+                # The same message already stored (e.g. a replay after a flush that died
+                # before deleting its segment) is fine; a different one holding its seq is not
+                if await ChatMessage.get(message.id) is None:
+                    collided.append(message)
+            for message in collided:
+                await self._reassign(message)
+        latest: dict[UUID, tuple[int, datetime]] = {}
+        for message in messages:
+            seq, created_at = latest.get(message.conversation_id, (message.seq, message.created_at))
+            latest[message.conversation_id] = (max(seq, message.seq), max(created_at, message.created_at))
+        collection = Conversation.get_motor_collection()
+        for conversation_id, (seq, created_at) in latest.items():
+            # $max, not $set: never moves backwards and leaves every other field alone
+            await collection.update_one(
+                {"_id": Binary.from_uuid(conversation_id)},
+                {"$max": {"last_seq": seq, "updated_at": created_at}},
+            )
+
+    async def _reassign(self, message: ChatMessage) -> None:
+        """Store a message whose seq another message already took, under a new seq"""
+        while True:
+            stored_max = await ChatMessage.find(
+                ChatMessage.conversation_id == message.conversation_id
+            ).sort("-seq").limit(1).to_list()
+            await self.allocator.advance(message.conversation_id, stored_max[0].seq if stored_max else message.seq)
+            seq = await self.allocator.allocate(message.conversation_id)
+            if seq is None:
+                logger.error(f"Dropping chat message {message.id}: its conversation no longer exists")
+                return
+            # Clients already saw it under the old seq; a resync gives them the new one
+            logger.error(f"Chat message {message.id} collided on seq {message.seq}, storing it as {seq}")
+            message.seq = seq
+            try:
+                await message.insert()
+            except DuplicateKeyError:
+                if await ChatMessage.get(message.id) is None:
+                    continue  # Lost the new seq too; try again past it
+            self.reassigned += 1
+            return
+
+    async def start(self) -> None:
+        """Open this process's journal (called at startup, before replay)"""
+        self.journal.open()
+        if not self.allocator.shared and self.journal.live_siblings():
+            self.journal.close()
+            raise RuntimeError(
+                "Several workers are running with CHAT_PUBSUB_BACKEND=memory, whose in-process "
+                "seq counters would collide; use CHAT_PUBSUB_BACKEND=redis"
+            )
+
+    async def replay(self) -> int:
+        """Store the messages journaled by processes that are gone (called at startup)"""
+        count = 0
+        for directory in self.journal.orphans():
+            messages = [message for path in self.journal.segments(directory) for message in self.journal.read(path)]
+            if messages:
+                await self._store_batch(messages, set())
+                logger.info(f"Replayed {len(messages)} chat messages from {directory}")
+            self.journal.remove(directory)
+            count += len(messages)
+        self.replayed += count
+        return count
+
+    async def run(self) -> None:
+        if not self.journal.is_open:
+            self.journal.open()
+        self._running = True
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._flush_requested.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._flush_requested.clear()
+                try:
+                    await self.flush()
+                except Exception as e:
+                    logger.warning(f"Chat message flush failed, {self._pending_count} messages pending: {e}")
+                self.allocator.prune(set(self._pending))
+        finally:
+            self._running = False
+
+    async def close(self) -> None:
+        """Store pending messages and close the journal (called on shutdown)"""
+        await self.flush()
+        self.journal.close()
+
+    def stats(self) -> dict:
+        return {
+            "mode": "strict" if self.strict else "buffered",
+            "pending": self._pending_count,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "replayed": self.replayed,
+            "reassigned": self.reassigned,
+            "written_through": self.written_through,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+def build_seq_allocator(name: str) -> SeqAllocator:
+    # Seqs must come from wherever every writer of a conversation can see them
+    if name == "redis":
+        return RedisSeqAllocator.from_url(settings.REDIS_URL)
+    if name == "memory":
+        if settings.WEB_CONCURRENCY > 1:
+            raise ValueError("CHAT_PUBSUB_BACKEND=memory supports a single worker; use redis with WEB_CONCURRENCY > 1")
+        return LocalSeqAllocator()
+    raise ValueError(f"Unknown pub/sub backend: {name}")
+
+
+message_buffer = MessageBuffer(
+    build_seq_allocator(settings.CHAT_PUBSUB_BACKEND),
+    MessageJournal(settings.CHAT_JOURNAL_DIR),
+    strict=settings.CHAT_WRITE_MODE == "strict",
+    flush_interval=settings.CHAT_FLUSH_INTERVAL_MS / 1000,
+    max_batch=settings.CHAT_FLUSH_MAX_BATCH,
+    max_pending=settings.CHAT_MAX_PENDING,
+    max_message_bytes=settings.CHAT_MAX_MESSAGE_BYTES,
+)
+metrics.register("message_buffer", message_buffer.stats)
@@ -0,0 +1,141 @@
+"""
+Data access for conversation messages.
+
+Messages live in the ChatMessage collection, one document each, keyed by
+(conversation_id, seq). Seqs are allocated and messages stored by
+app.db.message_buffer, so appends never rewrite the conversation document.
+Seqs are gap-free except where a message could not be stored (dead-lettered
+or moved to a new seq by app.db.message_buffer, both logged as errors); a client
+resuming from its last seen seq gets every message broadcast before it resumed.
+Conversations created before the collection existed may still hold an embedded
+`messages` array until app.db.migrations.migrate_embedded_messages has moved it;
+reads merge those in with the seqs the migration will give them.
+"""
+from datetime import datetime
+from typing import List, Optional, Tuple
+from uuid import UUID
+
+from bson import Binary
+from pydantic import BaseModel, Field
+
+from app.db.message_buffer import message_buffer
+from app.models.chat import ChatMessage, Conversation, Message
+
+
+class ConversationHeader(BaseModel):
+    """Conversation projection for message reads: no transcript, metadata or participants"""
+    id: UUID = Field(alias="_id")
+    title: Optional[str] = None
+    messages: List[Message] = []  # Legacy embedded messages, if not migrated yet
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+async def get_conversation_header(conversation_id: UUID) -> Optional[ConversationHeader]:
+    return await Conversation.find_one(Conversation.id == conversation_id, projection_model=ConversationHeader)
+
+
+def legacy_chat_messages(conversation_id: UUID, messages: List[Message]) -> List[ChatMessage]:
+    """Embedded messages as ChatMessages with seqs -n..-1, so they sort before every appended message"""
+    count = len(messages)
+    return [
+        ChatMessage(
+            id=message.id,
+            conversation_id=conversation_id,
+            seq=index - count,
+            content=message.content,
+            sender_type=message.sender_type,
+            created_at=message.created_at,
+        )
+        for index, message in enumerate(messages)
+    ]
+
+
+async def append_message(conversation_id: UUID, content: str, sender_type: str) -> Optional[ChatMessage]:
+    """
+    Add one message to the end of a conversation; None if the conversation does not exist.
+    The message gets its seq immediately and is persisted by the write-behind
+    message buffer, which only ever $max-es the conversation's last_seq/updated_at,
+    so concurrent writers such as the LiveKit agent's transcript $set are never
+    overwritten.
+    """
+    return await message_buffer.append(conversation_id, content, sender_type)
+
+
+async def add_participant(conversation_id: UUID, user_id: str) -> None:
+    await Conversation.get_motor_collection().update_one(
+        {"_id": Binary.from_uuid(conversation_id)},
+        {"$addToSet": {"participants": user_id}},
+    )
+
+
+async def list_messages(conversation: ConversationHeader) -> List[ChatMessage]:
+    """All messages of a conversation in seq order"""
+    messages = await ChatMessage.find(
+        ChatMessage.conversation_id == conversation.id
+    ).sort("seq").to_list()
+    if conversation.messages:
+        stored = {message.seq for message in messages}
+        legacy = [m for m in legacy_chat_messages(conversation.id, conversation.messages) if m.seq not in stored]
+        messages = sorted(legacy + messages, key=lambda m: m.seq)
+    return messages
+
+
+async def page_messages(
+    conversation: ConversationHeader,
+    limit: int,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+) -> Tuple[List[ChatMessage], bool]:
+    """
+    One page of messages in seq order and whether more exist in the paging direction.
+    Pages walk backwards from `before` (default: the newest messages) or forwards
+    from `after`; both are exclusive seq cursors served by the (conversation_id, seq)
+    index. Forward pages also include messages this process has broadcast but not
+    flushed yet, and first wait for other workers to flush theirs, so a client
+    catching up from its last seen seq misses nothing.
+    """
+    if after is not None:
+        page = await _messages_after(conversation, after, limit + 1)
+        return page[:limit], len(page) > limit
+
+    if conversation.messages:
+        # Not migrated yet: page over the merged list in memory
+        messages = await list_messages(conversation)
+        matching = [m for m in messages if before is None or m.seq < before]
+        return matching[-limit:], len(matching) > limit
+
+    query = ChatMessage.find(ChatMessage.conversation_id == conversation.id)
+    if before is not None:
+        query = query.find(ChatMessage.seq < before)
+    page = await query.sort("-seq").limit(limit + 1).to_list()
+    return page[:limit][::-1], len(page) > limit
+
+
+async def _messages_after(conversation: ConversationHeader, after: int, limit: int) -> List[ChatMessage]:
+    # Other workers may have broadcast messages they have not flushed yet
+    await message_buffer.settle(conversation.id)
+    if conversation.messages:
+        # Not migrated yet: filter the merged list in memory
+        stored = [m for m in await list_messages(conversation) if m.seq > after]
+    else:
+        stored = await ChatMessage.find(
+            ChatMessage.conversation_id == conversation.id, ChatMessage.seq > after
+        ).sort("+seq").limit(limit).to_list()
+    unflushed = message_buffer.unflushed(conversation.id, after)
+    if not unflushed:
+        return stored[:limit]
+    by_seq = {m.seq: m for m in stored}
+    by_seq.update((m.seq, m) for m in unflushed)
+    return [by_seq[seq] for seq in sorted(by_seq)][:limit]
+
+
+async def count_messages(conversation: ConversationHeader) -> int:
+    """Number of messages, counted on the (conversation_id, seq) index"""
+    stored = await ChatMessage.find(ChatMessage.conversation_id == conversation.id).count()
+    if conversation.messages:
+        migrated = await ChatMessage.find(
+            ChatMessage.conversation_id == conversation.id, ChatMessage.seq < 0
+        ).count()
+        stored += len(conversation.messages) - migrated
+    return stored
@@ -0,0 +1,68 @@
+"""
+Backfill User.email_normalized for accounts created before the field existed.
+
+Idempotent and resumable: each batch only selects users still missing the field.
+Accounts whose normalized email collides with another account are reported and
+flagged with email_collision so they can be merged by hand; other write errors
+are reported and retried on the next run.
+
+Until it has run, User.find_by_email (login, password reset) and the signup and
+bulk provisioning duplicate checks fall back to an unindexed case-insensitive
+match on email for accounts still missing the field, so run it soon after
+deploying; the fallback switches itself off once only flagged accounts are left.
+
+Usage:
+    python -m app.db.migrations.backfill_email_normalized --batch-size 1000
+"""
+import argparse
+import asyncio
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from app.db.mongodb import init_db
+from app.models.user import LEGACY_EMAIL_FILTER, User, normalize_email
+
+
+async def backfill(batch_size: int = 1000) -> dict:
+    collection = User.get_motor_collection()
+    updated = 0
+    collisions = 0
+    failed: set = set()  # Left for the next run
+    while True:
+        batch = await collection.find(
+            {**LEGACY_EMAIL_FILTER, "_id": {"$nin": list(failed)}}, projection={"email": 1}
+        ).limit(batch_size).to_list(length=batch_size)
+        if not batch:
+            break
+        requests = [
+            UpdateOne({"_id": doc["_id"]}, {"$set": {"email_normalized": normalize_email(doc["email"])}})
+            for doc in batch
+        ]
+        try:
+            result = await collection.bulk_write(requests, ordered=False)
+            updated += result.modified_count
+        except BulkWriteError as e:
+            updated += e.details.get("nModified", 0)
+            for error in e.details.get("writeErrors", []):
+                doc = batch[error["index"]]
+                if error.get("code") == 11000:
+                    await collection.update_one({"_id": doc["_id"]}, {"$set": {"email_collision": True}})
+                    collisions += 1
+                    print(f"Duplicate normalized email, flagged user {doc['_id']} <{doc['email']}> for merging")
+                else:
+                    failed.add(doc["_id"])
+                    print(f"Could not backfill user {doc['_id']} <{doc['email']}>: {error.get('errmsg', error)}")
+    return {"updated": updated, "duplicates": collisions, "failed": len(failed)}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Backfill User.email_normalized")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+    await init_db()
+    print(await backfill(args.batch_size))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,67 @@
+"""
+Move embedded Conversation.messages arrays into the ChatMessage collection.
+
+Idempotent and resumable: each batch only selects conversations that still have
+embedded messages, and messages are inserted with deterministic ids and seqs
+(-n..-1), so a rerun after an interruption skips what was already copied before
+removing the array. Safe to run while the app is serving: new messages get
+positive seqs and readers merge not-yet-migrated arrays.
+
+Usage:
+    python -m app.db.migrations.migrate_embedded_messages --batch-size 100
+"""
+import argparse
+import asyncio
+from typing import List
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+from pymongo.errors import BulkWriteError
+
+from app.db.messages import legacy_chat_messages
+from app.db.mongodb import init_db
+from app.models.chat import ChatMessage, Conversation, Message
+
+
+class EmbeddedMessages(BaseModel):
+    id: UUID = Field(alias="_id")
+    messages: List[Message] = []
+
+
+async def migrate(batch_size: int = 100) -> dict:
+    conversations = 0
+    moved = 0
+    while True:
+        batch = await Conversation.find(
+            {"messages.0": {"$exists": True}}, projection_model=EmbeddedMessages
+        ).limit(batch_size).to_list()
+        if not batch:
+            break
+        for conversation in batch:
+            messages = legacy_chat_messages(conversation.id, conversation.messages)
+            if messages:
+                try:
+                    await ChatMessage.insert_many(messages, ordered=False)
+                    moved += len(messages)
+                except BulkWriteError as e:
+                    # Copied by an interrupted earlier run
+                    if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                        raise
+                    moved += e.details.get("nInserted", 0)
+            await Conversation.find_one(Conversation.id == conversation.id).update(
+                {"$unset": {"messages": ""}}
+            )
+            conversations += 1
+    return {"conversations": conversations, "messages": moved}
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Move embedded conversation messages into their own collection")
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+    await init_db()
+    print(await migrate(args.batch_size))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -2,16 +2,23 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from beanie import init_beanie
 from app.core.config import settings
 
-async def init_db():
-    client = AsyncIOMotorClient(settings.MONGODB_URL)
+DOCUMENT_MODELS = [
+    "app.models.chat.Conversation", 
+    "app.models.chat.ChatMessage",
+    "app.models.user.User",
+    "app.models.token_blacklist.TokenBlacklist",
+    "app.models.password_reset.PasswordReset",
+    "app.models.review.Review",
+    "app.models.outbox.OutboxMessage",
+]
+
+async def init_db(database=None):
+    """Initialize Beanie on the configured MongoDB, or on a given database (e.g. an in-memory stand-in)"""
+    if database is None:
+        client = AsyncIOMotorClient(settings.MONGODB_URL)
+        database = client[settings.DATABASE_NAME]
     await init_beanie(
-        database=client[settings.DATABASE_NAME], 
-        document_models=[
-            "app.models.chat.Conversation", 
-            "app.models.user.User",
-            "app.models.token_blacklist.TokenBlacklist",
-            "app.models.password_reset.PasswordReset",
-            "app.models.review.Review",
-        ]
+        database=database, 
+        document_models=DOCUMENT_MODELS,
     )
 
@@ -1,16 +1,83 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.core.config import settings
+from app.core.security import PasswordHasherBusy, calibrate_bcrypt_rounds, shutdown_hash_pool
+from app.core.revocation import revocation_index, revocation_writer
+from app.core.cache import user_cache_invalidator
 from app.api.v1.api import api_router
 
+import asyncio
+import logging
 from contextlib import asynccontextmanager
 from app.db.mongodb import init_db
+from app.db.maintenance import expired_document_reaper
+from app.core.outbox import outbox_worker
+from app.core.connections import manager as connection_manager
+from app.db.message_buffer import MessageTooLarge, message_buffer
+
+logger = logging.getLogger(__name__)
+
+async def startup(database=None) -> list[asyncio.Task]:
+    """Initialize the database and start background workers; returns the tasks to stop on shutdown."""
+    await init_db(database)
+    if settings.BCRYPT_TARGET_MS > 0:
+        await asyncio.to_thread(
+            calibrate_bcrypt_rounds,
+            settings.BCRYPT_TARGET_MS,
+            settings.BCRYPT_MIN_ROUNDS,
+            settings.BCRYPT_MAX_ROUNDS,
+        )
+    try:
+        await revocation_index.warm()
+    except Exception as e:
+        # The refresh task retries; until then revocation checks hit the database
+        logger.warning(f"Could not warm revocation index: {e}")
+    try:
+        await user_cache_invalidator.start()
+    except Exception as e:
+        # Invalidations from other workers are missed; cached users expire after the TTL
+        logger.warning(f"Could not subscribe to user cache invalidations: {e}")
+    await message_buffer.start()
+    try:
+        # Messages journaled but not stored by processes that have stopped
+        await message_buffer.replay()
+    except Exception as e:
+        # Their journals stay on disk for the next startup
+        logger.error(f"Could not replay chat message journals: {e}")
+    background_tasks = [
+        asyncio.create_task(revocation_index.run(settings.REVOCATION_REFRESH_SECONDS)),
+        asyncio.create_task(revocation_writer.run()),
+        asyncio.create_task(expired_document_reaper.run(settings.EXPIRED_DOCUMENT_REAPER_SECONDS)),
+        asyncio.create_task(outbox_worker.run()),
+        asyncio.create_task(user_cache_invalidator.pubsub.run()),
+        asyncio.create_task(connection_manager.pubsub.run()),
+        asyncio.create_task(connection_manager.run()),
+        asyncio.create_task(message_buffer.run()),
+    ]
+    return background_tasks
+
+async def shutdown(background_tasks: list[asyncio.Task]) -> None:
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    try:
+        await revocation_writer.flush()
+    except Exception as e:
+        logger.error(f"Could not flush pending token revocations on shutdown: {e}")
+    try:
+        await message_buffer.close()
+    except Exception as e:
+        # Still in the journal; stored by the replay at next startup
+        logger.error(f"Could not flush pending chat messages on shutdown: {e}")
+    shutdown_hash_pool()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize database connection on startup."""
-    await init_db()
+    background_tasks = await startup()
     yield
+    await shutdown(background_tasks)
     # Note: LiveKit agent should be run separately using:
     # python -m livekit.agents dev app.livekit.agent:entrypoint
 
@@ -29,10 +96,24 @@ if settings.BACKEND_CORS_ORIGINS:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Total-Count", "X-Has-More"],  # Message history paging
     )
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy_handler(request: Request, exc: PasswordHasherBusy):
+    # Shed load instead of queueing more bcrypt work behind a saturated pool
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Authentication service is busy, please retry"},
+        headers={"Retry-After": "1"},
+    )
+
+@app.exception_handler(MessageTooLarge)
+async def message_too_large_handler(request: Request, exc: MessageTooLarge):
+    return JSONResponse(status_code=413, content={"detail": str(exc)})
+
 @app.get("/")
 def root():
     return {"message": "Welcome to Interview Assistant Backend"}
@@ -2,6 +2,7 @@ from typing import List, Optional
 from datetime import datetime
 from beanie import Document, Link
 from pydantic import BaseModel, Field
+from pymongo import ASCENDING, IndexModel
 from uuid import UUID, uuid4
 
 class Message(BaseModel):
@@ -10,12 +11,34 @@ class Message(BaseModel):
     sender_type: str  # "user" or "ai"
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ChatMessage(Document):
+    """One message of a conversation, stored on its own so appends don't rewrite the conversation"""
+    id: UUID = Field(default_factory=uuid4)  # type: ignore[assignment]
+    conversation_id: UUID
+    seq: int  # Position in the conversation; legacy migrated messages have negative seqs
+    content: str
+    sender_type: str  # "user" or "ai"
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "messages"
+        indexes = [
+            IndexModel(
+                [("conversation_id", ASCENDING), ("seq", ASCENDING)],
+                name="conversation_seq_unique",
+                unique=True,
+            ),
+        ]
+
 class Conversation(Document):
     id: UUID = Field(default_factory=uuid4)
     user_id: Optional[str] = None
     title: Optional[str] = None
     participants: List[str] = []
+    # Legacy embedded messages; new messages go to ChatMessage and these are moved
+    # there by app.db.migrations.migrate_embedded_messages
     messages: List[Message] = []
+    last_seq: int = 0  # Highest ChatMessage.seq allocated in this conversation
     transcript: List[dict] = []
     metadata: dict = {}
     created_at: datetime = Field(default_factory=datetime.utcnow)
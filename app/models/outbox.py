@@ -0,0 +1,33 @@
+from beanie import Document
+from datetime import datetime
+from typing import Optional
+from pydantic import Field
+from pymongo import ASCENDING, IndexModel
+
+
+class OutboxMessage(Document):
+    """
+    Outgoing message queued by a request and delivered by the outbox worker.
+    Lets endpoints return after a single insert while delivery (and its retries)
+    happens in the background.
+    """
+    kind: str  # e.g. "password_reset"
+    recipient: str
+    payload: dict = {}
+    status: str = "pending"  # pending | sending | sent | failed
+    attempts: int = 0
+    next_attempt_at: datetime = Field(default_factory=datetime.utcnow)
+    lease_id: Optional[str] = None  # Set while a worker owns the message
+    locked_until: Optional[datetime] = None  # Lease expiry; a crashed worker's messages are retried after it
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    sent_at: Optional[datetime] = None
+
+    class Settings:
+        name = "outbox"
+        indexes = [
+            IndexModel([("status", ASCENDING), ("next_attempt_at", ASCENDING)], name="status_next_attempt"),
+            IndexModel([("lease_id", ASCENDING)], name="lease_id", sparse=True),
+            # Delivered messages are kept for a week for troubleshooting
+            IndexModel([("sent_at", ASCENDING)], name="sent_at_ttl", expireAfterSeconds=7 * 24 * 3600),
+        ]
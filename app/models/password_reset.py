@@ -1,6 +1,7 @@
 from beanie import Document, Indexed
 from datetime import datetime
 from typing import Optional
+from pymongo import ASCENDING, IndexModel
 
 
 class PasswordReset(Document):
@@ -10,12 +11,15 @@ class PasswordReset(Document):
     """
     user_id: Indexed(str)  # Reference to the user
     token: Indexed(str, unique=True)  # Secure random token
-    exp: datetime  # Expiration time (typically 1 hour)
+    exp: datetime  # Expiration time (typically 1 hour) - TTL index removes the token once passed
     used: bool = False  # Whether the token has been used
     created_at: datetime = datetime.utcnow()
 
     class Settings:
         name = "password_resets"
+        indexes = [
+            IndexModel([("exp", ASCENDING)], name="exp_ttl", expireAfterSeconds=0),
+        ]
         
     class Config:
         json_schema_extra = {
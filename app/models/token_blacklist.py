@@ -1,6 +1,7 @@
 from beanie import Document, Indexed
 from datetime import datetime
 from typing import Optional
+from pymongo import ASCENDING, IndexModel
 
 
 class TokenBlacklist(Document):
@@ -9,11 +10,14 @@ class TokenBlacklist(Document):
     Used for logout functionality to invalidate tokens before expiration.
     """
     token_jti: Indexed(str, unique=True)  # JWT ID - unique identifier for the token
-    exp: datetime  # Expiration time - used for auto-cleanup
+    exp: datetime  # Expiration time (UTC) - TTL index removes the entry once passed
     created_at: datetime = datetime.utcnow()
 
     class Settings:
         name = "token_blacklist"
+        indexes = [
+            IndexModel([("exp", ASCENDING)], name="exp_ttl", expireAfterSeconds=0),
+        ]
         
     class Config:
         json_schema_extra = {
@@ -1,14 +1,89 @@
-from beanie import Document
-from pydantic import EmailStr
-from typing import Optional
+import re
+from beanie import Document, after_event, Delete, Replace, Save, SaveChanges, Update
+from pydantic import EmailStr, model_validator
+from pymongo import ASCENDING, IndexModel
+from typing import Any, Optional
 from datetime import datetime
+from app.core.cache import user_cache_invalidator
+
+
+def normalize_email(email: str) -> str:
+    """Canonical form used for uniqueness and lookups (emails compare case-insensitively)"""
+    return email.strip().lower()
+
+
+# Cleared once no account lacks email_normalized (backfill_email_normalized has run)
+_legacy_emails_remaining = True
+
+# Accounts the unique email_normalized index does not cover yet. The backfill flags
+# those it cannot give the field (their email collides with another account's) so
+# they stop keeping the fallback lookups on.
+LEGACY_EMAIL_FILTER = {"email_normalized": {"$exists": False}, "email_collision": {"$ne": True}}
+
 
 class User(Document):
     email: EmailStr
+    email_normalized: Optional[str] = None  # Derived from email; backs the unique lookup index
     hashed_password: str
     full_name: Optional[str] = None
     is_active: bool = True
+    is_superuser: bool = False
+    token_version: int = 0  # Embedded in issued tokens; bump to revoke every outstanding token
+    email_collision: bool = False  # Set by backfill_email_normalized; the account needs merging by hand
     created_at: datetime = datetime.utcnow()
 
+    @model_validator(mode="before")
+    @classmethod
+    def derive_email_normalized(cls, data: Any) -> Any:
+        if isinstance(data, dict) and data.get("email"):
+            data["email_normalized"] = normalize_email(data["email"])
+        return data
+
+    @classmethod
+    async def find_by_email(cls, email: str) -> Optional["User"]:
+        """
+        The account for an email, compared case-insensitively. Accounts created before
+        email_normalized existed are matched on email until the backfill has run.
+        """
+        global _legacy_emails_remaining
+        normalized = normalize_email(email)
+        user = await cls.find_one(cls.email_normalized == normalized)
+        if user is not None or not _legacy_emails_remaining:
+            return user
+        user = await cls.find_one({**LEGACY_EMAIL_FILTER, "email": {"$regex": f"^{re.escape(normalized)}$", "$options": "i"}})
+        if user is None and await cls.find_one(LEGACY_EMAIL_FILTER) is None:
+            _legacy_emails_remaining = False
+        return user
+
+    @classmethod
+    async def legacy_emails_taken(cls, emails: list[str]) -> set[str]:
+        """
+        Which of these normalized emails belong to accounts not yet covered by the unique
+        index, and so would not be rejected as duplicates by an insert
+        """
+        if not _legacy_emails_remaining or not emails:
+            return set()
+        patterns = [re.compile(f"^{re.escape(email)}$", re.IGNORECASE) for email in emails]
+        documents = await cls.get_motor_collection().find(
+            {**LEGACY_EMAIL_FILTER, "email": {"$in": patterns}}, projection={"email": 1}
+        ).to_list(length=None)
+        return {normalize_email(document["email"]) for document in documents}
+
+    @after_event(Save, Replace, SaveChanges, Update, Delete)
+    async def invalidate_cache(self):
+        # Query-level updates (User.find(...).update(...)) bypass this hook and must
+        # call user_cache_invalidator.invalidate themselves
+        await user_cache_invalidator.invalidate(str(self.id))
+
     class Settings:
         name = "users"
+        indexes = [
+            # Partial so legacy documents without the field don't collide on null;
+            # see app.db.migrations.backfill_email_normalized
+            IndexModel(
+                [("email_normalized", ASCENDING)],
+                name="email_normalized_unique",
+                unique=True,
+                partialFilterExpression={"email_normalized": {"$type": "string"}},
+            ),
+        ]
@@ -12,6 +12,7 @@ class MessageCreate(MessageBase):
 
 class MessageResponse(MessageBase):
     id: UUID
+    seq: Optional[int] = None  # Position in the conversation; use as the before/after cursor
     created_at: datetime
 
     class Config:
@@ -25,7 +26,9 @@ class ConversationCreate(ConversationBase):
 
 class ConversationResponse(ConversationBase):
     id: UUID
-    messages: List[MessageResponse] = []
+    messages: List[MessageResponse] = []  # Newest page unless a cursor is given
+    message_count: int = 0
+    has_more_messages: bool = False
     created_at: datetime
     updated_at: datetime
 
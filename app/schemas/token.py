@@ -9,6 +9,18 @@ class Token(BaseModel):
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
     jti: Optional[str] = None  # JWT ID for blacklisting
+    ver: int = 0  # User token version at issue time; tokens predating the claim count as 0
+    # Principal claims, only present when ACCESS_TOKEN_EMBED_CLAIMS is enabled
+    act: Optional[bool] = None
+    name: Optional[str] = None
+    email: Optional[str] = None
+
+class Principal(BaseModel):
+    """The authenticated user as far as most endpoints need to know"""
+    id: str
+    is_active: bool
+    full_name: Optional[str] = None
+    email: Optional[str] = None
 
 class RefreshTokenRequest(BaseModel):
     """Schema for refresh token request body"""
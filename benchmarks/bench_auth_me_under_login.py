@@ -0,0 +1,102 @@
+"""
+Measure /auth/me latency while logins run concurrently.
+
+The app runs in-process against an in-memory MongoDB stand-in (mongomock-motor),
+so the numbers isolate event-loop blocking from database latency. Each run is
+repeated with bcrypt executed inline on the event loop (the old behaviour) and
+on the bounded hashing pool.
+
+Usage:
+    GOOGLE_API_KEY=dummy python -m benchmarks.bench_auth_me_under_login --logins 8 --seconds 5
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from unittest.mock import patch
+
+import httpx
+from mongomock_motor import AsyncMongoMockClient
+
+from app.core import security
+from app.db.mongodb import init_db
+from app.main import app
+
+API = "/api/v1/auth"
+EMAIL = "bench@example.com"
+PASSWORD = "bench-password"
+PROBE_INTERVAL = 0.01
+
+
+async def _inline(func, *args):
+    return func(*args)
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _run(client: httpx.AsyncClient, token: str, logins: int, seconds: float) -> dict:
+    deadline = time.perf_counter() + seconds
+    latencies: list[float] = []
+    counts = {"logins": 0, "busy": 0}
+
+    async def login_worker():
+        while time.perf_counter() < deadline:
+            response = await client.post(f"{API}/login", json={"email": EMAIL, "password": PASSWORD})
+            counts["busy" if response.status_code == 503 else "logins"] += 1
+
+    async def me_probe():
+        # Latency is measured from the intended send time, so time spent waiting
+        # for a blocked event loop to schedule the probe is counted too.
+        headers = {"Authorization": f"Bearer {token}"}
+        scheduled = time.perf_counter()
+        while scheduled < deadline:
+            await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+            response = await client.get(f"{API}/me", headers=headers)
+            latencies.append((time.perf_counter() - scheduled) * 1000)
+            response.raise_for_status()
+            scheduled = max(scheduled + PROBE_INTERVAL, time.perf_counter())
+
+    await asyncio.gather(me_probe(), *(login_worker() for _ in range(logins)))
+    return {
+        "me_requests": len(latencies),
+        "me_p50_ms": statistics.median(latencies),
+        "me_p99_ms": _percentile(latencies, 99),
+        "me_max_ms": max(latencies),
+        **counts,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login loops")
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each run")
+    args = parser.parse_args()
+
+    await init_db(AsyncMongoMockClient()["bench_auth"])
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        await client.post(f"{API}/signup", json={"email": EMAIL, "password": PASSWORD})
+        response = await client.post(f"{API}/login", json={"email": EMAIL, "password": PASSWORD})
+        token = response.json()["access_token"]
+
+        print(f"{'mode':<8} {'me reqs':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'logins':>7} {'503s':>5}")
+        for mode in ("inline", "pool"):
+            if mode == "inline":
+                with patch.object(security, "_run_in_hash_pool", _inline):
+                    result = await _run(client, token, args.logins, args.seconds)
+            else:
+                result = await _run(client, token, args.logins, args.seconds)
+            print(
+                f"{mode:<8} {result['me_requests']:>8} {result['me_p50_ms']:>8.1f} "
+                f"{result['me_p99_ms']:>8.1f} {result['me_max_ms']:>8.1f} "
+                f"{result['logins']:>7} {result['busy']:>5}"
+            )
+    security.shutdown_hash_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,179 @@
+"""
+Auth throughput benchmark: signup, login, refresh, /auth/me and logout.
+
+Drives the FastAPI app in-process (httpx ASGI transport) at a fixed concurrency,
+with the same startup as the real lifespan (background workers included). The
+database is an in-memory Motor stand-in (mongomock-motor) by default, or a local
+mongod with --mongodb-url. Each phase uses the users/tokens created by the
+previous one. For every endpoint it reports throughput, p50/p95/p99 latency and
+the worst event-loop stall seen while the phase ran.
+
+Credential throttling is disabled during the run (every request comes from one
+client), and --bcrypt-rounds lowers the hashing cost for quick local runs.
+
+Usage:
+    GOOGLE_API_KEY=dummy python -m benchmarks.bench_auth_suite --users 200 --concurrency 32
+    GOOGLE_API_KEY=dummy python -m benchmarks.bench_auth_suite --mongodb-url mongodb://localhost:27017
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+from unittest.mock import patch
+
+import httpx
+
+from app.core import security
+from app.core.rate_limit import rate_limiter
+from app.main import app, shutdown, startup
+
+API = "/api/v1/auth"
+PASSWORD = "bench-password"
+STALL_PROBE_INTERVAL = 0.005
+
+
+@dataclass
+class PhaseResult:
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+    max_stall_ms: float = 0.0
+
+    def percentile(self, pct: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+class LoopStallMonitor:
+    """Measures how late a short periodic sleep wakes up; the excess is time the loop was blocked"""
+
+    def __init__(self, interval: float = STALL_PROBE_INTERVAL):
+        self.interval = interval
+        self.max_stall = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _probe(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.max_stall = max(self.max_stall, time.perf_counter() - start - self.interval)
+
+    def __enter__(self) -> "LoopStallMonitor":
+        self.max_stall = 0.0
+        self._task = asyncio.get_running_loop().create_task(self._probe())
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._task.cancel()
+
+
+async def run_phase(
+    name: str,
+    count: int,
+    concurrency: int,
+    request: Callable[[int], Awaitable[httpx.Response]],
+    on_success: Optional[Callable[[int, httpx.Response], None]] = None,
+) -> PhaseResult:
+    result = PhaseResult(name)
+    next_index = iter(range(count))
+
+    async def worker() -> None:
+        for i in next_index:
+            start = time.perf_counter()
+            try:
+                response = await request(i)
+            except httpx.HTTPError:
+                result.errors += 1
+                continue
+            result.latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                result.errors += 1
+            elif on_success:
+                on_success(i, response)
+
+    with LoopStallMonitor() as monitor:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.elapsed = time.perf_counter() - started
+    result.max_stall_ms = monitor.max_stall * 1000
+    return result
+
+
+async def run_suite(client: httpx.AsyncClient, users: int, concurrency: int) -> list[PhaseResult]:
+    run_id = uuid.uuid4().hex[:8]
+    emails = [f"bench-{run_id}-{i}@example.com" for i in range(users)]
+    access_tokens: list[Optional[str]] = [None] * users
+    refresh_tokens: list[Optional[str]] = [None] * users
+
+    def keep_tokens(i: int, response: httpx.Response) -> None:
+        body = response.json()
+        access_tokens[i] = body["access_token"]
+        refresh_tokens[i] = body["refresh_token"]
+
+    def bearer(i: int) -> dict:
+        return {"Authorization": f"Bearer {access_tokens[i]}"}
+
+    results = [
+        await run_phase("signup", users, concurrency, lambda i: client.post(
+            f"{API}/signup", json={"email": emails[i], "password": PASSWORD, "full_name": "Bench User"})),
+        await run_phase("login", users, concurrency, lambda i: client.post(
+            f"{API}/login", json={"email": emails[i], "password": PASSWORD}), keep_tokens),
+        await run_phase("refresh", users, concurrency, lambda i: client.post(
+            f"{API}/refresh", json={"refresh_token": refresh_tokens[i]}), keep_tokens),
+        # /me is the hot path, so it gets several requests per user
+        await run_phase("me", users * 5, concurrency, lambda i: client.get(
+            f"{API}/me", headers=bearer(i % users))),
+        await run_phase("logout", users, concurrency, lambda i: client.post(
+            f"{API}/logout", headers=bearer(i))),
+    ]
+    return results
+
+
+def print_report(results: list[PhaseResult]) -> None:
+    print(f"{'endpoint':<9} {'reqs':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'p99 ms':>8} {'max stall ms':>13}")
+    for r in results:
+        rate = len(r.latencies) / r.elapsed if r.elapsed else 0.0
+        median = statistics.median(r.latencies) if r.latencies else 0.0
+        print(f"{r.name:<9} {len(r.latencies):>6} {r.errors:>6} {rate:>8.1f} {median:>8.1f} "
+              f"{r.percentile(95):>8.1f} {r.percentile(99):>8.1f} {r.max_stall_ms:>13.1f}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--mongodb-url", help="local mongod to use instead of the in-memory stand-in")
+    parser.add_argument("--database", default="bench_auth_suite")
+    parser.add_argument("--bcrypt-rounds", type=int, help="override the bcrypt work factor (default: settings)")
+    args = parser.parse_args()
+
+    if args.mongodb_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        database = AsyncIOMotorClient(args.mongodb_url)[args.database]
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        database = AsyncMongoMockClient()[args.database]
+
+    rate_limiter.enabled = False
+    rounds = args.bcrypt_rounds or security.get_bcrypt_rounds()
+    with patch.object(security, "_bcrypt_rounds", rounds):
+        background_tasks = await startup(database)
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                backend = "mongod " + args.mongodb_url if args.mongodb_url else "in-memory stand-in"
+                print(f"{args.users} users, concurrency {args.concurrency}, bcrypt rounds {rounds}, {backend}")
+                print_report(await run_suite(client, args.users, args.concurrency))
+        finally:
+            await shutdown(background_tasks)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,96 @@
+"""
+Measure the login email lookup against a local mongod at a realistic user count.
+
+Seeds a dedicated database with --users accounts (reused on later runs if the
+count already matches), then times random lookups two ways:
+
+  unindexed  find_one on `email`, the query login used before (collection scan)
+  indexed    find_one on `email_normalized`, served by email_normalized_unique
+
+Requires a real mongod; the in-memory stand-in has no query planner.
+
+Usage:
+    python -m benchmarks.bench_login_lookup --mongodb-url mongodb://localhost:27017 --users 1000000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from app.core.security import get_password_hash
+from app.db.mongodb import init_db
+from app.models.user import User
+
+SEED_BATCH = 10_000
+
+
+def _email(i: int) -> str:
+    return f"Candidate.{i}@Example.com"
+
+
+def _lookup_value(field: str, i: int) -> str:
+    return _email(i) if field == "email" else _email(i).lower()
+
+
+async def _seed(collection, users: int) -> None:
+    if await collection.estimated_document_count() == users:
+        return
+    await collection.delete_many({})
+    # One shared hash: seeding a million bcrypt hashes would take hours
+    hashed_password = get_password_hash("bench-password")
+    started = time.perf_counter()
+    for offset in range(0, users, SEED_BATCH):
+        docs = []
+        for i in range(offset, min(offset + SEED_BATCH, users)):
+            email = _email(i)
+            docs.append({
+                "email": email,
+                "email_normalized": email.lower(),
+                "hashed_password": hashed_password,
+                "is_active": True,
+                "token_version": 0,
+            })
+        await collection.insert_many(docs, ordered=False)
+    print(f"Seeded {users} users in {time.perf_counter() - started:.1f}s")
+
+
+async def _time_lookups(collection, field: str, samples: list[int]) -> list[float]:
+    latencies = []
+    for i in samples:
+        start = time.perf_counter()
+        doc = await collection.find_one({field: _lookup_value(field, i)})
+        latencies.append((time.perf_counter() - start) * 1000)
+        assert doc is not None
+    return latencies
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongodb-url", default="mongodb://localhost:27017")
+    parser.add_argument("--database", default="bench_login_lookup")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=200, help="indexed lookups (unindexed runs a tenth)")
+    args = parser.parse_args()
+
+    database = AsyncIOMotorClient(args.mongodb_url)[args.database]
+    collection = database[User.Settings.name]
+    await _seed(collection, args.users)
+    await init_db(database)  # creates email_normalized_unique
+
+    rng = random.Random(42)
+    print(f"{'query':<10} {'lookups':>8} {'p50 ms':>9} {'p99 ms':>9} {'docs examined':>14}")
+    for field, count in (("email", max(1, args.lookups // 10)), ("email_normalized", args.lookups)):
+        samples = [rng.randrange(args.users) for _ in range(count)]
+        latencies = sorted(await _time_lookups(collection, field, samples))
+        explain = await collection.find({field: _lookup_value(field, samples[0])}).explain()
+        examined = explain["executionStats"]["totalDocsExamined"]
+        name = "unindexed" if field == "email" else "indexed"
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{name:<10} {count:>8} {statistics.median(latencies):>9.2f} {p99:>9.2f} {examined:>14}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+"""
+Chat WebSocket encodings: bytes and server CPU per message, JSON text vs MessagePack.
+
+For a mix of short user lines and longer AI answers it reports, per encoding:
+
+  in bytes       client frame as sent (what _parse_incoming decodes)
+  out bytes      broadcast frame as sent to every recipient
+  deflated       the broadcast frame after permessage-deflate (context takeover, as
+                 uvicorn's websockets implementation negotiates by default)
+  decode us      server CPU to parse one client frame
+  encode us      server CPU to build one broadcast frame (once per broadcast)
+  deflate us     server CPU to compress one broadcast frame (once per recipient:
+                 every connection has its own compression context)
+
+Each measurement runs --repeat times and the fastest run is reported.
+
+Usage:
+    GOOGLE_API_KEY=dummy python -m benchmarks.bench_ws_encoding --messages 2000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+import orjson
+import ormsgpack
+
+from app.api.v1.endpoints.chat import _parse_incoming, message_payload
+from app.core.connections import Frame
+from app.db.mongodb import init_db
+from app.models.chat import ChatMessage
+
+ANSWER = (
+    "A token bucket per client works well here: refill at the sustained rate, cap at the burst size, "
+    "and keep the state in Redis so every worker sees the same buckets. "
+)
+
+
+def sample_messages(count: int) -> list[ChatMessage]:
+    conversation_id = uuid.uuid4()
+    return [
+        ChatMessage(
+            conversation_id=conversation_id,
+            seq=i + 1,
+            content=f"Question {i}: how would you design a rate limiter?" if i % 2 else ANSWER * (1 + i % 4),
+            sender_type="user" if i % 2 else "ai",
+            created_at=datetime.utcnow(),
+        )
+        for i in range(count)
+    ]
+
+
+def deflate_all(frames: list[bytes]) -> tuple[int, float]:
+    """Total compressed size and CPU seconds, one compression context for the whole stream"""
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    size = 0
+    cpu = time.process_time()
+    for frame in frames:
+        data = compressor.compress(frame) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        size += len(data) - 4  # permessage-deflate drops the 00 00 ff ff tail
+    return size, time.process_time() - cpu
+
+
+def timed(repeat: int, run) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        cpu = time.process_time()
+        run()
+        best = min(best, time.process_time() - cpu)
+    return best
+
+
+def measure(name: str, messages: list[ChatMessage], msgpack: bool, repeat: int) -> str:
+    inbound = [{"content": m.content, "sender_type": m.sender_type} for m in messages]
+    if msgpack:
+        client_frames = [{"type": "websocket.receive", "bytes": ormsgpack.packb(body)} for body in inbound]
+        outbound = [Frame(message_payload(m)).msgpack for m in messages]
+    else:
+        client_frames = [{"type": "websocket.receive", "text": orjson.dumps(body).decode()} for body in inbound]
+        outbound = [message_payload(m) for m in messages]
+
+    def decode():
+        for frame in client_frames:
+            _parse_incoming(frame)
+
+    def encode():
+        for message in messages:
+            frame = Frame(message_payload(message))
+            if msgpack:
+                frame.msgpack
+            else:
+                frame.text
+
+    count = len(messages)
+    in_bytes = sum(len(f.get("bytes") or f["text"].encode()) for f in client_frames) / count
+    out_bytes = sum(len(frame) for frame in outbound) / count
+    deflated, _ = deflate_all(outbound)
+    deflate_cpu = min(deflate_all(outbound)[1] for _ in range(repeat))
+    return (
+        f"{name:<9} {in_bytes:>9.0f} {out_bytes:>10.0f} {deflated / count:>9.0f} "
+        f"{timed(repeat, decode) / count * 1e6:>10.2f} {timed(repeat, encode) / count * 1e6:>10.2f} "
+        f"{deflate_cpu / count * 1e6:>11.2f}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    from mongomock_motor import AsyncMongoMockClient
+    # Messages are never stored, but Beanie documents need an initialized model
+    asyncio.run(init_db(AsyncMongoMockClient()["bench_ws_encoding"]))
+    messages = sample_messages(args.messages)
+    print(f"{args.messages} messages, best of {args.repeat}")
+    print(f"{'encoding':<9} {'in bytes':>9} {'out bytes':>10} {'deflated':>9} {'decode us':>10} "
+          f"{'encode us':>10} {'deflate us':>11}")
+    print(measure("json", messages, False, args.repeat))
+    print(measure("msgpack", messages, True, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
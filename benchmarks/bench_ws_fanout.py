@@ -0,0 +1,148 @@
+"""
+Chat fan-out cost: one broadcast delivered to many in-process WebSockets.
+
+Builds a room of fake sockets and reports CPU time per delivered message for:
+
+  json direct     json.dumps, then await send_text socket by socket (the original broadcast)
+  json text       json.dumps to str through ConnectionManager (bounded queue and writer per socket)
+  orjson text     orjson bytes encoded once, text frames (decoded once per broadcast)
+  orjson binary   orjson bytes encoded once, the same buffer sent as binary frames
+
+Fake sockets stand in for the ASGI server: a text frame is UTF-8 encoded per send,
+a binary frame is passed through as is. Each mode runs --repeat times and the
+fastest run is reported.
+
+Usage:
+    GOOGLE_API_KEY=dummy python -m benchmarks.bench_ws_fanout --sockets 1000 --messages 200
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime
+
+import orjson
+
+from app.core.connections import ConnectionManager
+from app.core.pubsub import InProcessPubSub
+
+ROOM = "bench-room"
+
+
+class FakeWebSocket:
+    def __init__(self, expected: int, done: asyncio.Event, counter: list):
+        self.expected = expected
+        self.done = done
+        self.counter = counter
+        self.bytes_sent = 0
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    def _delivered(self, size: int) -> None:
+        self.bytes_sent += size
+        self.counter[0] += 1
+        if self.counter[0] == self.expected:
+            self.done.set()
+
+    async def send_text(self, text: str):
+        self._delivered(len(text.encode("utf-8")))
+
+    async def send_bytes(self, data: bytes):
+        self._delivered(len(data))
+
+
+def sample_message(i: int) -> dict:
+    return {
+        "id": uuid.uuid4(),
+        "content": f"Message {i}: could you walk me through how you would design a rate limiter?",
+        "sender_type": "user" if i % 2 else "ai",
+        "created_at": datetime.utcnow(),
+    }
+
+
+def encode_json(message: dict) -> str:
+    return json.dumps({
+        "id": str(message["id"]),
+        "content": message["content"],
+        "sender_type": message["sender_type"],
+        "created_at": message["created_at"].isoformat(),
+    })
+
+
+def encode_orjson(message: dict) -> bytes:
+    return orjson.dumps({
+        "id": str(message["id"]),
+        "content": message["content"],
+        "sender_type": message["sender_type"],
+        "created_at": message["created_at"].isoformat(),
+    })
+
+
+def report(name: str, delivered: int, cpu: float, wall: float, fakes: list) -> tuple:
+    wire = sum(fake.bytes_sent for fake in fakes) / delivered
+    return cpu, f"{name:<14} {delivered:>9} {cpu / delivered * 1e6:>14.2f} {delivered / wall:>14.0f} {wire:>10.0f}"
+
+
+async def best_of(repeat: int, run, *args) -> None:
+    results = [await run(*args) for _ in range(repeat)]
+    print(min(results)[1])
+
+
+async def run_direct(sockets: int, messages: int) -> tuple:
+    """The broadcast loop before per-connection queues"""
+    fakes = [FakeWebSocket(sockets * messages, asyncio.Event(), [0]) for _ in range(sockets)]
+    payloads = [sample_message(i) for i in range(messages)]
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for message in payloads:
+        text = encode_json(message)
+        for fake in fakes:
+            await fake.send_text(text)
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+    return report("json direct", sockets * messages, cpu, wall, fakes)
+
+
+async def run_mode(name: str, encode, binary: bool, sockets: int, messages: int) -> tuple:
+    manager = ConnectionManager(max_queue=messages + 1, pubsub=InProcessPubSub())
+    done = asyncio.Event()
+    counter = [0]
+    fakes = [FakeWebSocket(sockets * messages, done, counter) for _ in range(sockets)]
+    for fake in fakes:
+        await manager.connect(fake, ROOM, binary=binary)
+    payloads = [sample_message(i) for i in range(messages)]
+
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for message in payloads:
+        await manager.publish(ROOM, encode(message))
+        await asyncio.sleep(0)  # let writers drain, like a real receive loop would
+    await done.wait()
+    cpu = time.process_time() - cpu
+    wall = time.perf_counter() - wall
+
+    for fake in fakes:
+        manager.disconnect(fake)
+    return report(name, sockets * messages, cpu, wall, fakes)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sockets", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{args.sockets} sockets, {args.messages} broadcasts")
+    print(f"{'mode':<14} {'delivered':>9} {'cpu us/deliv':>14} {'deliv/s':>14} {'bytes':>10}")
+    await best_of(args.repeat, run_direct, args.sockets, args.messages)
+    await best_of(args.repeat, run_mode, "json text", encode_json, False, args.sockets, args.messages)
+    await best_of(args.repeat, run_mode, "orjson text", encode_orjson, False, args.sockets, args.messages)
+    await best_of(args.repeat, run_mode, "orjson binary", encode_orjson, True, args.sockets, args.messages)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
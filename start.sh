@@ -3,4 +3,6 @@ set -e
 
 # Start the FastAPI server
 # In K8s, the agent is run as a separate deployment, so we shouldn't start it here.
-exec uvicorn app.main:app --host 0.0.0.0 --port 8000
+# Protocol-level WebSocket pings detect dead chat clients (app-level pings are opt-in).
+exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --ws-per-message-deflate true \
+    --ws-ping-interval 20 --ws-ping-timeout 20
@@ -0,0 +1,122 @@
+import unittest
+import asyncio
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from app.main import app
+from app.db.mongodb import init_db
+from app.models import user as user_module
+from app.models.user import User, normalize_email
+from app.core import security
+
+class TestSignup(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # In-memory MongoDB stand-in so the unique email index is exercised for real
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(init_db(AsyncMongoMockClient()["test_auth"]))
+        loop.close()
+
+    def setUp(self):
+        self.client = TestClient(app)
+
+    def test_email_is_normalized(self):
+        user = User(email="Jane.Doe@Example.COM", hashed_password="x")
+        self.assertEqual(user.email_normalized, "jane.doe@example.com")
+        self.assertEqual(normalize_email(" A@B.com "), "a@b.com")
+
+    @patch("app.api.v1.endpoints.auth.get_password_hash_async", new_callable=AsyncMock, return_value="hashed")
+    def test_duplicate_email_differing_in_case_returns_400(self, _):
+        first = self.client.post("/api/v1/auth/signup", json={"email": "Dup@Example.com", "password": "x"})
+        second = self.client.post("/api/v1/auth/signup", json={"email": "dup@example.com", "password": "x"})
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 400)
+        self.assertIn("already exists", second.json()["detail"])
+
+    @patch("app.models.user._legacy_emails_remaining", True)
+    @patch("app.api.v1.endpoints.auth.get_password_hash_async", new_callable=AsyncMock, return_value="hashed")
+    def test_signup_rejects_email_of_account_from_before_email_normalization(self, _):
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(User.get_motor_collection().insert_one(
+            {"email": "Old.Timer@example.com", "hashed_password": "x", "is_active": True}
+        ))
+        loop.close()
+
+        response = self.client.post("/api/v1/auth/signup", json={"email": "old.timer@example.com", "password": "x"})
+        self.assertEqual(response.status_code, 400)
+
+class TestFlaggedEmailCollisions(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(init_db(AsyncMongoMockClient()["test_email_collisions"]))
+
+    def tearDown(self):
+        self.loop.close()
+
+    @patch("app.models.user._legacy_emails_remaining", True)
+    def test_flagged_collisions_let_the_fallback_turn_off(self):
+        self.loop.run_until_complete(User(email="twin@example.com", hashed_password="x").insert())
+        # Left without email_normalized by backfill_email_normalized, which flagged it
+        self.loop.run_until_complete(User.get_motor_collection().insert_one(
+            {"email": "Twin@EXAMPLE.com", "hashed_password": "x", "is_active": True, "email_collision": True}
+        ))
+
+        self.assertEqual(self.loop.run_until_complete(User.legacy_emails_taken(["twin@example.com"])), set())
+        self.assertIsNone(self.loop.run_until_complete(User.find_by_email("nobody@example.com")))
+        self.assertFalse(user_module._legacy_emails_remaining)
+
+class TestLoginRehash(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.loop.run_until_complete(init_db(AsyncMongoMockClient()["test_auth_rehash"]))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.close()
+        security.shutdown_hash_pool()
+
+    def test_login_rehashes_with_current_work_factor(self):
+        user = User(email="rehash@example.com", hashed_password=security.get_password_hash("pw", rounds=4))
+        self.loop.run_until_complete(user.create())
+
+        with patch.object(security, "_bcrypt_rounds", 5):
+            response = TestClient(app).post("/api/v1/auth/login", json={"email": "rehash@example.com", "password": "pw"})
+
+        self.assertEqual(response.status_code, 200)
+        stored = self.loop.run_until_complete(User.get(user.id))
+        self.assertEqual(security.get_hash_rounds(stored.hashed_password), 5)
+        self.assertTrue(security.verify_password("pw", stored.hashed_password))
+
+    def test_only_weaker_hashes_are_rehashed(self):
+        hashed = security.get_password_hash("pw", rounds=5)
+        with patch.object(security, "_bcrypt_rounds", 4):
+            self.assertFalse(security.password_needs_rehash(hashed))
+        with patch.object(security, "_bcrypt_rounds", 6):
+            self.assertTrue(security.password_needs_rehash(hashed))
+        self.assertTrue(security.password_needs_rehash("not-a-bcrypt-hash"))
+
+    @patch("app.models.user._legacy_emails_remaining", True)
+    def test_account_from_before_email_normalization_can_log_in(self):
+        # As stored before email_normalized existed; backfill_email_normalized has not run
+        self.loop.run_until_complete(User.get_motor_collection().insert_one({
+            "email": "Legacy.User@example.com",
+            "hashed_password": security.get_password_hash("pw", rounds=4),
+            "is_active": True,
+        }))
+
+        with patch.object(security, "_bcrypt_rounds", 4):
+            response = TestClient(app).post("/api/v1/auth/login", json={"email": "legacy.user@EXAMPLE.com", "password": "pw"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(self.loop.run_until_complete(User.find_by_email("nobody@example.com")))
+
+    def test_calibration_respects_bounds(self):
+        with patch.object(security, "_bcrypt_rounds", security._bcrypt_rounds):
+            self.assertEqual(security.calibrate_bcrypt_rounds(0, min_rounds=4, max_rounds=6), 4)
+            self.assertEqual(security.calibrate_bcrypt_rounds(10_000, min_rounds=4, max_rounds=6), 6)
+            self.assertEqual(security.get_bcrypt_rounds(), 6)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+import asyncio
+import json
+from unittest.mock import MagicMock, patch
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from app.main import app
+from app.api import deps
+from app.db.mongodb import init_db
+from app.models.user import User
+from app.core import security
+
+class TestBulkProvisioning(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.loop.run_until_complete(init_db(AsyncMongoMockClient()["test_bulk_provisioning"]))
+        cls.loop.run_until_complete(User(email="taken@example.com", hashed_password="x").create())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.close()
+        security.shutdown_hash_pool()
+
+    def setUp(self):
+        app.dependency_overrides[deps.get_current_superuser] = lambda: MagicMock(id="admin")
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        app.dependency_overrides = {}
+
+    def upload(self, name: str, content: str, **params):
+        with patch.object(security, "_bcrypt_rounds", 4):
+            response = self.client.post("/api/v1/admin/users/bulk", params=params, files={"file": (name, content)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    def test_csv_rows_report_individual_outcomes(self):
+        content = (
+            "email,password,full_name\n"
+            "new-a@example.com,pw-a,Ada\n"
+            "not-an-email,pw,Bad\n"
+            "NEW-A@example.com,pw,Again\n"
+            "Taken@example.com,pw,Taken\n"
+            "new-b@example.com,pw-b,\n"
+        )
+        with patch.object(deps.settings, "BULK_PROVISION_BATCH_SIZE", 2):
+            lines = self.upload("candidates.csv", content)
+
+        statuses = [(line["row"], line["status"]) for line in lines[:-1]]
+        self.assertEqual(statuses, [(1, "created"), (2, "invalid"), (3, "duplicate"), (4, "exists"), (5, "created")])
+        self.assertEqual(lines[-1]["summary"]["created"], 2)
+
+        stored = self.loop.run_until_complete(User.get(lines[0]["id"]))
+        self.assertEqual(stored.full_name, "Ada")
+        self.assertEqual(stored.email_normalized, "new-a@example.com")
+        self.assertTrue(security.verify_password("pw-a", stored.hashed_password))
+
+    def test_jsonl_upload(self):
+        content = '{"email": "jsonl@example.com", "password": "pw"}\n\n[1, 2]\n'
+        lines = self.upload("candidates.jsonl", content)
+        self.assertEqual([line.get("status") for line in lines[:-1]], ["created", "invalid"])
+
+    @patch("app.models.user._legacy_emails_remaining", True)
+    def test_account_from_before_email_normalization_exists(self):
+        # No email_normalized, so the unique index would not reject the row
+        self.loop.run_until_complete(User.get_motor_collection().insert_one(
+            {"email": "Legacy@Example.com", "hashed_password": "x", "is_active": True}
+        ))
+        lines = self.upload("users.csv", "email,password\nlegacy@example.com,pw\nfresh@example.com,pw\n")
+        self.assertEqual([line.get("status") for line in lines[:-1]], ["exists", "created"])
+        self.assertEqual(self.loop.run_until_complete(User.find(User.email_normalized == "legacy@example.com").count()), 0)
+
+    def test_requires_superuser(self):
+        app.dependency_overrides = {}
+        response = self.client.post("/api/v1/admin/users/bulk", files={"file": ("a.csv", "email,password\n")})
+        self.assertEqual(response.status_code, 401)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import asyncio
+import ormsgpack
+from uuid import uuid4
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from app.main import app
+from app.db.mongodb import init_db
+from app.db.message_buffer import message_buffer
+from app.db.messages import append_message, list_messages
+from app.db.migrations.migrate_embedded_messages import migrate
+from app.models.chat import ChatMessage, Conversation, Message
+
+def get_page(client, url, **params):
+    """(messages, X-Total-Count, X-Has-More) of a message history request"""
+    response = client.get(url, params=params)
+    return response.json(), int(response.headers["X-Total-Count"]), response.headers["X-Has-More"] == "true"
+
+class TestChatMessages(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.loop.run_until_complete(init_db(AsyncMongoMockClient()["test_chat_messages"]))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def new_conversation(self, **fields) -> Conversation:
+        return self.run_async(Conversation(**fields).insert())
+
+    def test_append_allocates_consecutive_seqs(self):
+        conversation = self.new_conversation(transcript=[{"role": "agent", "content": "hi"}])
+        first = self.run_async(append_message(conversation.id, "hello", "user"))
+        second = self.run_async(append_message(conversation.id, "hi there", "ai"))
+
+        self.assertEqual((first.seq, second.seq), (1, 2))
+        stored = self.run_async(Conversation.get(conversation.id))
+        self.assertEqual(stored.last_seq, 2)
+        self.assertEqual(stored.messages, [])
+        self.assertEqual(stored.transcript, [{"role": "agent", "content": "hi"}])
+
+    def test_append_to_missing_conversation(self):
+        self.assertIsNone(self.run_async(append_message(uuid4(), "hello", "user")))
+
+    def test_legacy_messages_are_merged_then_migrated(self):
+        legacy = [Message(content="old 1", sender_type="user"), Message(content="old 2", sender_type="ai")]
+        conversation = self.new_conversation(messages=legacy)
+        self.run_async(append_message(conversation.id, "new", "user"))
+
+        before = self.run_async(list_messages(self.run_async(Conversation.get(conversation.id))))
+        self.assertEqual([(m.seq, m.content) for m in before], [(-2, "old 1"), (-1, "old 2"), (1, "new")])
+
+        # Interrupted run: the first message was already copied
+        self.run_async(ChatMessage.insert_many(before[:1]))
+        self.run_async(migrate(batch_size=1))
+        self.assertEqual(self.run_async(migrate())["conversations"], 0)
+
+        migrated = self.run_async(Conversation.get(conversation.id))
+        self.assertEqual(migrated.messages, [])
+        after = self.run_async(list_messages(migrated))
+        self.assertEqual([(m.id, m.seq) for m in after], [(m.id, m.seq) for m in before])
+
+    def test_rest_message_endpoints(self):
+        conversation = self.new_conversation()
+        client = TestClient(app)
+        url = f"/api/v1/chat/conversations/{conversation.id}/messages"
+
+        created = client.post(url, json={"content": "hello", "sender_type": "user"})
+        self.assertEqual(created.status_code, 200)
+        listed = client.get(url).json()
+        self.assertEqual([m["content"] for m in listed], ["hello"])
+        detail = client.get(f"/api/v1/chat/conversations/{conversation.id}").json()
+        self.assertEqual(detail["messages"][0]["id"], created.json()["id"])
+        missing = client.post(f"/api/v1/chat/conversations/{uuid4()}/messages", json={"content": "x", "sender_type": "user"})
+        self.assertEqual(missing.status_code, 404)
+        too_large = client.post(url, json={"content": "x" * (message_buffer.max_message_bytes + 1), "sender_type": "user"})
+        self.assertEqual(too_large.status_code, 413)
+
+    def test_append_keeps_concurrent_transcript(self):
+        conversation = self.new_conversation(participants=["u1"])
+        # e.g. the LiveKit agent saving its transcript after this conversation was loaded
+        self.run_async(Conversation.find_one(Conversation.id == conversation.id).update(
+            {"$set": {"transcript": [{"role": "agent", "content": "saved"}]}}
+        ))
+        self.run_async(append_message(conversation.id, "hello", "user"))
+
+        stored = self.run_async(Conversation.get(conversation.id))
+        self.assertEqual(stored.transcript, [{"role": "agent", "content": "saved"}])
+        self.assertEqual((stored.participants, stored.last_seq), (["u1"], 1))
+
+    def test_websocket_joins_and_broadcasts_to_participants(self):
+        conversation = self.new_conversation(participants=["owner"])
+        client = TestClient(app)
+        with client.websocket_connect(f"/api/v1/chat/ws/{conversation.id}?user_id=guest") as ws:
+            ws.send_text('{"type": "pong"}')
+            ws.send_text('{"content": "hi", "sender_type": "user"}')
+            received = ws.receive_json()
+        self.assertEqual(received["content"], "hi")
+        stored = self.run_async(Conversation.get(conversation.id))
+        self.assertEqual(stored.participants, ["owner", "guest"])
+        self.assertEqual(stored.last_seq, 1)
+
+    def test_msgpack_subprotocol(self):
+        conversation = self.new_conversation()
+        client = TestClient(app)
+        url = f"/api/v1/chat/ws/{conversation.id}?user_id=u1"
+
+        with client.websocket_connect(url, subprotocols=["chat.msgpack", "chat.json"]) as ws:
+            self.assertEqual(ws.accepted_subprotocol, "chat.msgpack")
+            ws.send_bytes(ormsgpack.packb({"type": "pong"}))
+            ws.send_bytes(ormsgpack.packb({"content": "hi", "sender_type": "ai"}))
+            received = ormsgpack.unpackb(ws.receive_bytes())
+        self.assertEqual((received["seq"], received["content"], received["sender_type"]), (1, "hi", "ai"))
+
+        # JSON stays the fallback
+        with client.websocket_connect(url, subprotocols=["chat.json"]) as ws:
+            self.assertEqual(ws.accepted_subprotocol, "chat.json")
+            ws.send_text("plain")
+            self.assertEqual(ws.receive_json()["content"], "plain")
+            # An object without string content is sent on as text instead of failing the socket
+            ws.send_text('{"sender_type": "ai"}')
+            self.assertEqual(ws.receive_json()["content"], '{"sender_type": "ai"}')
+
+    def test_reconnect_replays_only_missed_messages(self):
+        conversation = self.new_conversation()
+        for i in range(3):
+            self.run_async(append_message(conversation.id, f"m{i + 1}", "user"))
+        client = TestClient(app)
+
+        with client.websocket_connect(f"/api/v1/chat/ws/{conversation.id}?user_id=u1&since=1") as ws:
+            missed = [ws.receive_json() for _ in range(2)]
+            ws.send_text('{"content": "m4", "sender_type": "user"}')
+            live = ws.receive_json()
+        self.assertEqual([(m["seq"], m["content"]) for m in missed], [(2, "m2"), (3, "m3")])
+        self.assertEqual((live["seq"], live["content"]), (4, "m4"))
+
+        url = f"/api/v1/chat/conversations/{conversation.id}/messages"
+        delta, _, has_more = get_page(client, url, since=2)
+        self.assertEqual(([m["seq"] for m in delta], has_more), ([3, 4], False))
+        self.assertEqual(client.get(url, params={"since": 2, "after": 1}).status_code, 400)
+
+    def test_keyset_pagination(self):
+        conversation = self.new_conversation()
+        for i in range(5):
+            self.run_async(append_message(conversation.id, f"m{i + 1}", "user"))
+        client = TestClient(app)
+        url = f"/api/v1/chat/conversations/{conversation.id}/messages"
+
+        newest, total, has_more = get_page(client, url, limit=2)
+        self.assertEqual(([m["seq"] for m in newest], total, has_more), ([4, 5], 5, True))
+        older, _, _ = get_page(client, url, limit=2, before=4)
+        self.assertEqual([m["seq"] for m in older], [2, 3])
+        oldest, _, has_more = get_page(client, url, limit=2, before=2)
+        self.assertEqual(([m["seq"] for m in oldest], has_more), ([1], False))
+        forward, _, has_more = get_page(client, url, limit=3, after=1)
+        self.assertEqual(([m["seq"] for m in forward], has_more), ([2, 3, 4], True))
+
+        self.assertEqual(client.get(url, params={"before": 2, "after": 1}).status_code, 400)
+        self.assertEqual(client.get(url, params={"limit": 10_000}).status_code, 422)
+
+        detail = client.get(f"/api/v1/chat/conversations/{conversation.id}", params={"limit": 1}).json()
+        self.assertEqual([m["content"] for m in detail["messages"]], ["m5"])
+        self.assertEqual((detail["message_count"], detail["has_more_messages"]), (5, True))
+
+    def test_pagination_over_unmigrated_conversation(self):
+        legacy = [Message(content="old 1", sender_type="user"), Message(content="old 2", sender_type="ai")]
+        conversation = self.new_conversation(messages=legacy)
+        self.run_async(append_message(conversation.id, "new", "user"))
+        url = f"/api/v1/chat/conversations/{conversation.id}/messages"
+
+        page, total, has_more = get_page(TestClient(app), url, limit=2)
+        self.assertEqual([m["content"] for m in page], ["old 2", "new"])
+        self.assertEqual((total, has_more), (3, True))
+
+if __name__ == "__main__":
+    unittest.main()
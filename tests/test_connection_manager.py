@@ -0,0 +1,229 @@
+import unittest
+import asyncio
+import ormsgpack
+from unittest.mock import AsyncMock, patch
+from app.core.connections import ConnectionManager, Frame
+from app.core.pubsub import InProcessPubSub, RedisPubSub
+
+class FakeWebSocket:
+    def __init__(self, blocked: bool = False):
+        self.sent = []
+        self.closed_with = None
+        self.unblocked = asyncio.Event()
+        if not blocked:
+            self.unblocked.set()
+
+    async def accept(self, subprotocol=None):
+        pass
+
+    async def send_text(self, text):
+        await self.unblocked.wait()
+        self.sent.append(text)
+
+    async def send_bytes(self, data):
+        await self.unblocked.wait()
+        self.sent.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+async def disconnect_all(manager: ConnectionManager, *websockets):
+    for websocket in websockets or list(manager._connections):
+        manager.disconnect(websocket)
+
+class TestConnectionManager(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.manager = ConnectionManager(max_queue=2, pubsub=InProcessPubSub())
+
+    def tearDown(self):
+        self.loop.run_until_complete(disconnect_all(self.manager))
+        self.settle()
+        self.loop.close()
+
+    def settle(self):
+        """Let writer tasks run until they are idle"""
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+
+    def connect(self, websocket, room):
+        self.loop.run_until_complete(self.manager.connect(websocket, room))
+
+    def test_broadcast_reaches_only_the_room(self):
+        a1, a2, b1 = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for ws, room in ((a1, "a"), (a2, "a"), (b1, "b")):
+            self.connect(ws, room)
+
+        self.loop.run_until_complete(self.manager.broadcast("a", "hello"))
+        self.loop.run_until_complete(self.manager.broadcast("missing", "nobody"))
+        self.settle()
+
+        self.assertEqual((a1.sent, a2.sent, b1.sent), (["hello"], ["hello"], []))
+        self.assertEqual(self.manager.stats()["sent"], 2)
+
+    def test_disconnect_leaves_every_room(self):
+        ws, other = FakeWebSocket(), FakeWebSocket()
+        self.connect(ws, "a")
+        self.connect(ws, "b")
+        self.connect(other, "b")
+
+        self.loop.run_until_complete(disconnect_all(self.manager, ws, ws))  # idempotent
+
+        self.assertEqual(self.manager.rooms, {"b": {other}})
+        stats = self.manager.stats()
+        self.assertEqual((stats["rooms"], stats["connections"]), (1, 1))
+
+    def test_slow_consumer_is_evicted_without_delaying_others(self):
+        slow, fast = FakeWebSocket(blocked=True), FakeWebSocket()
+        self.connect(slow, "a")
+        self.connect(fast, "a")
+
+        # The slow writer holds one frame in send and two in its queue; the fourth overflows
+        for i in range(4):
+            self.loop.run_until_complete(self.manager.broadcast("a", f"m{i}"))
+            self.settle()
+
+        self.assertEqual(fast.sent, ["m0", "m1", "m2", "m3"])
+        self.assertEqual(self.manager.rooms, {"a": {fast}})
+        self.assertEqual(slow.closed_with, 1013)
+        stats = self.manager.stats()
+        self.assertEqual((stats["evicted"], stats["dropped"]), (1, 3))
+
+    def test_queue_depth_is_reported(self):
+        slow = FakeWebSocket(blocked=True)
+        self.connect(slow, "a")
+        self.loop.run_until_complete(self.manager.broadcast("a", "m0"))
+        self.settle()
+        self.loop.run_until_complete(self.manager.broadcast("a", "m1"))
+
+        stats = self.manager.stats()
+        self.assertEqual((stats["queued"], stats["max_queue_depth"]), (1, 1))
+
+    def test_publish_reaches_local_room_and_tracks_subscriptions(self):
+        ws = FakeWebSocket()
+        self.connect(ws, "a")
+        self.assertEqual(self.manager.pubsub.channels, {"a"})
+
+        self.loop.run_until_complete(self.manager.publish("a", "hello"))
+        self.settle()
+        self.assertEqual(ws.sent, ["hello"])
+
+        self.loop.run_until_complete(disconnect_all(self.manager, ws))
+        self.settle()
+        self.assertEqual(self.manager.pubsub.channels, set())
+
+    def test_one_buffer_for_text_and_binary_recipients(self):
+        text_ws, binary_ws = FakeWebSocket(), FakeWebSocket()
+        self.loop.run_until_complete(self.manager.connect(text_ws, "a"))
+        self.loop.run_until_complete(self.manager.connect(binary_ws, "a", binary=True))
+        payload = b'{"content":"hi"}'
+
+        self.loop.run_until_complete(self.manager.broadcast("a", payload))
+        self.settle()
+
+        self.assertEqual(text_ws.sent, ['{"content":"hi"}'])
+        self.assertIs(binary_ws.sent[0], payload)
+
+    def test_msgpack_recipients_share_one_conversion(self):
+        first, second, text_ws = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        for ws in (first, second):
+            self.loop.run_until_complete(self.manager.connect(ws, "a", msgpack=True))
+        self.connect(text_ws, "a")
+
+        self.loop.run_until_complete(self.manager.broadcast("a", b'{"content":"hi"}'))
+        self.settle()
+
+        self.assertEqual(ormsgpack.unpackb(first.sent[0]), {"content": "hi"})
+        self.assertIs(first.sent[0], second.sent[0])
+        self.assertEqual(text_ws.sent, ['{"content":"hi"}'])
+        self.assertEqual(self.manager.stats()["msgpack_connections"], 2)
+
+    def test_publish_failure_still_delivers_locally(self):
+        ws = FakeWebSocket()
+        self.connect(ws, "a")
+        self.manager.pubsub.publish = AsyncMock(side_effect=ConnectionError("down"))
+
+        self.loop.run_until_complete(self.manager.publish("a", "hello"))
+        self.settle()
+
+        self.assertEqual(ws.sent, ["hello"])
+        self.assertEqual(self.manager.stats()["publish_errors"], 1)
+
+    def test_replay_goes_first_without_duplicates(self):
+        ws = FakeWebSocket()
+        replay_started = asyncio.Event()
+
+        async def replay():
+            replay_started.set()
+            for seq in (3, 4):
+                # Live messages broadcast meanwhile wait in the queue
+                await self.manager.broadcast("a", b'{"seq":%d}' % (seq + 1))
+                yield Frame(b'{"seq":%d}' % seq, seq=seq)
+
+        self.loop.run_until_complete(self.manager.connect(ws, "a", replay=replay()))
+        self.settle()
+
+        self.assertEqual(ws.sent, ['{"seq":3}', '{"seq":4}', '{"seq":5}'])
+        self.assertEqual(self.manager.stats()["replayed"], 2)
+
+    def test_sweep_pings_and_reaps_only_heartbeat_clients(self):
+        quiet, silent, chatty = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        legacy = FakeWebSocket()
+        with patch("app.core.connections.time.monotonic", return_value=100.0):
+            for ws, heartbeat in ((silent, True), (legacy, False)):
+                self.loop.run_until_complete(self.manager.connect(ws, "a", heartbeat=heartbeat))
+        with patch("app.core.connections.time.monotonic", return_value=150.0):
+            for ws in (quiet, chatty):
+                self.loop.run_until_complete(self.manager.connect(ws, "a", heartbeat=True))
+        with patch("app.core.connections.time.monotonic", return_value=175.0):
+            self.manager.touch(chatty)
+
+        async def sweep():
+            with patch("app.core.connections.time.monotonic", return_value=180.0):
+                self.manager.sweep()
+        self.loop.run_until_complete(sweep())
+        self.settle()
+
+        self.assertEqual((quiet.sent, chatty.sent), (['{"type":"ping"}'], []))
+        self.assertEqual(silent.closed_with, 1001)
+        # Clients that did not opt in are left to protocol-level pings
+        self.assertEqual((legacy.sent, legacy.closed_with), ([], None))
+        stats = self.manager.stats()
+        self.assertEqual((stats["connections"], stats["pings"], stats["reaped"]), (3, 1, 1))
+
+class TestRedisPubSubAcrossWorkers(unittest.TestCase):
+    def setUp(self):
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis not installed")
+        self.loop = asyncio.new_event_loop()
+        server = fakeredis.FakeServer()
+        # Two workers sharing one Redis
+        self.workers = [
+            ConnectionManager(max_queue=8, pubsub=RedisPubSub(fakeredis.FakeAsyncRedis(server=server)))
+            for _ in range(2)
+        ]
+        self.listeners = [self.loop.create_task(worker.pubsub.run()) for worker in self.workers]
+
+    def tearDown(self):
+        for task in self.listeners:
+            task.cancel()
+        for worker in self.workers:
+            self.loop.run_until_complete(disconnect_all(worker))
+        self.loop.run_until_complete(asyncio.gather(*self.listeners, return_exceptions=True))
+        self.loop.close()
+
+    def test_message_posted_on_one_worker_reaches_sockets_on_another(self):
+        posting, holding = self.workers
+        ws = FakeWebSocket()
+        self.loop.run_until_complete(holding.connect(ws, "conv-1"))
+
+        self.loop.run_until_complete(posting.publish("conv-1", "hello"))
+        self.loop.run_until_complete(posting.publish("conv-2", "elsewhere"))
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+
+        self.assertEqual(ws.sent, ["hello"])
+        self.assertEqual((posting.pubsub.channels, holding.pubsub.channels), (set(), {"conv-1"}))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+import asyncio
+from datetime import datetime, timedelta
+from mongomock_motor import AsyncMongoMockClient
+from app.db.mongodb import init_db
+from app.db.maintenance import ExpiredDocumentReaper
+from app.models.password_reset import PasswordReset
+from app.models.token_blacklist import TokenBlacklist
+
+class TestExpiredDocumentReaper(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.loop.run_until_complete(init_db(AsyncMongoMockClient()["test_expired_document_reaper"]))
+        # The reaper stands in for the TTL monitor; without this mongomock would hide
+        # expired documents itself
+        for model in (TokenBlacklist, PasswordReset):
+            cls.loop.run_until_complete(model.get_motor_collection().drop_index("exp_ttl"))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_sweep_deletes_only_expired_documents(self):
+        now = datetime.utcnow()
+        past, future = now - timedelta(minutes=5), now + timedelta(hours=1)
+        for jti, exp in (("expired-1", past), ("expired-2", past), ("live", future)):
+            self.run_async(TokenBlacklist(token_jti=jti, exp=exp).insert())
+        for token, exp in (("expired", past), ("live", future)):
+            self.run_async(PasswordReset(user_id="507f1f77bcf86cd799439011", token=token, exp=exp).insert())
+        reaper = ExpiredDocumentReaper([TokenBlacklist, PasswordReset])
+
+        self.assertEqual(self.run_async(reaper.sweep()), 3)
+        self.assertEqual([d.token_jti for d in self.run_async(TokenBlacklist.find_all().to_list())], ["live"])
+        self.assertEqual([d.token for d in self.run_async(PasswordReset.find_all().to_list())], ["live"])
+        stats = reaper.stats()
+        self.assertEqual(stats["collection_sizes"], {"token_blacklist": 1, "password_resets": 1})
+        self.assertEqual(stats["reaped"], {"token_blacklist": 2, "password_resets": 1})
+        self.assertIsNotNone(stats["last_sweep"])
+
+        # Nothing left to reap; the counters accumulate across sweeps
+        self.assertEqual(self.run_async(reaper.sweep()), 0)
+        self.assertEqual(reaper.stats()["reaped"], {"token_blacklist": 2, "password_resets": 1})
+
+if __name__ == "__main__":
+    unittest.main()
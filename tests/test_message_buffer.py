@@ -0,0 +1,223 @@
+import unittest
+import asyncio
+import os
+import tempfile
+from unittest.mock import patch
+from uuid import uuid4
+from mongomock_motor import AsyncMongoMockClient
+from app.db.mongodb import init_db
+from pymongo.errors import AutoReconnect, DocumentTooLarge
+from app.db.message_buffer import LocalSeqAllocator, MessageBuffer, MessageJournal, MessageTooLarge, RedisSeqAllocator
+from app.models.chat import ChatMessage, Conversation
+
+class TestMessageBuffer(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.loop = asyncio.new_event_loop()
+        cls.loop.run_until_complete(init_db(AsyncMongoMockClient()["test_message_buffer"]))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.loop.close()
+
+    def setUp(self):
+        self.journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.journal_dir.cleanup)
+        self.buffer = MessageBuffer(
+            LocalSeqAllocator(), MessageJournal(self.journal_dir.name), strict=False, flush_interval=0.02, max_batch=100
+        )
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def stored(self, conversation_id):
+        return self.run_async(ChatMessage.find(ChatMessage.conversation_id == conversation_id).sort("seq").to_list())
+
+    def test_messages_are_flushed_in_the_background(self):
+        conversation = self.run_async(Conversation(last_seq=3).insert())
+
+        async def scenario():
+            task = asyncio.create_task(self.buffer.run())
+            await asyncio.sleep(0)
+            first = await self.buffer.append(conversation.id, "hello", "user")
+            second = await self.buffer.append(conversation.id, "hi", "ai")
+            before = len(await ChatMessage.find(ChatMessage.conversation_id == conversation.id).to_list())
+            unflushed = [m.seq for m in self.buffer.unflushed(conversation.id, 4)]
+            await asyncio.sleep(0.1)
+            task.cancel()
+            await self.buffer.close()
+            return first, second, before, unflushed
+
+        first, second, before, unflushed = self.run_async(scenario())
+        self.assertEqual((first.seq, second.seq, before, unflushed), (4, 5, 0, [5]))
+        self.assertEqual([m.content for m in self.stored(conversation.id)], ["hello", "hi"])
+        self.assertEqual(self.run_async(Conversation.get(conversation.id)).last_seq, 5)
+        self.assertEqual(os.listdir(self.journal_dir.name), [])
+        self.assertEqual(self.buffer.stats()["pending"], 0)
+
+    def test_writes_through_when_not_running(self):
+        conversation = self.run_async(Conversation().insert())
+        message = self.run_async(self.buffer.append(conversation.id, "hello", "user"))
+
+        self.assertEqual([m.id for m in self.stored(conversation.id)], [message.id])
+        self.assertIsNone(self.run_async(self.buffer.append(uuid4(), "hello", "user")))
+
+    def buffering(self):
+        """Put the buffer in write-behind mode without its flush task, so tests flush by hand"""
+        self.buffer.journal.open()
+        self.buffer._running = True
+        self.addCleanup(self.buffer.journal.close)
+
+    def test_unstorable_message_is_dead_lettered_not_retried_forever(self):
+        conversation = self.run_async(Conversation().insert())
+        self.buffering()
+        store = self.buffer._store
+
+        async def store_unless_poisoned(messages):
+            if any(m.content == "poison" for m in messages):
+                raise DocumentTooLarge("BSON document too large")
+            await store(messages)
+
+        for content in ("before", "poison", "after"):
+            self.run_async(self.buffer.append(conversation.id, content, "user"))
+        with patch.object(self.buffer, "_store", store_unless_poisoned):
+            self.run_async(self.buffer.flush())
+
+        self.assertEqual([m.content for m in self.stored(conversation.id)], ["before", "after"])
+        stats = self.buffer.stats()
+        self.assertEqual((stats["pending"], stats["dead_lettered"]), (0, 1))
+        segments = MessageJournal.segments(self.buffer.journal.directory)
+        self.assertEqual([m for path in segments for m in MessageJournal.read(path)], [])
+
+    def test_unreachable_database_keeps_the_batch(self):
+        conversation = self.run_async(Conversation().insert())
+        self.buffering()
+        self.run_async(self.buffer.append(conversation.id, "hello", "user"))
+
+        with patch.object(self.buffer, "_store", side_effect=AutoReconnect("down")):
+            with self.assertRaises(AutoReconnect):
+                self.run_async(self.buffer.flush())
+        self.assertEqual((self.buffer.stats()["pending"], self.buffer.stats()["dead_lettered"]), (1, 0))
+
+        self.run_async(self.buffer.flush())
+        self.assertEqual([m.content for m in self.stored(conversation.id)], ["hello"])
+
+    def test_oversized_message_is_rejected_before_getting_a_seq(self):
+        conversation = self.run_async(Conversation().insert())
+        self.buffer.max_message_bytes = 8
+
+        with self.assertRaises(MessageTooLarge):
+            self.run_async(self.buffer.append(conversation.id, "é" * 5, "user"))
+        self.assertEqual(self.run_async(self.buffer.append(conversation.id, "fits", "user")).seq, 1)
+
+    def test_writes_through_once_too_many_are_pending(self):
+        conversation = self.run_async(Conversation().insert())
+        self.buffering()
+        self.buffer.max_pending = 1
+
+        self.run_async(self.buffer.append(conversation.id, "buffered", "user"))
+        self.run_async(self.buffer.append(conversation.id, "written through", "user"))
+
+        self.assertEqual([m.content for m in self.stored(conversation.id)], ["written through"])
+        self.assertEqual((self.buffer.stats()["pending"], self.buffer.stats()["written_through"]), (1, 1))
+        self.run_async(self.buffer.flush())
+
+    def crashed_journal(self, messages):
+        """A journal left behind by a process that died before flushing"""
+        journal = MessageJournal(self.journal_dir.name)
+        journal.open()
+        for message in messages:
+            journal.append(message)
+        journal._file.close()
+        journal._lock.close()
+        return journal.directory
+
+    def test_replay_takes_over_only_orphaned_journals(self):
+        conversation = self.run_async(Conversation().insert())
+        messages = [ChatMessage(conversation_id=conversation.id, seq=seq, content=f"m{seq}", sender_type="user") for seq in (1, 2)]
+        orphan = self.crashed_journal(messages)
+        # The first message made it to the database before the crash
+        self.run_async(messages[0].insert())
+        with open(os.path.join(orphan, "0000000000.jsonl"), "ab") as f:
+            f.write(b'{"torn')
+        sibling = MessageJournal(self.journal_dir.name)
+        sibling.open()
+        sibling.append(ChatMessage(conversation_id=conversation.id, seq=3, content="live", sender_type="user"))
+
+        self.assertEqual(self.run_async(self.buffer.replay()), 2)
+        self.assertEqual([m.seq for m in self.stored(conversation.id)], [1, 2])
+        self.assertEqual(self.run_async(Conversation.get(conversation.id)).last_seq, 2)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual(len(MessageJournal.segments(sibling.directory)), 1)
+        sibling.close()
+
+    def test_seq_collision_is_reassigned_not_dropped(self):
+        conversation = self.run_async(Conversation().insert())
+        # Another writer took seq 1 without this process's counter knowing
+        self.run_async(ChatMessage(conversation_id=conversation.id, seq=1, content="theirs", sender_type="user").insert())
+
+        message = self.run_async(self.buffer.append(conversation.id, "mine", "user"))
+
+        self.assertEqual([(m.seq, m.content) for m in self.stored(conversation.id)], [(1, "theirs"), (2, "mine")])
+        self.assertEqual((message.seq, self.buffer.stats()["reassigned"]), (2, 1))
+        self.assertEqual(self.run_async(self.buffer.allocator.allocate(conversation.id)), 3)
+
+    def test_local_allocator_refuses_a_second_worker(self):
+        sibling = MessageJournal(self.journal_dir.name)
+        sibling.open()
+        with self.assertRaises(RuntimeError):
+            self.run_async(self.buffer.start())
+        sibling.close()
+        self.run_async(self.buffer.start())
+        self.buffer.journal.close()
+        self.assertEqual(os.listdir(self.journal_dir.name), [])
+
+    def test_settle_waits_for_another_workers_flush(self):
+        try:
+            import fakeredis
+            import lupa  # noqa: F401 - fakeredis needs it to run Lua scripts
+        except ImportError:
+            self.skipTest("fakeredis with Lua support not installed")
+        server = fakeredis.FakeServer()
+        writer, reader = (
+            MessageBuffer(RedisSeqAllocator(fakeredis.FakeAsyncRedis(server=server)), MessageJournal(self.journal_dir.name),
+                          strict=False, flush_interval=0.02, max_batch=100)
+            for _ in range(2)
+        )
+        conversation = self.run_async(Conversation().insert())
+        writer.journal.open()
+        writer._running = True
+        self.addCleanup(writer.journal.close)
+        self.run_async(writer.append(conversation.id, "broadcast, not flushed", "user"))
+
+        self.assertFalse(self.run_async(reader.settle(conversation.id, timeout=0.05)))
+
+        async def flush_later():
+            await asyncio.sleep(0.05)
+            await writer.flush()
+
+        async def scenario():
+            flushing = asyncio.create_task(flush_later())
+            settled = await reader.settle(conversation.id, timeout=1.0)
+            await flushing
+            return settled
+
+        self.assertTrue(self.run_async(scenario()))
+        self.assertEqual([m.content for m in self.stored(conversation.id)], ["broadcast, not flushed"])
+
+    def test_redis_allocator_seeds_from_conversation(self):
+        try:
+            import fakeredis
+            import lupa  # noqa: F401 - fakeredis needs it to run Lua scripts
+        except ImportError:
+            self.skipTest("fakeredis with Lua support not installed")
+        server = fakeredis.FakeServer()
+        workers = [RedisSeqAllocator(fakeredis.FakeAsyncRedis(server=server)) for _ in range(2)]
+        conversation = self.run_async(Conversation(last_seq=7).insert())
+
+        seqs = [self.run_async(workers[i % 2].allocate(conversation.id)) for i in range(4)]
+        self.assertEqual(seqs, [8, 9, 10, 11])
+        self.assertIsNone(self.run_async(workers[0].allocate(uuid4())))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import asyncio
+import tempfile
+from datetime import datetime, timedelta
+from email import message_from_bytes, policy
+from pathlib import Path
+from unittest.mock import patch
+from mongomock_motor import AsyncMongoMockClient
+from app.db.mongodb import init_db
+from app.core.mail import ConsoleTransport, FileTransport, MailTransport, build_message
+from app.core.outbox import OutboxWorker, enqueue_password_reset
+from app.models.outbox import OutboxMessage
+from app.models.password_reset import PasswordReset
+from app.models.user import User
+
+class FlakyTransport(MailTransport):
+    def __init__(self):
+        self.calls = 0
+
+    async def send_batch(self, messages):
+        self.calls += 1
+        return [ConnectionError("smtp down")] * len(messages)
+
+class TestOutboxWorker(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(init_db(AsyncMongoMockClient()["test_outbox"]))
+        self.run_async(User(email="Reset.Me@example.com", hashed_password="x").create())
+        self.mail_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.mail_dir.cleanup()
+        self.loop.close()
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def worker(self, transport, max_attempts=3):
+        return OutboxWorker(transport, batch_size=10, poll_interval=1, max_attempts=max_attempts, retry_base=1)
+
+    def test_delivers_reset_email_in_background(self):
+        self.run_async(enqueue_password_reset("reset.me@example.com"))
+        self.run_async(enqueue_password_reset("nobody@example.com"))
+        worker = self.worker(FileTransport(self.mail_dir.name))
+
+        self.assertEqual(self.run_async(worker.process_once()), 2)
+
+        files = list(Path(self.mail_dir.name).glob("*.eml"))
+        self.assertEqual(len(files), 1)
+        reset = self.run_async(PasswordReset.find_one(PasswordReset.used == False))
+        self.assertIn(reset.token, message_from_bytes(files[0].read_bytes(), policy=policy.default).get_content())
+        statuses = {m.recipient: m.status for m in self.run_async(OutboxMessage.find_all().to_list())}
+        self.assertEqual(statuses, {"reset.me@example.com": "sent", "nobody@example.com": "sent"})
+        self.assertEqual((worker.sent, worker.skipped), (1, 1))
+
+    def test_retries_with_backoff_then_gives_up(self):
+        self.run_async(enqueue_password_reset("reset.me@example.com"))
+        transport = FlakyTransport()
+        worker = self.worker(transport, max_attempts=2)
+
+        self.run_async(worker.process_once())
+        message = self.run_async(OutboxMessage.find_one())
+        self.assertEqual((message.status, message.attempts), ("pending", 1))
+        self.assertGreater(message.next_attempt_at, datetime.utcnow())
+        token = message.payload["token"]
+
+        # Not due yet
+        self.assertEqual(self.run_async(worker.process_once()), 0)
+
+        later = datetime.utcnow() + timedelta(seconds=5)
+        with patch("app.core.outbox.datetime") as mock_datetime:
+            mock_datetime.utcnow.return_value = later
+            self.run_async(worker.process_once())
+        message = self.run_async(OutboxMessage.find_one())
+        self.assertEqual((message.status, message.attempts, transport.calls), ("failed", 2, 2))
+        # The retry resent the same token rather than minting another
+        self.assertEqual(message.payload["token"], token)
+        self.assertEqual(self.run_async(PasswordReset.count()), 1)
+
+class TestConsoleTransport(unittest.TestCase):
+    def send(self, transport):
+        message = build_message("a@example.com", "Reset your password", "https://example.com/reset?token=secret")
+        loop = asyncio.new_event_loop()
+        with self.assertLogs("app.core.mail", level="DEBUG") as logs:
+            self.assertEqual(loop.run_until_complete(transport.send_batch([message])), [None])
+        loop.close()
+        return "\n".join(logs.output)
+
+    def test_body_is_only_logged_when_opted_in(self):
+        self.assertNotIn("token=secret", self.send(ConsoleTransport()))
+        self.assertIn("token=secret", self.send(ConsoleTransport(show_body=True)))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import asyncio
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from app.main import app
+from app.core import security
+from app.core.security import (
+    PasswordHasherBusy,
+    get_password_hash_async,
+    verify_password_async,
+)
+
+def run_async(coro):
+    # Use a private loop so the implicit main-thread loop other tests rely on stays intact
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+class TestPasswordHashPool(unittest.TestCase):
+    def tearDown(self):
+        security.shutdown_hash_pool()
+
+    def test_hash_and_verify_round_trip(self):
+        async def run():
+            hashed = await get_password_hash_async("s3cret")
+            return (
+                await verify_password_async("s3cret", hashed),
+                await verify_password_async("wrong", hashed),
+            )
+
+        self.assertEqual(run_async(run()), (True, False))
+
+    def test_saturated_pool_fails_fast(self):
+        with patch.object(security, "_hash_pending", security.settings.PASSWORD_HASH_MAX_PENDING):
+            with self.assertRaises(PasswordHasherBusy):
+                run_async(get_password_hash_async("s3cret"))
+
+    @patch("app.api.v1.endpoints.auth.User")
+    def test_login_returns_503_when_saturated(self, mock_user_cls):
+        mock_user = AsyncMock()
+        mock_user.hashed_password = "$2b$12$invalid"
+        mock_user_cls.find_by_email = AsyncMock(return_value=mock_user)
+
+        client = TestClient(app)
+        with patch.object(security, "_hash_pending", security.settings.PASSWORD_HASH_MAX_PENDING):
+            response = client.post("/api/v1/auth/login", json={"email": "a@example.com", "password": "x"})
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "1")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import unittest
+import asyncio
+import ipaddress
+from unittest.mock import patch, AsyncMock
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+from app.main import app
+from app.api.deps import get_client_ip
+from app.core.rate_limit import (
+    BucketPolicy,
+    InMemoryTokenBucketBackend,
+    RateLimiter,
+    RedisTokenBucketBackend,
+    rate_limiter,
+)
+
+POLICY = BucketPolicy(per_minute=60, burst=3)
+
+class TestTokenBuckets(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def take_many(self, backend, count):
+        return [self.loop.run_until_complete(backend.take("k", POLICY)) for _ in range(count)]
+
+    def test_in_memory_burst_then_refill(self):
+        backend = InMemoryTokenBucketBackend()
+        with patch("app.core.rate_limit.time.monotonic", return_value=100.0):
+            results = self.take_many(backend, 4)
+        self.assertEqual(results[:3], [0.0, 0.0, 0.0])
+        self.assertAlmostEqual(results[3], 1.0)
+        with patch("app.core.rate_limit.time.monotonic", return_value=101.0):
+            self.assertEqual(self.take_many(backend, 1), [0.0])
+
+    def test_redis_backend(self):
+        try:
+            import fakeredis
+            import lupa  # noqa: F401 - fakeredis needs it to run Lua scripts
+        except ImportError:
+            self.skipTest("fakeredis with Lua support not installed")
+        backend = RedisTokenBucketBackend(fakeredis.FakeAsyncRedis())
+        results = self.take_many(backend, 4)
+        self.assertEqual(results[:3], [0.0, 0.0, 0.0])
+        self.assertGreater(results[3], 0.9)
+
+    def test_backend_errors_fail_open(self):
+        backend = InMemoryTokenBucketBackend()
+        backend.take = AsyncMock(side_effect=ConnectionError("redis down"))
+        limiter = RateLimiter(backend, POLICY, POLICY)
+        self.assertEqual(self.loop.run_until_complete(limiter.hit("login", ip="1.2.3.4")), 0.0)
+        self.assertEqual(limiter.stats()["backend_errors"], 1)
+
+class TestClientIp(unittest.TestCase):
+    def request(self, peer, forwarded=None):
+        headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+        return Request({"type": "http", "client": (peer, 4321), "headers": headers})
+
+    @patch("app.api.deps._trusted_proxies", [ipaddress.ip_network("10.0.0.0/8")])
+    def test_forwarded_for_is_trusted_only_from_proxies(self):
+        # Ingress -> internal proxy -> app: the client is the last untrusted hop
+        self.assertEqual(get_client_ip(self.request("10.0.0.5", "203.0.113.9, 10.0.0.7")), "203.0.113.9")
+        # A client-supplied first hop does not move the key
+        self.assertEqual(get_client_ip(self.request("10.0.0.5", "1.1.1.1, 203.0.113.9")), "203.0.113.9")
+        # Straight from the internet, the header is ignored
+        self.assertEqual(get_client_ip(self.request("198.51.100.2", "1.1.1.1")), "198.51.100.2")
+        self.assertEqual(get_client_ip(self.request("10.0.0.5")), "10.0.0.5")
+
+class TestCredentialEndpointThrottling(unittest.TestCase):
+    def setUp(self):
+        self.client = TestClient(app)
+        self.backend = rate_limiter.backend
+        rate_limiter.backend = InMemoryTokenBucketBackend()
+
+    def tearDown(self):
+        rate_limiter.backend = self.backend
+
+    @patch("app.api.v1.endpoints.auth.verify_password_async", new_callable=AsyncMock, return_value=False)
+    @patch("app.api.v1.endpoints.auth.User")
+    def test_login_is_throttled_per_email_before_database(self, mock_user_cls, mock_verify):
+        mock_user_cls.find_by_email = AsyncMock(return_value=None)
+        payload = {"email": "victim@example.com", "password": "guess"}
+
+        statuses = [self.client.post("/api/v1/auth/login", json=payload).status_code for _ in range(6)]
+
+        self.assertEqual(statuses, [400] * 5 + [429])
+        self.assertEqual(mock_user_cls.find_by_email.await_count, 5)
+        response = self.client.post("/api/v1/auth/login", json={**payload, "email": "VICTIM@example.com"})
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response.headers)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import patch, AsyncMock
+from app.api import deps
+from app.core.revocation import BloomFilter, RevocationIndex, RevocationWriter, revocation_index
+
+class TestBloomFilter(unittest.TestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000)
+        items = [f"jti-{i}" for i in range(1000)]
+        for item in items:
+            bloom.add(item)
+        self.assertTrue(all(item in bloom for item in items))
+
+    def test_false_positive_rate_is_bounded(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"jti-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+class TestRevocationIndex(unittest.TestCase):
+    def test_add_and_contains(self):
+        index = RevocationIndex(capacity=16)
+        index.add("revoked", datetime.utcnow() + timedelta(minutes=5))
+        self.assertTrue(index.contains("revoked"))
+        self.assertFalse(index.contains("active"))
+
+    def test_expired_entries_are_ignored_and_pruned(self):
+        index = RevocationIndex(capacity=16)
+        index.add("already-expired", datetime.utcnow() - timedelta(seconds=1))
+        self.assertFalse(index.contains("already-expired"))
+
+        index.add("soon", datetime.utcnow() + timedelta(minutes=5))
+        with patch("app.core.revocation.datetime") as mock_datetime:
+            mock_datetime.utcnow.return_value = datetime.utcnow() + timedelta(minutes=10)
+            self.assertEqual(index.prune(), 1)
+        self.assertEqual(len(index), 0)
+        self.assertFalse(index.contains("soon"))
+
+    def test_grows_past_capacity(self):
+        index = RevocationIndex(capacity=4)
+        exp = datetime.utcnow() + timedelta(minutes=5)
+        for i in range(50):
+            index.add(f"jti-{i}", exp)
+        self.assertTrue(all(index.contains(f"jti-{i}") for i in range(50)))
+
+    @patch("app.api.deps.TokenBlacklist")
+    def test_warm_index_answers_without_database(self, mock_blacklist_cls):
+        loop = asyncio.new_event_loop()
+        with patch.object(revocation_index, "ready", True):
+            revoked = loop.run_until_complete(deps.is_token_blacklisted("unknown-jti"))
+        loop.close()
+        self.assertFalse(revoked)
+        mock_blacklist_cls.find_one.assert_not_called()
+
+@patch("app.core.revocation.TokenBlacklist")
+class TestRevocationWriter(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.exp = datetime.utcnow() + timedelta(days=1)
+
+    def tearDown(self):
+        self.loop.close()
+
+    def test_buffered_revocation_is_visible_before_flush(self, mock_blacklist_cls):
+        mock_blacklist_cls.insert_many = AsyncMock()
+        writer = RevocationWriter(RevocationIndex(16), strict=False, flush_interval=60, max_batch=100)
+        writer._running = True
+
+        for i in range(3):
+            self.loop.run_until_complete(writer.revoke(f"jti-{i}", self.exp))
+        self.assertTrue(writer.index.contains("jti-1"))
+        mock_blacklist_cls.insert_many.assert_not_awaited()
+
+        self.loop.run_until_complete(writer.flush())
+        mock_blacklist_cls.insert_many.assert_awaited_once()
+        self.assertEqual(len(mock_blacklist_cls.insert_many.await_args.args[0]), 3)
+        self.assertEqual(writer.stats()["pending"], 0)
+
+    def test_failed_flush_keeps_entries(self, mock_blacklist_cls):
+        mock_blacklist_cls.insert_many = AsyncMock(side_effect=ConnectionError("down"))
+        writer = RevocationWriter(RevocationIndex(16), strict=False, flush_interval=60, max_batch=100)
+        writer._running = True
+
+        self.loop.run_until_complete(writer.revoke("jti", self.exp))
+        with self.assertRaises(ConnectionError):
+            self.loop.run_until_complete(writer.flush())
+        self.assertEqual(writer.stats()["pending"], 1)
+
+    def test_strict_mode_writes_through(self, mock_blacklist_cls):
+        mock_blacklist_cls.insert_many = AsyncMock()
+        writer = RevocationWriter(RevocationIndex(16), strict=True, flush_interval=60, max_batch=100)
+        writer._running = True
+
+        self.loop.run_until_complete(writer.revoke("jti", self.exp))
+        mock_blacklist_cls.insert_many.assert_awaited_once()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,51 @@
+import unittest
+from datetime import datetime, timedelta
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from jose import jwt, JWTError
+from jose.exceptions import ExpiredSignatureError
+from app.core.tokens import TokenCodec
+
+SECRET = "test-secret"
+
+class TestHS256Codec(unittest.TestCase):
+    def setUp(self):
+        self.codec = TokenCodec("HS256", secret_key=SECRET)
+        self.claims = {"sub": "user-1", "type": "access", "exp": datetime.utcnow() + timedelta(minutes=5)}
+
+    def test_interoperates_with_python_jose(self):
+        token = self.codec.encode(self.claims)
+        self.assertEqual(jwt.decode(token, SECRET, algorithms=["HS256"])["sub"], "user-1")
+        legacy = jwt.encode(self.claims, SECRET, algorithm="HS256")
+        self.assertEqual(self.codec.decode(legacy)["type"], "access")
+
+    def test_rejects_expired_tampered_and_malformed_tokens(self):
+        expired = self.codec.encode({**self.claims, "exp": datetime.utcnow() - timedelta(seconds=1)})
+        with self.assertRaises(ExpiredSignatureError):
+            self.codec.decode(expired)
+
+        header, payload, signature = self.codec.encode(self.claims).split(".")
+        forged = jwt.encode({**self.claims, "sub": "admin"}, SECRET, algorithm="HS256").split(".")[1]
+        for token in (f"{header}.{forged}.{signature}", "not-a-token", f"{header}.{payload}"):
+            with self.assertRaises(JWTError):
+                self.codec.decode(token)
+
+        other_key = TokenCodec("HS256", secret_key="other")
+        with self.assertRaises(JWTError):
+            other_key.decode(self.codec.encode(self.claims))
+
+class TestEdDSACodec(unittest.TestCase):
+    def test_public_key_verifies_without_signing_secret(self):
+        signer = TokenCodec("EdDSA", private_key=Ed25519PrivateKey.generate())
+        token = signer.encode({"sub": "user-1", "exp": datetime.utcnow() + timedelta(minutes=5)})
+
+        verifier = TokenCodec.from_jwk(signer.public_jwk())
+        self.assertEqual(verifier.decode(token)["sub"], "user-1")
+        with self.assertRaises(JWTError):
+            verifier.encode({"sub": "user-1"})
+
+        hs_token = TokenCodec("HS256", secret_key=SECRET).encode({"sub": "user-1"})
+        with self.assertRaises(JWTError):
+            verifier.decode(hs_token)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import asyncio
+from unittest.mock import patch, AsyncMock, MagicMock
+from fastapi import HTTPException
+from app.api import deps
+from app.core.cache import CacheInvalidator, TTLCache, user_cache
+from app.core.pubsub import RedisPubSub
+from app.core.security import create_access_token
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_entries_expire(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        with patch("app.core.cache.time.monotonic", return_value=1000.0):
+            cache.set("a", 1)
+        with patch("app.core.cache.time.monotonic", return_value=1061.0):
+            self.assertIsNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual((stats["expirations"], stats["misses"], stats["size"]), (1, 1, 0))
+
+    def test_invalidate(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.invalidate("a")
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["invalidations"], 1)
+
+class TestInvalidationAcrossWorkers(unittest.TestCase):
+    def setUp(self):
+        try:
+            import fakeredis
+        except ImportError:
+            self.skipTest("fakeredis not installed")
+        self.loop = asyncio.new_event_loop()
+        server = fakeredis.FakeServer()
+        # Two workers sharing one Redis, each with its own cache
+        self.workers = [
+            CacheInvalidator(TTLCache(maxsize=8, ttl=60), RedisPubSub(fakeredis.FakeAsyncRedis(server=server), "user_cache:"))
+            for _ in range(2)
+        ]
+        for worker in self.workers:
+            self.loop.run_until_complete(worker.start())
+        self.listeners = [self.loop.create_task(worker.pubsub.run()) for worker in self.workers]
+
+    def tearDown(self):
+        for task in self.listeners:
+            task.cancel()
+        self.loop.run_until_complete(asyncio.gather(*self.listeners, return_exceptions=True))
+        self.loop.close()
+
+    def test_invalidation_reaches_every_worker(self):
+        revoking, serving = self.workers
+        for worker in self.workers:
+            worker.cache.set("user-1", "stale")
+        serving.cache.set("user-2", "fresh")
+
+        self.loop.run_until_complete(revoking.invalidate("user-1"))
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+
+        self.assertIsNone(serving.cache.get("user-1"))
+        self.assertEqual(serving.cache.get("user-2"), "fresh")
+        self.assertEqual((revoking.stats()["published"], serving.stats()["received"]), (1, 1))
+
+    def test_failed_publish_still_invalidates_locally(self):
+        worker = self.workers[0]
+        worker.cache.set("user-1", "stale")
+        worker.pubsub.publish = AsyncMock(side_effect=ConnectionError("down"))
+
+        self.loop.run_until_complete(worker.invalidate("user-1"))
+
+        self.assertIsNone(worker.cache.get("user-1"))
+        self.assertEqual(worker.stats()["publish_failures"], 1)
+
+class TestCachedCurrentUser(unittest.TestCase):
+    def tearDown(self):
+        user_cache.clear()
+
+    @patch("app.api.deps.is_token_blacklisted", new_callable=AsyncMock, return_value=False)
+    @patch("app.api.deps.User")
+    def test_second_request_skips_database(self, mock_user_cls, _):
+        mock_user = MagicMock()
+        mock_user.is_active = True
+        mock_user.token_version = 0
+        mock_user_cls.get = AsyncMock(return_value=mock_user)
+        token, _ = create_access_token("507f1f77bcf86cd799439011")
+
+        loop = asyncio.new_event_loop()
+        first = loop.run_until_complete(deps.get_current_user(token))
+        second = loop.run_until_complete(deps.get_current_user(token))
+        loop.close()
+
+        self.assertIs(first, second)
+        mock_user_cls.get.assert_awaited_once()
+
+class TestTokenVersion(unittest.TestCase):
+    def tearDown(self):
+        user_cache.clear()
+
+    @patch("app.api.deps.is_token_blacklisted", new_callable=AsyncMock, return_value=False)
+    @patch("app.api.deps.User")
+    def test_token_from_older_version_is_rejected(self, mock_user_cls, _):
+        mock_user = MagicMock()
+        mock_user.is_active = True
+        mock_user.token_version = 3
+        mock_user_cls.get = AsyncMock(return_value=mock_user)
+        loop = asyncio.new_event_loop()
+
+        token, _ = create_access_token("507f1f77bcf86cd799439011", token_version=2)
+        with self.assertRaises(HTTPException) as ctx:
+            loop.run_until_complete(deps.get_current_user(token))
+        self.assertEqual(ctx.exception.status_code, 401)
+
+        token, _ = create_access_token("507f1f77bcf86cd799439011", token_version=3)
+        self.assertIs(loop.run_until_complete(deps.get_current_user(token)), mock_user)
+        loop.close()
+
+class TestCurrentPrincipal(unittest.TestCase):
+    def tearDown(self):
+        user_cache.clear()
+
+    @patch("app.api.deps.is_token_blacklisted", new_callable=AsyncMock, return_value=False)
+    @patch("app.api.deps.User")
+    def test_claims_token_needs_no_user_lookup(self, mock_user_cls, _):
+        mock_user_cls.get = AsyncMock()
+        claims = {"act": True, "name": "Ada", "email": "ada@example.com"}
+        token, _ = create_access_token("507f1f77bcf86cd799439011", claims=claims)
+
+        loop = asyncio.new_event_loop()
+        principal = loop.run_until_complete(deps.get_current_principal(token))
+        loop.close()
+
+        self.assertEqual((principal.id, principal.full_name, principal.email),
+                         ("507f1f77bcf86cd799439011", "Ada", "ada@example.com"))
+        mock_user_cls.get.assert_not_awaited()
+
+    @patch("app.api.deps.is_token_blacklisted", new_callable=AsyncMock, return_value=False)
+    def test_inactive_claim_is_rejected(self, _):
+        token, _ = create_access_token("507f1f77bcf86cd799439011", claims={"act": False})
+        loop = asyncio.new_event_loop()
+        with self.assertRaises(HTTPException) as ctx:
+            loop.run_until_complete(deps.get_current_principal(token))
+        loop.close()
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    @patch("app.api.deps.is_token_blacklisted", new_callable=AsyncMock, return_value=False)
+    @patch("app.api.deps.User")
+    def test_plain_token_falls_back_to_user(self, mock_user_cls, _):
+        mock_user = MagicMock()
+        mock_user.id = "507f1f77bcf86cd799439011"
+        mock_user.is_active = True
+        mock_user.token_version = 0
+        mock_user.full_name = "Ada"
+        mock_user.email = "ada@example.com"
+        mock_user_cls.get = AsyncMock(return_value=mock_user)
+        token, _ = create_access_token("507f1f77bcf86cd799439011")
+
+        loop = asyncio.new_event_loop()
+        principal = loop.run_until_complete(deps.get_current_principal(token))
+        loop.close()
+
+        self.assertEqual(principal.full_name, "Ada")
+        mock_user_cls.get.assert_awaited_once()
+
+    def test_claims_only_embedded_when_enabled(self):
+        user = MagicMock(is_active=True, full_name="Ada", email="ada@example.com")
+        self.assertIsNone(deps.principal_claims(user))
+        with patch.object(deps.settings, "ACCESS_TOKEN_EMBED_CLAIMS", True):
+            self.assertEqual(deps.principal_claims(user), {"act": True, "name": "Ada", "email": "ada@example.com"})
+
+if __name__ == "__main__":
+    unittest.main()